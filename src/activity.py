@@ -0,0 +1,83 @@
+import sqlite3
+import time
+
+from discord.ext import tasks
+
+from constants import ACTIVITY_FLUSH_SECONDS
+from metrics import timed
+from storage import query
+
+
+@query
+def write_table_activity(
+    conn: sqlite3.Connection, rows: list[tuple[float, int]]
+) -> None:
+    """
+    - Takes a list of (unix timestamp, table id) rows.
+    - Writes every last message time in a single transaction.
+    """
+    with conn:
+        conn.executemany(
+            "UPDATE tables SET last_message_at = datetime(?1, 'unixepoch'), last_activity = CAST(?1 AS INTEGER) WHERE table_id = ?2",
+            rows,
+        )
+
+
+class TableActivity:
+    """
+    - Keeps the last message time of every active table in memory.
+    - Timestamps are written back to the database in batches by `flush`.
+    """
+
+    def __init__(self) -> None:
+        self.last_activity: dict[int, float] = {}
+        self._dirty: set[int] = set()
+
+    def touch(self, table_id: int) -> None:
+        """Record a message in a table, without touching the database"""
+        self.last_activity[table_id] = time.time()
+        self._dirty.add(table_id)
+
+    def forget(self, table_id: int) -> None:
+        """Drop a table that no longer exists"""
+        self.last_activity.pop(table_id, None)
+        self._dirty.discard(table_id)
+
+    @timed("task", "flush_table_activity")
+    async def flush(self) -> int:
+        """
+        - Write all dirty timestamps in one transaction.
+        - Returns the number of tables written.
+        """
+        if not self._dirty:
+            return 0
+
+        dirty: set[int] = self._dirty
+        self._dirty = set()
+        rows: list[tuple[float, int]] = [
+            (self.last_activity[table_id], table_id)
+            for table_id in dirty
+            if table_id in self.last_activity
+        ]
+        try:
+            await write_table_activity(rows)
+        except Exception:
+            # Keep them dirty so the next flush retries
+            self._dirty |= dirty
+            raise
+        return len(rows)
+
+
+table_activity: TableActivity = TableActivity()
+
+
+def setup_activity_flusher() -> None:
+    @tasks.loop(seconds=ACTIVITY_FLUSH_SECONDS)
+    async def flush_table_activity() -> None:
+        """Write the buffered table activity to the database"""
+        try:
+            await table_activity.flush()
+        except Exception as e:
+            print(f"Error flushing table activity: {e}")
+
+    flush_table_activity.start()
@@ -0,0 +1,110 @@
+import asyncio
+import time
+from typing import Any, Awaitable, Callable, Optional, TypeVar
+
+from metrics import Histogram, metrics
+
+T = TypeVar("T")
+
+Action = Callable[["TableActor"], Awaitable[Any]]
+
+
+class TableActor:
+    """
+    - Owns the in-memory state of one table.
+    - Actions are queued and applied one at a time by the table's own task, so
+      they never race with each other and need no locks. Different tables run
+      independently.
+    - Records how long every action waited in the queue and how long it took
+      from being queued to done, shared by all tables.
+    """
+
+    def __init__(self, table_id: int) -> None:
+        self.table_id: int = table_id
+        self.state: Any = None
+        # None tells the task to stop once everything before it is applied
+        self._queue: asyncio.Queue[
+            Optional[tuple[Action, asyncio.Future[Any], float]]
+        ] = asyncio.Queue()
+        self._task: Optional[asyncio.Task[None]] = None
+
+        self.peak_depth: int = 0
+        self.wait: Histogram = metrics.histogram("actor", "wait")
+        self.latency: Histogram = metrics.histogram("actor", "latency")
+
+    @property
+    def depth(self) -> int:
+        return self._queue.qsize()
+
+    def start(self) -> None:
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    def stop(self) -> None:
+        """Stop the task after the actions already queued are applied"""
+        if self._task is not None:
+            self._queue.put_nowait(None)
+            self._task = None
+
+    async def submit(self, action: Callable[["TableActor"], Awaitable[T]]) -> T:
+        """
+        - Takes a coroutine function that receives this actor.
+        - Queues it behind the table's pending actions and returns its result.
+        """
+        future: asyncio.Future[T] = asyncio.get_running_loop().create_future()
+        self._queue.put_nowait((action, future, time.perf_counter()))
+        self.peak_depth = max(self.peak_depth, self._queue.qsize())
+        self.start()
+        return await future
+
+    async def _run(self) -> None:
+        while True:
+            item: Optional[tuple[Action, asyncio.Future[Any], float]] = (
+                await self._queue.get()
+            )
+            if item is None:
+                return
+            action, future, queued_at = item
+            started_at: float = time.perf_counter()
+            try:
+                result: Any = await action(self)
+            except Exception as e:
+                if not future.done():
+                    future.set_exception(e)
+            else:
+                if not future.done():
+                    future.set_result(result)
+
+            self.wait.observe(started_at - queued_at)
+            self.latency.observe(time.perf_counter() - queued_at)
+
+
+class TableActors:
+    """One actor per table, created on first use"""
+
+    def __init__(self) -> None:
+        self.actors: dict[int, TableActor] = {}
+
+    def get(self, table_id: int) -> TableActor:
+        actor: Optional[TableActor] = self.actors.get(table_id)
+        if actor is None:
+            actor = self.actors[table_id] = TableActor(table_id)
+        return actor
+
+    def remove(self, table_id: int) -> None:
+        actor: Optional[TableActor] = self.actors.pop(table_id, None)
+        if actor is not None:
+            actor.stop()
+
+    @property
+    def depth(self) -> int:
+        """Actions queued across every table"""
+        return sum(actor.depth for actor in self.actors.values())
+
+    @property
+    def peak_depth(self) -> int:
+        """The deepest any live table's queue has been"""
+        return max((actor.peak_depth for actor in self.actors.values()), default=0)
+
+
+table_actors: TableActors = TableActors()
@@ -0,0 +1,734 @@
+"""
+Headless benchmark for the bot.
+
+Replays synthetic traffic through the real handlers in main.py, poker.py,
+helpers.py and timer.py against a throwaway database, with small stand-ins
+for the Discord objects they touch. No token or network is needed.
+
+    python src/bench.py                          # Print a report
+    python src/bench.py --json results.json      # Also save it
+    python src/bench.py --compare results.json   # Fail on p99 regressions
+    python src/bench.py --schema-users 1000000   # Also time the hot queries
+                                                 # before and after migrations
+    python src/bench.py --processes 4            # Compare one process with
+                                                 # four shard processes
+                                                 # sharing a database
+"""
+
+import argparse
+import asyncio
+import itertools
+import json
+import os
+import random
+import sqlite3
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Any, Awaitable, Iterator, Optional
+
+import discord
+
+from constants import BOT_COUNT
+
+# main.py refuses to import without a token, and the benchmark must never
+# touch the real database
+os.environ.setdefault("TOKEN", "benchmark")
+from storage import storage  # isort: skip
+
+_directory: str = tempfile.mkdtemp(prefix="pokerbot-bench-")
+# Shard processes started by --processes share the database of the run
+storage.path = os.getenv("BENCH_DATABASE") or os.path.join(_directory, "bench.db")
+
+import main  # isort: skip
+from activity import table_activity
+from actor import table_actors
+from bots import bot_players
+from database import (add_user, create_tables, get_table_activity,
+                      load_table_registry)
+from expiry import ExpiryScheduler
+from gateway import resident_memory
+from helpers import setup_helper_commands
+from history import hand_history, read_hands, verify
+from metrics import Histogram, metrics
+from migrations import migrate
+from poker import setup_poker_commands
+from registry import table_registry
+from shards import shard_config
+from snapshots import TableSnapshots, table_snapshots
+from status import status_messages
+from timer import expire_tables
+from workers import worker_pool
+
+# Shard processes use their own ids, and a guild on their own shard
+_shard: int = shard_config.ids[0] if shard_config.ids else 0
+_ids: Iterator[int] = itertools.count(10**17 + _shard * 10**15)
+_guild_id: Optional[int] = _shard << 22 if shard_config.sharded else None
+
+
+class FakeUser:
+    def __init__(self, user_id: int) -> None:
+        self.id: int = user_id
+        self.bot: bool = True  # Keeps process_commands from parsing messages
+        self.display_name: str = f"user{user_id}"
+        self.mention: str = f"<@{user_id}>"
+
+
+class FakeThread(discord.Thread):
+    def __init__(self, thread_id: int, name: str) -> None:
+        self.id = thread_id
+        self.name = name
+        self.deleted: bool = False
+
+    async def send(self, *args: Any, **kwargs: Any) -> Any:
+        return FakeSentMessage(*args)
+
+    async def delete(self, *args: Any, **kwargs: Any) -> None:
+        self.deleted = True
+        FakeDiscord.channels.pop(self.id, None)
+
+
+class FakeSentMessage:
+    def __init__(self, content: str = "") -> None:
+        self.content: str = content
+
+    async def edit(self, content: str = "", **kwargs: Any) -> None:
+        self.content = content
+
+    async def pin(self, **kwargs: Any) -> None:
+        pass
+
+
+class FakeTextChannel(discord.TextChannel):
+    def __init__(self, channel_id: int) -> None:
+        self.id = channel_id
+        self.name = "poker"
+
+    async def create_thread(self, *args: Any, **kwargs: Any) -> Any:
+        thread: FakeThread = FakeThread(next(_ids), kwargs.get("name", "thread"))
+        FakeDiscord.channels[thread.id] = thread
+        return thread
+
+
+class FakeResponse:
+    def __init__(self) -> None:
+        self.messages: list[str] = []
+        self._done: bool = False
+
+    async def send_message(self, content: str = "", **kwargs: Any) -> None:
+        self.messages.append(content)
+        self._done = True
+
+    async def defer(self, **kwargs: Any) -> None:
+        self._done = True
+
+    def is_done(self) -> bool:
+        return self._done
+
+
+class FakeFollowup:
+    def __init__(self, response: FakeResponse) -> None:
+        self.response: FakeResponse = response
+
+    async def send(self, content: str = "", **kwargs: Any) -> None:
+        self.response.messages.append(content)
+
+
+class FakeInteraction:
+    def __init__(self, user: FakeUser, channel: Any) -> None:
+        self.id: int = next(_ids)
+        self.user: FakeUser = user
+        self.channel: Any = channel
+        self.guild_id: Optional[int] = _guild_id
+        self.response: FakeResponse = FakeResponse()
+        self.followup: FakeFollowup = FakeFollowup(self.response)
+
+    async def delete_original_response(self) -> None:
+        pass
+
+
+class FakeMessage:
+    def __init__(self, author: FakeUser, channel: Any) -> None:
+        self.author: FakeUser = author
+        self.channel: Any = channel
+        self.content: str = "gg"
+
+
+class FakeDiscord:
+    """Every channel the benchmark knows about, served to bot.get_channel"""
+
+    channels: dict[int, Any] = {}
+
+    @classmethod
+    def get_channel(cls, channel_id: int) -> Any:
+        return cls.channels.get(channel_id)
+
+    @classmethod
+    async def fetch_channel(cls, channel_id: int) -> Any:
+        channel: Any = cls.channels.get(channel_id)
+        if channel is None:
+            raise discord.NotFound(_NotFoundResponse(), "Unknown Channel")
+        return channel
+
+
+class _NotFoundResponse:
+    status: int = 404
+    reason: str = "Not Found"
+
+
+class Result:
+    def __init__(self, name: str) -> None:
+        self.name: str = name
+        self.latencies: list[float] = []
+        self.elapsed: float = 0.0
+        self.queries: int = 0
+        self.statements: int = 0
+
+    def as_dict(self) -> dict[str, float]:
+        events: int = len(self.latencies)
+        ordered: list[float] = sorted(self.latencies)
+        return {
+            "events": events,
+            "throughput": events / self.elapsed if self.elapsed else 0.0,
+            "p50_ms": statistics.median(ordered) * 1000 if ordered else 0.0,
+            "p99_ms": ordered[int(0.99 * (events - 1))] * 1000 if ordered else 0.0,
+            "queries_per_event": self.queries / events if events else 0.0,
+            "statements_per_event": self.statements / events if events else 0.0,
+        }
+
+
+class Bench:
+    def __init__(self, concurrency: int) -> None:
+        self.concurrency: int = concurrency
+        self.statements: int = 0
+        self.results: list[Result] = []
+        self.lobby: FakeTextChannel = FakeTextChannel(next(_ids))
+
+    def _count_statement(self, _: str) -> None:
+        self.statements += 1
+
+    def _trace(self, conn: sqlite3.Connection) -> None:
+        conn.set_trace_callback(self._count_statement)
+
+    async def setup(self) -> None:
+        """The parts of setup_hook that don't need a gateway connection"""
+        hand_history.directory = os.path.join(_directory, "hands")
+        table_snapshots.directory = os.path.join(_directory, "snapshots")
+        await create_tables()
+        await load_table_registry()
+        await storage.run(self._trace)
+        setup_helper_commands(main.bot)
+        setup_poker_commands(main.bot)
+        main.bot.get_channel = FakeDiscord.get_channel  # type: ignore[method-assign]
+        main.bot.fetch_channel = FakeDiscord.fetch_channel  # type: ignore[method-assign]
+
+    async def run(self, name: str, events: list[Awaitable[Any]]) -> Result:
+        """Fire the events `concurrency` at a time and time each of them"""
+        result: Result = Result(name)
+        queries_before: int = storage.queries
+        statements_before: int = self.statements
+        semaphore: asyncio.Semaphore = asyncio.Semaphore(self.concurrency)
+
+        async def timed(event: Awaitable[Any]) -> None:
+            async with semaphore:
+                start_time: float = time.perf_counter()
+                await event
+                result.latencies.append(time.perf_counter() - start_time)
+
+        start_time: float = time.perf_counter()
+        await asyncio.gather(*(timed(event) for event in events))
+        result.elapsed = time.perf_counter() - start_time
+        result.queries = storage.queries - queries_before
+        result.statements = self.statements - statements_before
+        self.results.append(result)
+        return result
+
+    async def command(
+        self, name: str, interaction: FakeInteraction, *args: Any
+    ) -> None:
+        command: Any = main.bot.tree.get_command(name)
+        await command.callback(interaction, *args)
+
+    # Scenarios
+    async def accounts(self, users: list[FakeUser]) -> None:
+        await self.run(
+            "init",
+            [self.command("init", FakeInteraction(user, self.lobby)) for user in users],
+        )
+
+    async def create_tables(
+        self, owners: list[FakeUser], name: str = "create"
+    ) -> list[FakeThread]:
+        before: set[int] = set(FakeDiscord.channels)
+        await self.run(
+            name,
+            [
+                self.command(
+                    "create", FakeInteraction(owner, self.lobby), False, 5, 0, ""
+                )
+                for owner in owners
+            ],
+        )
+        return [
+            FakeDiscord.channels[channel_id]
+            for channel_id in set(FakeDiscord.channels) - before
+        ]
+
+    async def join_tables(
+        self, users: list[FakeUser], tables: list[FakeThread]
+    ) -> None:
+        await self.run(
+            "join",
+            [
+                self.command("join", FakeInteraction(user, tables[index % len(tables)]))
+                for index, user in enumerate(users)
+            ],
+        )
+
+    async def message_flood(
+        self, users: list[FakeUser], tables: list[FakeThread], messages: int
+    ) -> None:
+        # One in five messages is in a thread that isn't a table
+        others: list[FakeThread] = [
+            FakeThread(next(_ids), "chat") for _ in range(len(tables) // 4 + 1)
+        ]
+        channels: list[FakeThread] = tables * 4 + others
+        await self.run(
+            "on_message",
+            [
+                main.on_message(
+                    FakeMessage(random.choice(users), random.choice(channels))  # type: ignore[arg-type]
+                )
+                for _ in range(messages)
+            ],
+        )
+
+    async def play_hands(
+        self, tables: list[FakeThread], owners: list[FakeUser], name: str = "hand"
+    ) -> None:
+        """One hand per table: the owner starts it and everyone checks or calls"""
+
+        async def play(table: FakeThread, owner: FakeUser) -> None:
+            await self.command("start", FakeInteraction(owner, table))
+            game: Any = table_actors.get(table.id).state
+            while game is not None and game.in_hand:
+                user: FakeUser = FakeUser(game.user_ids[game.to_act])
+                name: str = "call" if game.to_call(game.to_act) else "check"
+                await self.command(name, FakeInteraction(user, table))
+
+        await self.run(
+            name,
+            [play(table, owner) for table, owner in zip(tables, owners)],
+        )
+
+    async def expiry_survival(
+        self, tables: list[FakeThread], owners: list[FakeUser]
+    ) -> int:
+        """
+        - Schedule every table as if its last message were older than the
+          expiry window, then play a hand at each through commands only.
+        - Returns how many of them would be expired anyway, there should be
+          none: accepted commands count as activity, like messages.
+        """
+        scheduler: ExpiryScheduler = ExpiryScheduler()
+        idle_since: float = time.time() - scheduler.ttl - 1
+        for table in tables:
+            table_activity.forget(table.id)
+            scheduler.arm(table.id, idle_since)
+        await self.play_hands(tables, owners, "hand_after_idle")
+        return len(scheduler.pop_due(time.time()))
+
+    async def restore(self, tables: list[FakeThread], owners: list[FakeUser]) -> int:
+        """
+        - Deal a hand at every table and act once, snapshot, act once more so
+          the last actions are only in the log, then restore as a restarted
+          process would.
+        - Returns how many restored games differ from the live ones.
+        """
+
+        async def act(table: FakeThread) -> None:
+            game: Any = table_actors.get(table.id).state
+            if game is not None and game.in_hand:
+                user: FakeUser = FakeUser(game.user_ids[game.to_act])
+                name: str = "call" if game.to_call(game.to_act) else "check"
+                await self.command(name, FakeInteraction(user, table))
+
+        for table, owner in zip(tables, owners):
+            await self.command("start", FakeInteraction(owner, table))
+            await act(table)
+
+        async def snapshot() -> None:
+            await table_snapshots.snapshot()
+
+        await self.run("snapshot", [snapshot()])
+        for table in tables:
+            await act(table)
+
+        restarted: TableSnapshots = TableSnapshots(
+            table_snapshots.directory, table_snapshots.name
+        )
+        games: list[Any] = []
+
+        async def restore() -> None:
+            games.extend(restarted.restore(set(table_registry.tables)))
+
+        await self.run("restore", [restore()])
+        return (
+            sum(
+                game.dump() != table_actors.get(game.table_id).state.dump()
+                for game in games
+            )
+            + len(tables)
+            - len(games)
+        )
+
+    async def seat_bots(
+        self, tables: list[FakeThread], owners: list[FakeUser], count: int
+    ) -> None:
+        await self.run(
+            "bots",
+            [
+                self.command("bots", FakeInteraction(owner, table), count)
+                for table, owner in zip(tables, owners)
+            ],
+        )
+
+    async def odds(self, users: list[FakeUser], count: int) -> None:
+        """Equity requests, more at once than the worker pool takes"""
+        await self.run(
+            "odds",
+            [
+                self.command(
+                    "odds",
+                    FakeInteraction(random.choice(users), self.lobby),
+                    "AsKd",
+                    "7h8h9c",
+                    2,
+                )
+                for _ in range(count)
+            ],
+        )
+
+    async def stats(self, users: list[FakeUser]) -> None:
+        await self.run(
+            "stats",
+            [
+                self.command("stats", FakeInteraction(user, self.lobby))
+                for user in users
+            ],
+        )
+
+    async def delete_tables(
+        self, tables: list[FakeThread], owners: list[FakeUser]
+    ) -> None:
+        await self.run(
+            "delete",
+            [
+                self.command("delete", FakeInteraction(owner, table))
+                for table, owner in zip(tables, owners)
+            ],
+        )
+
+    async def expiry_sweep(self, count: int) -> None:
+        """Expire `count` idle tables in one batch, as the scheduler does"""
+        owners: list[FakeUser] = [FakeUser(next(_ids)) for _ in range(count)]
+        for owner in owners:
+            await add_user(owner.id)
+        tables: list[FakeThread] = await self.create_tables(owners, "create_idle")
+        table_ids: list[int] = [table.id for table in tables]
+        await self.run("expiry_sweep", [expire_tables(main.bot, table_ids)])
+
+    def report(self) -> dict[str, dict[str, float]]:
+        report: dict[str, dict[str, float]] = {
+            result.name: result.as_dict() for result in self.results
+        }
+        print(
+            f"{'scenario':<20}{'events':>8}{'events/s':>12}{'p50 ms':>10}"
+            f"{'p99 ms':>10}{'db calls/ev':>13}{'stmts/ev':>10}"
+        )
+        for name, row in report.items():
+            print(
+                f"{name:<20}{row['events']:>8.0f}{row['throughput']:>12.0f}"
+                f"{row['p50_ms']:>10.3f}{row['p99_ms']:>10.3f}"
+                f"{row['queries_per_event']:>13.2f}{row['statements_per_event']:>10.2f}"
+            )
+        return report
+
+
+async def run_benchmark(
+    scale: int, concurrency: int, schema_users: int = 0
+) -> dict[str, dict[str, float]]:
+    random.seed(0)
+    bench: Bench = Bench(concurrency)
+    await bench.setup()
+
+    owners: list[FakeUser] = [FakeUser(next(_ids)) for _ in range(scale)]
+    players: list[FakeUser] = [FakeUser(next(_ids)) for _ in range(scale * 3)]
+    await bench.accounts(owners + players)
+    tables: list[FakeThread] = await bench.create_tables(owners)
+    # create_tables returns the threads in no particular order
+    table_owners: list[FakeUser] = [
+        FakeUser(table_registry.tables[table.id].table_owner_id) for table in tables
+    ]
+    await bench.join_tables(players, tables)
+    await bench.message_flood(owners + players, tables, scale * 50)
+    await bench.play_hands(tables, table_owners)
+    # Four bots join the tables until they run out, the humans only check or
+    # call so the bots decide most of every hand
+    bot_tables: int = min(len(tables), BOT_COUNT // 4)
+    await bench.seat_bots(tables[:bot_tables], table_owners[:bot_tables], 4)
+    await bench.play_hands(
+        tables[:bot_tables], table_owners[:bot_tables], "hand_with_bots"
+    )
+    expired: int = await bench.expiry_survival(tables, table_owners)
+    mismatched: int = await bench.restore(tables, table_owners)
+    await bench.expiry_sweep(scale)
+    await bench.odds(players, scale // 4)
+    await bench.stats(owners + players)
+    await bench.delete_tables(tables, table_owners)
+    if schema_users:
+        bench.results.extend(await asyncio.to_thread(schema_benchmark, schema_users))
+
+    report: dict[str, dict[str, float]] = bench.report()
+    overhead: float = await asyncio.to_thread(metrics.overhead)
+    print(f"metrics overhead: {overhead * 1_000_000:.2f}µs per timed call")
+    print(f"tables left in the database: {len(await get_table_activity())}")
+    print(f"tables played through commands that expired: {expired}")
+    print(f"bots: {bot_players.stats()}, pool {bot_players.pool.stats()}")
+    print(f"status messages: {status_messages.stats()}")
+    print(f"resident memory: {resident_memory() / 2**20:.1f}MiB")
+    print(
+        f"snapshots: {table_snapshots.stats()}, "
+        f"{mismatched} tables restored differently"
+    )
+    wait: Histogram = worker_pool.wait
+    print(
+        f"worker pool: {worker_pool.stats()}, queue wait "
+        f"p50 {wait.quantile(0.5) * 1000:.3f}ms p99 {wait.quantile(0.99) * 1000:.3f}ms"
+    )
+    await hand_history.flush()
+    hands: list[bool] = []
+    seats: int = 0
+    for hand in read_hands(hand_history.directory):
+        hands.append(verify(hand))
+        seats += sum(1 for _, stack in hand["seats"] if stack)
+    print(f"hands in the history: {len(hands)}, {hands.count(False)} didn't replay")
+    played, profit = await storage.run(_player_stats_totals)
+    print(
+        f"player stats: {played} hands played of {seats} seats dealt in the "
+        f"history, profits add up to {profit}"
+    )
+    return report
+
+
+def _player_stats_totals(conn: sqlite3.Connection) -> tuple[int, int]:
+    return conn.execute(
+        "SELECT COALESCE(SUM(hands), 0), COALESCE(SUM(profit), 0) FROM player_stats"
+    ).fetchone()
+
+
+# The hot queries in database.py that depend on an index
+SCHEMA_QUERIES: dict[str, str] = {
+    "deal": "SELECT user_id, money FROM users WHERE joined_table = ? ORDER BY user_id",
+    "unseat": "UPDATE users SET joined_table = 0, joined_table_name = '' WHERE joined_table = ?",
+    "expired": "SELECT table_id FROM tables WHERE last_activity < ?",
+    "top": "SELECT user_id, money FROM users ORDER BY money DESC, user_id LIMIT 10 OFFSET ?",
+    "rank": "SELECT COUNT(*) FROM users WHERE money > ?",
+}
+# The last schema without any of the indexes for them
+SCHEMA_BASELINE_VERSION: int = 3
+
+
+def schema_benchmark(users: int, runs: int = 50) -> list[Result]:
+    """
+    - Build a database with `users` users, one in a hundred seated at one of
+      a thousand tables, at SCHEMA_BASELINE_VERSION.
+    - Time SCHEMA_QUERIES, apply the later migrations and time them again.
+    """
+    path: str = os.path.join(tempfile.mkdtemp(prefix="pokerbot-schema-"), "schema.db")
+    conn: sqlite3.Connection = sqlite3.connect(path)
+    migrate(conn, SCHEMA_BASELINE_VERSION)
+
+    tables: int = 1000
+    with conn:
+        conn.executemany(
+            "INSERT INTO users (user_id, money, joined_table) VALUES (?, ?, ?)",
+            (
+                (
+                    user_id,
+                    user_id * 7919 % 100_000,
+                    1 + user_id // 100 % tables if user_id % 100 == 0 else 0,
+                )
+                for user_id in range(users)
+            ),
+        )
+        conn.executemany(
+            "INSERT INTO tables (table_id, table_owner_id, table_name, last_activity) VALUES (?, ?, ?, ?)",
+            ((table_id, table_id, "bench", table_id) for table_id in range(tables)),
+        )
+
+    results: list[Result] = []
+    for phase in ("before", "after"):
+        if phase == "after":
+            migrate(conn)
+        for name, sql in SCHEMA_QUERIES.items():
+            result: Result = Result(f"sql_{name}_{phase}")
+            plan: str = " / ".join(
+                row[-1] for row in conn.execute(f"EXPLAIN QUERY PLAN {sql}", (1,))
+            )
+            for run in range(runs):
+                start_time: float = time.perf_counter()
+                conn.execute(sql, (1 + run % tables,)).fetchall()
+                result.latencies.append(time.perf_counter() - start_time)
+                # Only measure the unseat, don't keep it
+                conn.rollback()
+            result.elapsed = sum(result.latencies)
+            results.append(result)
+            print(f"{result.name:<22}{plan}")
+
+    conn.close()
+    return results
+
+
+def compare(
+    report: dict[str, dict[str, float]], baseline_path: str, tolerance: float
+) -> bool:
+    """Check every scenario's p99 against a saved report"""
+    with open(baseline_path) as file:
+        baseline: dict[str, dict[str, float]] = json.load(file)
+
+    ok: bool = True
+    for name, row in report.items():
+        if name not in baseline:
+            continue
+        limit: float = baseline[name]["p99_ms"] * (1 + tolerance)
+        if row["p99_ms"] > limit:
+            ok = False
+            print(
+                f"REGRESSION {name}: p99 {row['p99_ms']:.3f}ms, "
+                f"baseline {baseline[name]['p99_ms']:.3f}ms"
+            )
+    return ok
+
+
+def run_processes(
+    processes: int, scale: int, concurrency: int
+) -> tuple[dict[str, float], float]:
+    """
+    - Run the benchmark in `processes` shard processes at once, against one
+      database, splitting `scale` between them.
+    - Returns the events per second of every scenario, summed over the
+      processes, and of all of them together: every event over the time the
+      slowest process spent in the scenarios (so not starting up).
+    """
+    directory: str = tempfile.mkdtemp(prefix="pokerbot-shards-")
+    started: list[tuple[subprocess.Popen[bytes], str]] = []
+    for shard in range(processes):
+        report_path: str = os.path.join(directory, f"shard-{shard}.json")
+        env: dict[str, str] = dict(
+            os.environ, BENCH_DATABASE=os.path.join(directory, "bench.db")
+        )
+        # A single process runs unsharded, as the bot does by default
+        if processes > 1:
+            env.update(SHARD_COUNT=str(processes), SHARD_IDS=str(shard))
+        command: list[str] = [
+            sys.executable,
+            os.path.abspath(__file__),
+            f"--scale={scale // processes}",
+            f"--concurrency={concurrency}",
+            f"--json={report_path}",
+        ]
+        started.append(
+            (
+                subprocess.Popen(
+                    command,
+                    env=env,
+                    stdout=subprocess.PIPE,
+                    stderr=subprocess.STDOUT,
+                ),
+                report_path,
+            )
+        )
+
+    throughput: dict[str, float] = {}
+    events: float = 0.0
+    slowest: float = 0.0
+    for process, report_path in started:
+        output: bytes = process.communicate()[0]
+        if process.returncode != 0:
+            print(output.decode())
+            raise RuntimeError(
+                f"Shard process failed with exit code {process.returncode}"
+            )
+        elapsed: float = 0.0
+        with open(report_path) as file:
+            for name, row in json.load(file).items():
+                throughput[name] = throughput.get(name, 0.0) + row["throughput"]
+                events += row["events"]
+                elapsed += row["events"] / row["throughput"]
+        slowest = max(slowest, elapsed)
+    return throughput, events / slowest
+
+
+def compare_processes(processes: int, scale: int, concurrency: int) -> None:
+    """Print the throughput of one process next to `processes` shard processes"""
+    single, single_total = run_processes(1, scale, concurrency)
+    sharded, sharded_total = run_processes(processes, scale, concurrency)
+    print(f"{os.cpu_count()} CPUs")
+    print(
+        f"{'scenario':<20}{'1 process':>12}{f'{processes} processes':>14}{'speedup':>10}"
+    )
+    for name, events_per_second in single.items():
+        print(
+            f"{name:<20}{events_per_second:>12.0f}{sharded[name]:>14.0f}"
+            f"{sharded[name] / events_per_second:>9.2f}x"
+        )
+    print(
+        f"{'all':<20}{single_total:>12.0f}{sharded_total:>14.0f}"
+        f"{sharded_total / single_total:>9.2f}x"
+    )
+
+
+def main_cli() -> None:
+    parser: argparse.ArgumentParser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--scale", type=int, default=200, help="Tables to create")
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--json", help="Write the report to this file")
+    parser.add_argument("--compare", help="Fail if p99 regressed against this report")
+    parser.add_argument("--tolerance", type=float, default=0.25)
+    parser.add_argument(
+        "--schema-users",
+        type=int,
+        default=0,
+        help="Users to time the hot queries with, before and after migrating",
+    )
+    parser.add_argument(
+        "--processes",
+        type=int,
+        default=0,
+        help="Compare one process with this many shard processes instead",
+    )
+    args: argparse.Namespace = parser.parse_args()
+
+    if args.processes:
+        compare_processes(args.processes, args.scale, args.concurrency)
+        return
+
+    bot_players.load()
+    report: dict[str, dict[str, float]] = asyncio.run(
+        run_benchmark(args.scale, args.concurrency, args.schema_users)
+    )
+    storage.close()
+    bot_players.close()
+
+    if args.json:
+        with open(args.json, "w") as file:
+            json.dump(report, file, indent=2)
+    if args.compare and not compare(report, args.compare, args.tolerance):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main_cli()
@@ -0,0 +1,119 @@
+"""
+Bot players that fill empty seats (see strategy.py for how they play).
+
+- Bots are users with ids -1 to -BOT_COUNT, seated with /bots and dealt in
+  like everyone else. Their chips are real and settle through the ledger.
+- Whenever it's a bot's turn the table's actor lets it act right away:
+  preflop from the table in preflop.json, postflop from a simulation in a
+  process pool, so bots at different tables think in parallel without
+  touching the event loop.
+- Every postflop decision gets BOT_DECISION_SECONDS. If the pool is busy or
+  the simulation runs late, the bot plays its preflop equity instead.
+"""
+
+import asyncio
+from typing import Any
+
+from constants import (BOT_DECISION_SECONDS, BOT_PROCESSES, BOT_QUEUE_SIZE,
+                       BOT_SAMPLES)
+from game import MAX_SEATS, PREFLOP, Game
+from strategy import (apply, choose, decide_postflop, hand_class,
+                      load_preflop_table, opponents, situation)
+from workers import PoolBusy, WorkerPool
+
+
+def is_bot(user_id: int) -> bool:
+    return user_id < 0
+
+
+class BotPlayers:
+    def __init__(self) -> None:
+        # Equity of every hand class against 1 to MAX_SEATS - 1 hands
+        self.preflop: list[list[float]] = []
+        self.pool: WorkerPool = WorkerPool(
+            "bots", BOT_PROCESSES, BOT_QUEUE_SIZE, processes=True
+        )
+        # Decisions that ran late keep running, hold on to them until they finish
+        self._late: set[asyncio.Task[Any]] = set()
+        self.decisions: int = 0
+        self.simulated: int = 0
+        self.timeouts: int = 0
+        self.busy: int = 0
+
+    def load(self) -> None:
+        """Read the preflop table and fork the worker processes, before any threads start"""
+        self.preflop = load_preflop_table()
+        self.pool.start()
+
+    def preflop_equity(self, game: Game, seat: int, opponents: int) -> float:
+        hole: bytes = game.hole_cards(seat)
+        return self.preflop[hand_class(hole[0], hole[1])][
+            min(opponents, MAX_SEATS - 1) - 1
+        ]
+
+    async def decide(self, game: Game, seat: int) -> tuple[int, int]:
+        """
+        - Takes a game and the seat of the bot to act.
+        - Returns the action (from game.py) and the amount to raise by.
+        """
+        self.decisions += 1
+        others: int = opponents(game, seat)
+        betting: tuple[int, int, int, int, int] = situation(game, seat)
+        fallback: float = self.preflop_equity(game, seat, others)
+        if game.street == PREFLOP:
+            return choose(fallback, others, *betting)
+
+        task: asyncio.Task[tuple[int, int]] = asyncio.create_task(
+            self.pool.run(
+                decide_postflop,
+                game.hole_cards(seat),
+                game.board_cards(),
+                others,
+                *betting,
+                BOT_SAMPLES,
+            )
+        )
+        done: set[asyncio.Task[tuple[int, int]]] = (
+            await asyncio.wait({task}, timeout=BOT_DECISION_SECONDS)
+        )[0]
+        if task not in done:
+            self.timeouts += 1
+            self._late.add(task)
+            task.add_done_callback(self._forget)
+            return choose(fallback, others, *betting)
+        try:
+            decision: tuple[int, int] = task.result()
+        except PoolBusy:
+            self.busy += 1
+            return choose(fallback, others, *betting)
+        except Exception as e:
+            print(f"Error in a bot decision: {e}")
+            return choose(fallback, others, *betting)
+        self.simulated += 1
+        return decision
+
+    def _forget(self, task: asyncio.Task[Any]) -> None:
+        self._late.discard(task)
+        if not task.cancelled():
+            task.exception()  # Nobody waits for it anymore, don't log it as lost
+
+    async def play(self, game: Game) -> None:
+        """Let the bots act until it's a human's turn or the hand is over"""
+        while game.in_hand and is_bot(game.user_ids[game.to_act]):
+            seat: int = game.to_act
+            action, amount = await self.decide(game, seat)
+            apply(game, seat, action, amount)
+
+    def close(self) -> None:
+        self.pool.close()
+
+    def stats(self) -> dict[str, int]:
+        return {
+            "decisions": self.decisions,
+            "simulated": self.simulated,
+            "timeouts": self.timeouts,
+            "busy": self.busy,
+        }
+
+
+bot_players: BotPlayers = BotPlayers()
@@ -1 +1,35 @@
 DATABASE_PATH: str = "database.db"
+ACTIVITY_FLUSH_SECONDS: int = 30
+TABLE_EXPIRY_MINUTES: int = 5
+EXPIRY_CONCURRENCY: int = 5
+TEMP_MONEY_STACK: int = 1000
+METRICS_PATH: str = "metrics.prom"
+METRICS_WRITE_SECONDS: int = 15
+USER_CACHE_SIZE: int = 10_000
+USER_CACHE_TTL_SECONDS: int = 600
+LEADERBOARD_SIZE: int = 100
+LEADERBOARD_PAGE_SIZE: int = 10
+HISTORY_DIRECTORY: str = "hands"
+HISTORY_FLUSH_SECONDS: int = 5
+HISTORY_BUFFER_HANDS: int = 256
+# Other processes write users too when sharded, so cached copies expire sooner
+SHARDED_USER_CACHE_TTL_SECONDS: int = 10
+SHARDED_LEADERBOARD_MAX_AGE_SECONDS: int = 30
+# Threads for CPU heavy command work, and how many more calls may wait for them
+WORKER_THREADS: int = 4
+WORKER_QUEUE_SIZE: int = 16
+# Bot players, ids -1 to -BOT_COUNT
+BOT_COUNT: int = 100
+BOT_STACK: int = 1000
+BOT_PROCESSES: int = 2
+BOT_QUEUE_SIZE: int = 16
+BOT_DECISION_SECONDS: float = 1.0
+BOT_SAMPLES: int = 2000
+# Table status messages are edited at most this often, changes in between coalesce
+STATUS_EDIT_SECONDS: float = 1.0
+STATUS_LOG_LINES: int = 12
+# Snapshots of the tables' games, and the log of changes between them
+SNAPSHOT_DIRECTORY: str = "snapshots"
+SNAPSHOT_SECONDS: int = 10
+# Gateway events per second are measured over this window
+GATEWAY_RATE_SECONDS: int = 60
@@ -1,216 +1,289 @@
 import sqlite3
 from typing import Optional
 
-from constants import DATABASE_PATH
+from activity import table_activity
+from actor import table_actors
+from constants import BOT_COUNT, BOT_STACK, LEADERBOARD_SIZE, TEMP_MONEY_STACK
+from expiry import table_expiry
+from game import MAX_SEATS
+from leaderboard import LEADERBOARD_METRICS, Leaderboard, leaderboards
+from metrics import timed
+from migrations import migrate
+from registry import TableInfo, table_registry
+from settlement import (LEDGER_GRANT, LEDGER_HAND, LEDGER_RESET, Settlement,
+                        apply_settlement)
+from shards import shard_config
+from snapshots import table_snapshots
+from status import status_messages
+from storage import query
+from users import PlayerStats, UserData, user_cache
 
 
 # Tables below
-def create_tables() -> None:
-    create_main_table()
-    create_tables_table()
-
-
-def create_main_table() -> None:
-    with sqlite3.connect(DATABASE_PATH) as conn:
-        cursor: sqlite3.Cursor = conn.cursor()
-
-        cursor.execute(
-            """
-        CREATE TABLE IF NOT EXISTS users (
-            user_id INTEGER NOT NULL PRIMARY KEY,
-            money INTEGER NOT NULL DEFAULT 1000,
-            temp_money INTEGER NOT NULL DEFAULT 0,
-            lifttime_losses INTEGER NOT NULL DEFAULT 0,
-            lifttime_wins INTEGER NOT NULL DEFAULT 0,
-            lifttime_profit INTEGER NOT NULL DEFAULT 0,
-            joined_table INTEGER NOT NULL DEFAULT 0,
-            joined_table_name TEXT NOT NULL DEFAULT ""
-        )"""
+@query
+def create_tables(conn: sqlite3.Connection) -> None:
+    """Bring the schema up to date, see migrations.py"""
+    migrate(conn)
+
+
+@query
+def get_bot_state(conn: sqlite3.Connection, key: str) -> Optional[str]:
+    row: Optional[tuple[str]] = conn.execute(
+        "SELECT value FROM bot_state WHERE key = ?", (key,)
+    ).fetchone()
+    return row[0] if row else None
+
+
+@query
+def set_bot_state(conn: sqlite3.Connection, key: str, value: str) -> None:
+    with conn:
+        conn.execute(
+            "INSERT INTO bot_state (key, value) VALUES (?, ?) "
+            "ON CONFLICT (key) DO UPDATE SET value = excluded.value",
+            (key, value),
         )
 
 
-def create_tables_table() -> None:
-    with sqlite3.connect(DATABASE_PATH) as conn:
-        cursor: sqlite3.Cursor = conn.cursor()
-
-        cursor.execute(
-            """
-            CREATE TABLE IF NOT EXISTS tables (
-                table_id INTEGER NOT NULL PRIMARY KEY,
-                table_owner_id INTEGER NOT NULL,
-                temp_money BOOLEAN NOT NULL DEFAULT FALSE,
-                table_name TEXT NOT NULL,
-                min_bet INTEGER NOT NULL DEFAULT 5,
-                max_bet INTEGER NOT NULL DEFAULT 0,
-                last_message_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
-            )"""
+@timed("db")
+async def add_table(
+    table_id: int,
+    table_owner_id: int,
+    table_name: str,
+    temp_money: bool,
+    min_bet: int,
+    max_bet: int,
+    guild_id: int = 0,
+) -> None:
+    await _add_table(
+        table_id, table_owner_id, table_name, temp_money, min_bet, max_bet, guild_id
+    )
+    table_registry.add(
+        TableInfo(
+            table_id, table_owner_id, table_name, temp_money, min_bet, max_bet, guild_id
         )
+    )
+    table_expiry.arm(table_id)
 
 
-def add_table(
+@query
+def _add_table(
+    conn: sqlite3.Connection,
     table_id: int,
     table_owner_id: int,
     table_name: str,
     temp_money: bool,
     min_bet: int,
     max_bet: int,
+    guild_id: int,
 ) -> None:
-    with sqlite3.connect(DATABASE_PATH) as conn:
+    with conn:
         cursor: sqlite3.Cursor = conn.cursor()
 
         cursor.execute(
-            "INSERT INTO tables (table_id, table_owner_id, table_name, temp_money, min_bet, max_bet) VALUES (?, ?, ?, ?, ?, ?)",
-            (table_id, table_owner_id, table_name, temp_money, min_bet, max_bet),
+            "INSERT INTO tables (table_id, table_owner_id, table_name, temp_money, min_bet, max_bet, guild_id, last_activity) VALUES (?, ?, ?, ?, ?, ?, ?, CAST(strftime('%s', 'now') AS INTEGER))",
+            (
+                table_id,
+                table_owner_id,
+                table_name,
+                temp_money,
+                min_bet,
+                max_bet,
+                guild_id,
+            ),
         )
-        conn.commit()
 
 
-def delete_table(table_id: int) -> None:
-    with sqlite3.connect(DATABASE_PATH) as conn:
-        cursor: sqlite3.Cursor = conn.cursor()
-        cursor.execute("DELETE FROM tables WHERE table_id = ?", (table_id,))
-        conn.commit()
+@timed("db")
+async def delete_table(table_id: int) -> None:
+    """Everyone at the table is removed from it too, bots included"""
+    await delete_tables([table_id])
+
+
+def forget_table(table_id: int) -> None:
+    """Drop a deleted table from every in-memory structure"""
+    table_registry.remove(table_id)
+    table_expiry.cancel(table_id)
+    table_activity.forget(table_id)
+    table_actors.remove(table_id)
+    status_messages.forget(table_id)
+    table_snapshots.forget(table_id)
 
 
-def get_expired_tables(mintues: int = 5) -> list[int]:
+@timed("db")
+async def delete_tables(table_ids: list[int]) -> None:
     """
-    Get list of table IDs that have expired (older than specified hours since last message)
+    - Takes a list of table ids.
+    - Removes every user from those tables and deletes them, in one transaction.
+      Their temp money is taken back, so they start from TEMP_MONEY_STACK at
+      the next temp money table.
     """
-    with sqlite3.connect(DATABASE_PATH) as conn:
-        cursor: sqlite3.Cursor = conn.cursor()
-        cursor.execute(
-            """
-            SELECT table_id FROM tables 
-            WHERE datetime(last_message_at) < datetime('now', '-{} minutes')
-            """.format(
-                mintues
-            )
+    await _delete_tables(table_ids)
+    for table_id in table_ids:
+        user_cache.unseat_table(table_id)
+        forget_table(table_id)
+
+
+@query
+def _delete_tables(conn: sqlite3.Connection, table_ids: list[int]) -> None:
+    rows: list[tuple[int]] = [(table_id,) for table_id in table_ids]
+    with conn:
+        conn.executemany(
+            "INSERT INTO ledger (user_id, currency, delta, balance, kind, table_id) "
+            "SELECT user_id, 'temp_money', -temp_money, 0, ?2, ?1 FROM users WHERE joined_table = ?1 AND temp_money != 0",
+            [(table_id, LEDGER_RESET) for table_id in table_ids],
         )
-        table_ids: list[int] = [row[0] for row in cursor.fetchall()]
-        print(f"Expired tables: {table_ids}")
-        return table_ids
+        conn.executemany(
+            "UPDATE users SET joined_table = 0, joined_table_name = '', temp_money = 0 WHERE joined_table = ?",
+            rows,
+        )
+        conn.executemany("DELETE FROM tables WHERE table_id = ?", rows)
 
 
-def remove_all_users_from_table(table_id: int) -> None:
+@query
+def get_table_activity(conn: sqlite3.Connection) -> list[tuple[int, int]]:
     """
-    Remove all users from a specific table
+    - Returns (table id, last activity) for every table of this process'
+      shards, oldest first.
+    - Only read at startup to rebuild the expiry schedule, served from the
+      last_activity index.
     """
-    with sqlite3.connect(DATABASE_PATH) as conn:
+    shard, params = shard_config.where()
+    with conn:
         cursor: sqlite3.Cursor = conn.cursor()
         cursor.execute(
-            "UPDATE users SET joined_table = 0, joined_table_name = '' WHERE joined_table = ?",
-            (table_id,),
+            f"SELECT table_id, last_activity FROM tables WHERE {shard} ORDER BY last_activity",
+            params,
         )
-        conn.commit()
+        return cursor.fetchall()
 
 
-def channel_is_table(channel_id: int) -> bool:
-    """
-    - Takes a discord channel id.
-    - Check if a channel is a table.
-    - Returns True if the channel is a table, False otherwise.
-    """
-    with sqlite3.connect(DATABASE_PATH) as conn:
-        cursor: sqlite3.Cursor = conn.cursor()
-        cursor.execute("SELECT * FROM tables WHERE table_id = ?", (channel_id,))
-        return cursor.fetchone() is not None
+@timed("db")
+async def load_table_registry() -> None:
+    """Load every table into the in-memory registry"""
+    table_registry.load(await _get_all_tables())
 
 
-def get_table_name(user_id: int) -> str:
-    with sqlite3.connect(DATABASE_PATH) as conn:
+@query
+def _get_all_tables(conn: sqlite3.Connection) -> list[TableInfo]:
+    shard, params = shard_config.where()
+    with conn:
         cursor: sqlite3.Cursor = conn.cursor()
         cursor.execute(
-            "SELECT joined_table_name FROM users WHERE user_id = ?", (user_id,)
+            f"SELECT table_id, table_owner_id, table_name, temp_money, min_bet, max_bet, guild_id FROM tables WHERE {shard}",
+            params,
         )
-        return cursor.fetchone()[0]
+        return [TableInfo(*row) for row in cursor.fetchall()]
+
 
+@timed("db")
+async def get_table(table_id: int) -> Optional[TableInfo]:
+    """
+    - Takes a discord.Thread.id table id.
+    - Returns the table from the registry, or from the database if the registry
+      is not loaded yet. Returns None if the channel is not a table.
+    """
+    if table_registry.loaded:
+        return table_registry.get(table_id)
 
-def update_table_last_message_time(table_id: int) -> None:
-    """Update the last message time for a table"""
-    with sqlite3.connect(DATABASE_PATH) as conn:
+    table_registry.db_lookups += 1
+    return await _get_table(table_id)
+
+
+@query
+def _get_table(conn: sqlite3.Connection, table_id: int) -> Optional[TableInfo]:
+    with conn:
         cursor: sqlite3.Cursor = conn.cursor()
         cursor.execute(
-            "UPDATE tables SET last_message_at = CURRENT_TIMESTAMP WHERE table_id = ?",
+            "SELECT table_id, table_owner_id, table_name, temp_money, min_bet, max_bet, guild_id FROM tables WHERE table_id = ?",
             (table_id,),
         )
-        conn.commit()
+        row: Optional[tuple[int, int, str, bool, int, int, int]] = cursor.fetchone()
+        return TableInfo(*row) if row else None
 
 
-def get_table_last_message_time(table_id: int) -> Optional[str]:
-    """Get the last message time of a table"""
-    with sqlite3.connect(DATABASE_PATH) as conn:
-        cursor: sqlite3.Cursor = conn.cursor()
-        cursor.execute(
-            "SELECT last_message_at FROM tables WHERE table_id = ?", (table_id,)
-        )
-        result: Optional[tuple[str, ...]] = cursor.fetchone()
-        return result[0] if result else None
+@timed("db")
+async def channel_is_table(channel_id: int) -> bool:
+    """
+    - Takes a discord channel id.
+    - Check if a channel is a table.
+    - Returns True if the channel is a table, False otherwise.
+    """
+    return await get_table(channel_id) is not None
+
+
+@timed("db")
+async def get_table_name(user_id: int) -> str:
+    user: Optional[UserData] = await get_user_data(user_id)
+    return user.joined_table_name if user else ""
 
 
 # User Stuff below
-class UserData:
-    def __init__(
-        self,
-        user_id: int,
-        money: int,
-        temp_money: int,
-        lifttime_losses: int,
-        lifttime_wins: int,
-        lifttime_profit: int,
-        joined_table: int,
-        joined_table_name: str,
-    ):
-        self.user_id = user_id
-        self.money = money
-        self.temp_money = temp_money
-        self.lifttime_losses = lifttime_losses
-        self.lifttime_wins = lifttime_wins
-        self.lifttime_profit = lifttime_profit
-        self.joined_table = joined_table
-        self.joined_table_name = joined_table_name
-
-
-def user_is_owner_of_table(user_id: int, table_id: int) -> bool:
+@timed("db")
+async def user_is_owner_of_table(user_id: int, table_id: int) -> bool:
     """
     - Takes a discord.User user id and a discord.Thread.id table id.
     - Check if a user is the owner of a table.
     - Returns True if the user is the owner of the table, False otherwise.
     """
-    with sqlite3.connect(DATABASE_PATH) as conn:
-        cursor: sqlite3.Cursor = conn.cursor()
-        cursor.execute(
-            "SELECT * FROM tables WHERE table_id = ? AND table_owner_id = ?",
-            (table_id, user_id),
-        )
-        return cursor.fetchone() is not None
+    table: Optional[TableInfo] = await get_table(table_id)
+    return table is not None and table.table_owner_id == user_id
 
 
-def check_user_exists(user_id: int) -> bool:
+@timed("db")
+async def check_user_exists(user_id: int) -> bool:
     """
     - Check if a user exists in the main table.
     - Returns True if the user exists, False otherwise.
     """
-    with sqlite3.connect(DATABASE_PATH) as conn:
-        cursor: sqlite3.Cursor = conn.cursor()
+    return await get_user_data(user_id) is not None
 
-        cursor.execute("SELECT * FROM users WHERE user_id = ?", (user_id,))
-        return cursor.fetchone() is not None
 
+@timed("db")
+async def add_user(user_id: int, money: int = 1000) -> None:
+    if await _add_user(user_id, money):
+        user_cache.put(UserData(user_id, money, 0, 0, 0, 0, 0, ""))
+        leaderboards.update("money", user_id, money)
+        leaderboards.update("lifttime_profit", user_id, 0)
+        leaderboards.update("lifttime_wins", user_id, 0)
 
-def add_user(user_id: int, money: int = 1000) -> None:
-    with sqlite3.connect(DATABASE_PATH) as conn:
-        if not check_user_exists(user_id):
-            cursor: sqlite3.Cursor = conn.cursor()
 
-            cursor.execute(
-                "INSERT INTO users (user_id, money, temp_money, lifttime_losses, lifttime_wins, lifttime_profit, joined_table) VALUES (?, ?, ?, ?, ?, ?, ?)",
-                (user_id, money, 0, 0, 0, 0, 0),
-            )
-            conn.commit()
+@query
+def _add_user(conn: sqlite3.Connection, user_id: int, money: int) -> bool:
+    """Returns True if the user was added, False if they already existed"""
+    with conn:
+        cursor: sqlite3.Cursor = conn.cursor()
+
+        cursor.execute(
+            "INSERT OR IGNORE INTO users (user_id, money, temp_money, lifttime_losses, lifttime_wins, lifttime_profit, joined_table) VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (user_id, money, 0, 0, 0, 0, 0),
+        )
+        if cursor.rowcount != 1:
+            return False
+        cursor.execute(
+            "INSERT INTO ledger (user_id, currency, delta, balance, kind) VALUES (?, 'money', ?, ?, ?)",
+            (user_id, money, money, LEDGER_GRANT),
+        )
+        return True
 
 
-def get_user_data(user_id: int) -> Optional[UserData]:
-    with sqlite3.connect(DATABASE_PATH) as conn:
+@timed("db")
+async def get_user_data(user_id: int) -> Optional[UserData]:
+    """
+    - Takes a discord.User user id.
+    - Returns the user from the cache, or reads it from the database and
+      caches it. Returns None if the user doesn't exist.
+    """
+    user: Optional[UserData] = user_cache.get(user_id)
+    if user is None:
+        user = await _get_user_data(user_id)
+        if user is not None:
+            user_cache.put(user)
+    return user
+
+
+@query
+def _get_user_data(conn: sqlite3.Connection, user_id: int) -> Optional[UserData]:
+    with conn:
         cursor: sqlite3.Cursor = conn.cursor()
 
         cursor.execute("SELECT * FROM users WHERE user_id = ?", (user_id,))
@@ -220,35 +293,56 @@ def get_user_data(user_id: int) -> Optional[UserData]:
         if data is None:
             return None
 
-        return UserData(
-            user_id=data[0],
-            money=data[1],
-            temp_money=data[2],
-            lifttime_losses=data[3],
-            lifttime_wins=data[4],
-            lifttime_profit=data[5],
-            joined_table=data[6],
-            joined_table_name=data[7],
-        )
+        return UserData(*data)
 
 
-def user_is_in_table(user_id: int) -> bool:
-    with sqlite3.connect(DATABASE_PATH) as conn:
-        cursor: sqlite3.Cursor = conn.cursor()
-        cursor.execute(
-            "SELECT * FROM users WHERE user_id = ? AND joined_table != 0",
-            (user_id,),
-        )
-        return cursor.fetchone() is not None
+@timed("db")
+async def get_player_stats(user_id: int) -> PlayerStats:
+    """
+    - Takes a discord.User user id.
+    - Returns their poker stats, all zero if they never finished a hand.
+    """
+    return await _get_player_stats(user_id)
 
 
-def add_user_to_table(user_id: int, table_id: int) -> None:
+@query
+def _get_player_stats(conn: sqlite3.Connection, user_id: int) -> PlayerStats:
+    row: Optional[tuple[int, ...]] = conn.execute(
+        "SELECT * FROM player_stats WHERE user_id = ?", (user_id,)
+    ).fetchone()
+    return PlayerStats(*row) if row is not None else PlayerStats(user_id)
+
+
+@timed("db")
+async def user_is_in_table(user_id: int) -> bool:
+    """
+    - When sharded the user may have sat down through another process, so the
+      check before seating always reads the database.
+    """
+    user: Optional[UserData]
+    if shard_config.sharded:
+        user = await _get_user_data(user_id)
+        if user is not None:
+            user_cache.put(user)
+    else:
+        user = await get_user_data(user_id)
+    return user is not None and user.joined_table != 0
+
+
+@timed("db")
+async def add_user_to_table(user_id: int, table_id: int) -> None:
     """
     - Takes a discord.User user id and a discord.Thread.id table id.
     - Add a user to a table.
-    - Returns True if the user is added to the table, False otherwise.
     """
-    with sqlite3.connect(DATABASE_PATH) as conn:
+    table_name: str = await _add_user_to_table(user_id, table_id)
+    user_cache.seat(user_id, table_id, table_name)
+
+
+@query
+def _add_user_to_table(conn: sqlite3.Connection, user_id: int, table_id: int) -> str:
+    """Returns the name of the table the user was added to"""
+    with conn:
         cursor: sqlite3.Cursor = conn.cursor()
         cursor.execute("SELECT table_name FROM tables WHERE table_id = ?", (table_id,))
         table_name_row: Optional[tuple[str, ...]] = cursor.fetchone()
@@ -257,14 +351,287 @@ def add_user_to_table(user_id: int, table_id: int) -> None:
             "UPDATE users SET joined_table = ?, joined_table_name = ? WHERE user_id = ?",
             (table_id, table_name, user_id),
         )
-        conn.commit()
+        return table_name
+
 
+@timed("db")
+async def remove_user_from_table(user_id: int) -> None:
+    """Their temp money is taken back, like when the table is deleted"""
+    await _remove_user_from_table(user_id)
+    user_cache.seat(user_id, 0, "")
+    user_cache.set_chips(user_id, 0, True)
 
-def remove_user_from_table(user_id: int) -> None:
-    with sqlite3.connect(DATABASE_PATH) as conn:
+
+@query
+def _remove_user_from_table(conn: sqlite3.Connection, user_id: int) -> None:
+    with conn:
         cursor: sqlite3.Cursor = conn.cursor()
         cursor.execute(
-            "UPDATE users SET joined_table = 0, joined_table_name = '' WHERE user_id = ?",
+            "INSERT INTO ledger (user_id, currency, delta, balance, kind, table_id) "
+            "SELECT user_id, 'temp_money', -temp_money, 0, ?2, joined_table FROM users WHERE user_id = ?1 AND temp_money != 0",
+            (user_id, LEDGER_RESET),
+        )
+        cursor.execute(
+            "UPDATE users SET joined_table = 0, joined_table_name = '', temp_money = 0 WHERE user_id = ?",
             (user_id,),
         )
-        conn.commit()
+
+
+@timed("db")
+async def get_table_players(table_id: int) -> list[tuple[int, int]]:
+    """
+    - Takes a discord.Thread.id table id.
+    - Returns (user id, chips) for every user in the table, using temp money
+      for temp money tables. Players new to a temp money table get
+      TEMP_MONEY_STACK chips.
+    """
+    players: list[tuple[int, int]] = await _get_table_players(table_id)
+    table: Optional[TableInfo] = await get_table(table_id)
+    if table is not None and table.temp_money:
+        for user_id, chips in players:
+            user_cache.set_chips(user_id, chips, True)
+    return players
+
+
+@query
+def _get_table_players(
+    conn: sqlite3.Connection, table_id: int
+) -> list[tuple[int, int]]:
+    with conn:
+        cursor: sqlite3.Cursor = conn.cursor()
+        cursor.execute("SELECT temp_money FROM tables WHERE table_id = ?", (table_id,))
+        table_row: Optional[tuple[bool]] = cursor.fetchone()
+        if table_row is None:
+            return []
+
+        if table_row[0]:
+            cursor.execute(
+                "INSERT INTO ledger (user_id, currency, delta, balance, kind, table_id) "
+                "SELECT user_id, 'temp_money', ?1, ?1, ?2, ?3 FROM users WHERE joined_table = ?3 AND temp_money = 0",
+                (TEMP_MONEY_STACK, LEDGER_GRANT, table_id),
+            )
+            cursor.execute(
+                "UPDATE users SET temp_money = ? WHERE joined_table = ? AND temp_money = 0",
+                (TEMP_MONEY_STACK, table_id),
+            )
+            cursor.execute(
+                "SELECT user_id, temp_money FROM users WHERE joined_table = ? ORDER BY user_id",
+                (table_id,),
+            )
+        else:
+            cursor.execute(
+                "SELECT user_id, money FROM users WHERE joined_table = ? ORDER BY user_id",
+                (table_id,),
+            )
+        return cursor.fetchall()
+
+
+# Bots below
+@timed("db")
+async def add_bots(table_id: int, count: int) -> list[int]:
+    """
+    - Takes a discord.Thread.id table id and how many bots to seat.
+    - Seats that many free bots, as far as there are free seats. Bots with
+      less than BOT_STACK chips are topped up, recorded as ledger grants.
+    - Returns the ids of the bots that sat down.
+    """
+    table: Optional[TableInfo] = await get_table(table_id)
+    if table is None:
+        return []
+    rows: list[tuple[int, int]] = await _add_bots(table_id, table.table_name, count)
+    for bot_id, money in rows:
+        user_cache.forget(bot_id)
+        leaderboards.update("money", bot_id, money)
+    return [bot_id for bot_id, _ in rows]
+
+
+@query
+def _add_bots(
+    conn: sqlite3.Connection, table_id: int, table_name: str, count: int
+) -> list[tuple[int, int]]:
+    with conn:
+        cursor: sqlite3.Cursor = conn.cursor()
+        # Bots get their account the first time they're needed
+        cursor.executemany(
+            "INSERT OR IGNORE INTO users (user_id, money) VALUES (?, ?)",
+            [(-bot, BOT_STACK) for bot in range(1, BOT_COUNT + 1)],
+        )
+        cursor.execute(
+            "INSERT INTO ledger (user_id, currency, delta, balance, kind) "
+            "SELECT user_id, 'money', money, money, ? FROM users "
+            "WHERE user_id < 0 AND NOT EXISTS (SELECT 1 FROM ledger WHERE ledger.user_id = users.user_id)",
+            (LEDGER_GRANT,),
+        )
+
+        cursor.execute("SELECT COUNT(*) FROM users WHERE joined_table = ?", (table_id,))
+        seats: int = max(0, min(count, MAX_SEATS - cursor.fetchone()[0]))
+        # One statement picks and seats them, so two processes can't seat the same bot
+        cursor.execute(
+            "UPDATE users SET joined_table = ?, joined_table_name = ? WHERE user_id IN "
+            "(SELECT user_id FROM users WHERE user_id < 0 AND joined_table = 0 ORDER BY user_id DESC LIMIT ?) "
+            "RETURNING user_id",
+            (table_id, table_name, seats),
+        )
+        bot_ids: list[int] = [row[0] for row in cursor.fetchall()]
+
+        cursor.executemany(
+            "INSERT INTO ledger (user_id, currency, delta, balance, kind, table_id) "
+            "SELECT user_id, 'money', ?1 - money, ?1, ?2, ?3 FROM users WHERE user_id = ?4 AND money < ?1",
+            [(BOT_STACK, LEDGER_GRANT, table_id, bot_id) for bot_id in bot_ids],
+        )
+        cursor.executemany(
+            "UPDATE users SET money = ?1 WHERE user_id = ?2 AND money < ?1",
+            [(BOT_STACK, bot_id) for bot_id in bot_ids],
+        )
+        cursor.execute(
+            f"SELECT user_id, money FROM users WHERE user_id IN ({','.join('?' * len(bot_ids))})",
+            bot_ids,
+        )
+        return cursor.fetchall()
+
+
+@timed("db")
+async def remove_bots(table_id: int) -> list[int]:
+    """
+    - Takes a discord.Thread.id table id.
+    - Returns the ids of the bots that were removed from it.
+    """
+    bot_ids: list[int] = await _remove_bots(table_id)
+    for bot_id in bot_ids:
+        user_cache.forget(bot_id)
+    return bot_ids
+
+
+@query
+def _remove_bots(conn: sqlite3.Connection, table_id: int) -> list[int]:
+    with conn:
+        cursor: sqlite3.Cursor = conn.cursor()
+        cursor.execute(
+            "INSERT INTO ledger (user_id, currency, delta, balance, kind, table_id) "
+            "SELECT user_id, 'temp_money', -temp_money, 0, ?2, ?1 FROM users WHERE joined_table = ?1 AND user_id < 0 AND temp_money != 0",
+            (table_id, LEDGER_RESET),
+        )
+        cursor.execute(
+            "UPDATE users SET joined_table = 0, joined_table_name = '', temp_money = 0 "
+            "WHERE joined_table = ? AND user_id < 0 RETURNING user_id",
+            (table_id,),
+        )
+        return [row[0] for row in cursor.fetchall()]
+
+
+@timed("db")
+async def settle_hand(settlement: Settlement) -> None:
+    """
+    - Takes the settlement of a finished hand.
+    - Applies every player's result and ledger row in one transaction, then
+      brings the cache and leaderboards up to date from the written rows.
+    """
+    rows: list[tuple[int, int, int, int, int, int]] = await _settle_hand(settlement)
+    for user_id, money, temp_money, losses, wins, profit in rows:
+        user_cache.set_balances(user_id, money, temp_money, losses, wins, profit)
+        if not settlement.temp_money:
+            leaderboards.update("money", user_id, money)
+            leaderboards.update("lifttime_wins", user_id, wins)
+            leaderboards.update("lifttime_profit", user_id, profit)
+
+
+_settle_hand = query(apply_settlement)
+
+
+@timed("db")
+async def hand_is_settled(table_id: int, hand_number: int, user_id: int) -> bool:
+    """
+    - Takes a hand and one of its players.
+    - Returns whether the hand's ledger rows were written, for hands that
+      ended right before a crash (see snapshots.py).
+    """
+    return await _hand_is_settled(table_id, hand_number, user_id)
+
+
+@query
+def _hand_is_settled(
+    conn: sqlite3.Connection, table_id: int, hand_number: int, user_id: int
+) -> bool:
+    # Walks the player's ledger rows from the newest, the hand is one of them
+    return (
+        conn.execute(
+            "SELECT 1 FROM ledger WHERE user_id = ? AND kind = ? AND table_id = ? AND hand_number = ? "
+            "ORDER BY entry_id DESC LIMIT 1",
+            (user_id, LEDGER_HAND, table_id, hand_number),
+        ).fetchone()
+        is not None
+    )
+
+
+# Leaderboard below
+@timed("db")
+async def get_leaderboard(
+    metric: str, offset: int, limit: int
+) -> list[tuple[int, int]]:
+    """
+    - Takes one of LEADERBOARD_METRICS and the ranks to show.
+    - Returns (user id, value) for those ranks, best first. The top ranks come
+      from memory, loading them first if needed, deeper pages from the index.
+    """
+    board: Leaderboard = leaderboards.get(metric)
+    if offset + limit <= LEADERBOARD_SIZE:
+        if not board.covers(offset + limit):
+            board.load(
+                await _get_top_users(metric, 0, 2 * LEADERBOARD_SIZE),
+                2 * LEADERBOARD_SIZE,
+            )
+        return board.page(offset, limit)
+    return await _get_top_users(metric, offset, limit)
+
+
+@timed("db")
+async def get_user_rank(metric: str, user_id: int) -> Optional[int]:
+    """
+    - Takes one of LEADERBOARD_METRICS and a discord.User user id.
+    - Returns the user's 1-based rank, None if they don't exist or are a bot.
+    """
+    if user_id < 0:
+        return None
+    rank: Optional[int] = leaderboards.get(metric).rank(user_id)
+    if rank is not None:
+        return rank
+    return await _get_user_rank(metric, user_id)
+
+
+@query
+def _get_top_users(
+    conn: sqlite3.Connection, metric: str, offset: int, limit: int
+) -> list[tuple[int, int]]:
+    if metric not in LEADERBOARD_METRICS:
+        raise ValueError(f"Unknown leaderboard {metric}")
+    with conn:
+        cursor: sqlite3.Cursor = conn.cursor()
+        cursor.execute(
+            f"SELECT user_id, {metric} FROM users WHERE user_id >= 0 ORDER BY {metric} DESC, user_id LIMIT ? OFFSET ?",
+            (limit, offset),
+        )
+        return cursor.fetchall()
+
+
+@query
+def _get_user_rank(
+    conn: sqlite3.Connection, metric: str, user_id: int
+) -> Optional[int]:
+    if metric not in LEADERBOARD_METRICS:
+        raise ValueError(f"Unknown leaderboard {metric}")
+    with conn:
+        cursor: sqlite3.Cursor = conn.cursor()
+        cursor.execute(f"SELECT {metric} FROM users WHERE user_id = ?", (user_id,))
+        row: Optional[tuple[int]] = cursor.fetchone()
+        if row is None:
+            return None
+        # Two range counts on the index, an OR would scan it
+        above: int = cursor.execute(
+            f"SELECT COUNT(*) FROM users WHERE {metric} > ? AND user_id >= 0",
+            (row[0],),
+        ).fetchone()[0]
+        tied: int = cursor.execute(
+            f"SELECT COUNT(*) FROM users WHERE {metric} = ? AND user_id BETWEEN 0 AND ? - 1",
+            (row[0], user_id),
+        ).fetchone()[0]
+        return above + tied + 1
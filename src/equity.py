@@ -0,0 +1,145 @@
+import itertools
+import math
+from typing import Optional
+
+import numpy as np
+import numpy.typing as npt
+
+from evaluator import evaluate_batch
+
+MAX_OPPONENTS: int = 9
+# Simulations are run in chunks so memory stays flat for large sample counts
+CHUNK_SIZE: int = 25_000
+
+
+class EquityResult:
+    def __init__(
+        self, win: float, tie: float, equity: float, samples: int, exact: bool
+    ):
+        self.win = win  # Share of runouts the hero wins outright
+        self.tie = tie  # Share of runouts the hero splits
+        self.equity = equity  # Expected share of the pot
+        self.samples = samples
+        self.exact = exact
+
+
+def _showdown(
+    hole: list[int], board: list[int], drawn: npt.NDArray[np.integer], opponents: int
+) -> tuple[float, float, float]:
+    """
+    - Takes the hero's cards, the known board and one row of drawn cards per
+      runout: the missing board cards, then two cards per opponent.
+    - Returns the summed wins, ties and pot shares over all rows.
+    """
+    rows: int = len(drawn)
+    missing: int = 5 - len(board)
+    full_board: npt.NDArray[np.integer] = np.concatenate(
+        [
+            np.broadcast_to(np.array(board, dtype=drawn.dtype), (rows, len(board))),
+            drawn[:, :missing],
+        ],
+        axis=1,
+    )
+
+    hero: npt.NDArray[np.int16] = evaluate_batch(
+        np.concatenate(
+            [np.broadcast_to(np.array(hole, dtype=drawn.dtype), (rows, 2)), full_board],
+            axis=1,
+        )
+    )
+    best: npt.NDArray[np.int16] = np.zeros(rows, dtype=np.int16)
+    best_count: npt.NDArray[np.int8] = np.zeros(rows, dtype=np.int8)
+    for opponent in range(opponents):
+        start: int = missing + 2 * opponent
+        strength: npt.NDArray[np.int16] = evaluate_batch(
+            np.concatenate([drawn[:, start : start + 2], full_board], axis=1)
+        )
+        best_count = np.where(
+            strength > best, 1, best_count + (strength == best)
+        ).astype(np.int8)
+        np.maximum(best, strength, out=best)
+
+    wins: npt.NDArray[np.bool_] = hero > best
+    ties: npt.NDArray[np.bool_] = hero == best
+    shares: npt.NDArray[np.float64] = np.where(wins, 1.0, ties / (best_count + 1.0))
+    return float(wins.sum()), float(ties.sum()), float(shares.sum())
+
+
+def _exact_runouts(deck: list[int], missing: int) -> npt.NDArray[np.uint8]:
+    """Every board completion and opponent hand, for a single opponent"""
+    rows: list[list[int]] = []
+    for completion in itertools.combinations(deck, missing):
+        rest: list[int] = [card for card in deck if card not in completion]
+        rows.extend(
+            [*completion, *opponent] for opponent in itertools.combinations(rest, 2)
+        )
+    return np.array(rows, dtype=np.uint8).reshape(len(rows), missing + 2)
+
+
+def equity(
+    hole: list[int],
+    board: list[int],
+    opponents: int = 1,
+    samples: int = 100_000,
+    seed: Optional[int] = None,
+) -> EquityResult:
+    """
+    - Takes the hero's two hole cards, 0 or 3-5 board cards and the number of
+      opponents holding random hands.
+    - Enumerates every runout when there is a single opponent and at most
+      `samples` runouts, otherwise runs `samples` random runouts.
+    - Raises ValueError on invalid input.
+    """
+    if len(hole) != 2:
+        raise ValueError("You need exactly 2 hole cards")
+    if len(board) not in (0, 3, 4, 5):
+        raise ValueError("The board has 0, 3, 4 or 5 cards")
+    if len(set(hole + board)) != len(hole) + len(board):
+        raise ValueError("The same card is used twice")
+    if not 1 <= opponents <= MAX_OPPONENTS:
+        raise ValueError(f"You can have 1 to {MAX_OPPONENTS} opponents")
+
+    known: set[int] = set(hole + board)
+    deck: list[int] = [card for card in range(52) if card not in known]
+    missing: int = 5 - len(board)
+    needed: int = missing + 2 * opponents
+
+    exact_count: int = math.comb(len(deck), missing) * math.comb(len(deck) - missing, 2)
+    if opponents == 1 and exact_count <= samples:
+        wins, ties, shares = _showdown(
+            hole, board, _exact_runouts(deck, missing), opponents
+        )
+        return EquityResult(
+            wins / exact_count,
+            ties / exact_count,
+            shares / exact_count,
+            exact_count,
+            True,
+        )
+
+    rng: np.random.Generator = np.random.default_rng(seed)
+    deck_array: npt.NDArray[np.uint8] = np.array(deck, dtype=np.uint8)
+    total_wins: float = 0.0
+    total_ties: float = 0.0
+    total_shares: float = 0.0
+    for start in range(0, samples, CHUNK_SIZE):
+        rows: int = min(CHUNK_SIZE, samples - start)
+        # A random partial permutation of the deck per row: the `needed` cards
+        # with the smallest random keys, in key order
+        keys: npt.NDArray[np.float32] = rng.random((rows, len(deck)), dtype=np.float32)
+        picks: npt.NDArray[np.intp] = keys.argpartition(needed - 1, axis=1)[:, :needed]
+        picks = np.take_along_axis(
+            picks, np.take_along_axis(keys, picks, axis=1).argsort(axis=1), axis=1
+        )
+        wins, ties, shares = _showdown(hole, board, deck_array[picks], opponents)
+        total_wins += wins
+        total_ties += ties
+        total_shares += shares
+
+    return EquityResult(
+        total_wins / samples,
+        total_ties / samples,
+        total_shares / samples,
+        samples,
+        False,
+    )
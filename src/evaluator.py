@@ -0,0 +1,269 @@
+"""
+Table-lookup poker hand evaluator.
+
+- Cards are ints 0-51: `rank * 4 + suit`, rank 0-12 is 2-A, suit 0-3 is cdhs.
+- A hand of 5-7 cards evaluates to a strength from 1 to 7462, higher is better,
+  equal strengths are a tie.
+- Non-flush hands are looked up by the sum of a per-rank key. The keys are
+  chosen so that every multiset of 5, 6 or 7 ranks has a distinct sum, so for
+  7 cards the sum indexes a flat table directly. Flushes are looked up by the
+  13 bit mask of ranks in the flush suit. The tables are built once at import.
+"""
+
+import itertools
+from typing import Iterable, Optional, Sequence
+
+import numpy as np
+import numpy.typing as npt
+
+RANKS: str = "23456789TJQKA"
+SUITS: str = "cdhs"
+
+HAND_CATEGORIES: tuple[str, ...] = (
+    "High Card",
+    "Pair",
+    "Two Pair",
+    "Three of a Kind",
+    "Straight",
+    "Flush",
+    "Full House",
+    "Four of a Kind",
+    "Straight Flush",
+)
+
+# Every multiset of 7 (or 6, or 5) ranks has a distinct sum of these keys
+_RANK_KEYS: tuple[int, ...] = (
+    0,
+    1,
+    5,
+    22,
+    98,
+    453,
+    2031,
+    8698,
+    22854,
+    83661,
+    262349,
+    636345,
+    1479181,
+)
+
+# Straights by top rank, the wheel (A2345) counts as 5 high
+_STRAIGHTS: list[tuple[int, int]] = [
+    (0b1111100000000 >> shift, 12 - shift) for shift in range(9)
+] + [(0b1000000001111, 3)]
+
+
+def parse_card(text: str) -> int:
+    """
+    - Takes a card like "As" or "td".
+    - Returns its integer encoding, raises ValueError if it isn't a card.
+    """
+    if len(text) != 2 or text[0].upper() not in RANKS or text[1].lower() not in SUITS:
+        raise ValueError(f"{text!r} is not a card")
+    return RANKS.index(text[0].upper()) * 4 + SUITS.index(text[1].lower())
+
+
+def parse_cards(text: str) -> list[int]:
+    """Parse cards like "AsKd" or "As Kd", raises ValueError on duplicates"""
+    text = text.replace(" ", "").replace(",", "")
+    if len(text) % 2:
+        raise ValueError(f"{text!r} is not a list of cards")
+    cards: list[int] = [parse_card(text[i : i + 2]) for i in range(0, len(text), 2)]
+    if len(set(cards)) != len(cards):
+        raise ValueError(f"{text!r} contains the same card twice")
+    return cards
+
+
+def card_str(card: int) -> str:
+    return RANKS[card >> 2] + SUITS[card & 3]
+
+
+def cards_str(cards: Iterable[int]) -> str:
+    return " ".join(card_str(card) for card in cards)
+
+
+def _straight_top(mask: int) -> Optional[int]:
+    for straight, top in _STRAIGHTS:
+        if mask & straight == straight:
+            return top
+    return None
+
+
+def _rank_value(counts: Sequence[int]) -> tuple[int, ...]:
+    """Best five card value of a multiset of ranks, ignoring flushes"""
+    by_count: list[list[int]] = [[], [], [], [], []]
+    mask: int = 0
+    for rank in range(12, -1, -1):
+        if counts[rank]:
+            by_count[counts[rank]].append(rank)
+            mask |= 1 << rank
+    quads, trips, pairs = by_count[4], by_count[3], by_count[2]
+    singles: list[int] = sorted(
+        [rank for rank in range(13) if counts[rank]], reverse=True
+    )
+
+    if quads:
+        return (7, quads[0], max(rank for rank in singles if rank != quads[0]))
+    if trips and len(trips) + len(pairs) >= 2:
+        return (6, trips[0], max(trips[1:] + pairs))
+
+    top: Optional[int] = _straight_top(mask)
+    if top is not None:
+        return (4, top)
+    if trips:
+        return (3, trips[0], *[rank for rank in singles if rank != trips[0]][:2])
+    if len(pairs) >= 2:
+        kicker: int = max(rank for rank in singles if rank not in pairs[:2])
+        return (2, pairs[0], pairs[1], kicker)
+    if pairs:
+        return (1, pairs[0], *[rank for rank in singles if rank != pairs[0]][:3])
+    return (0, *singles[:5])
+
+
+def _flush_value(mask: int) -> tuple[int, ...]:
+    """Best five card value of a set of suited ranks"""
+    top: Optional[int] = _straight_top(mask)
+    if top is not None:
+        return (8, top)
+    return (5, *[rank for rank in range(12, -1, -1) if mask >> rank & 1][:5])
+
+
+def _build_tables() -> (
+    tuple[dict[int, dict[int, int]], list[int], list[int], npt.NDArray[np.int16]]
+):
+    rank_values: dict[int, dict[int, tuple[int, ...]]] = {5: {}, 6: {}, 7: {}}
+    for size, values in rank_values.items():
+        for ranks in itertools.combinations_with_replacement(range(13), size):
+            counts: list[int] = [0] * 13
+            for rank in ranks:
+                counts[rank] += 1
+            if max(counts) > 4:
+                continue
+            key: int = sum(_RANK_KEYS[rank] for rank in ranks)
+            if key in values:
+                raise RuntimeError(f"Rank keys collide on {size} card hands")
+            values[key] = _rank_value(counts)
+
+    flush_values: dict[int, tuple[int, ...]] = {
+        mask: _flush_value(mask) for mask in range(1 << 13) if mask.bit_count() >= 5
+    }
+
+    # Dense strengths, 1 is the worst five card hand
+    ordered: list[tuple[int, ...]] = sorted(
+        set(rank_values[5].values()) | set(flush_values.values())
+    )
+    strength_of: dict[tuple[int, ...], int] = {
+        value: strength for strength, value in enumerate(ordered, start=1)
+    }
+    category_of: list[int] = [0] + [value[0] for value in ordered]
+
+    nonflush: dict[int, dict[int, int]] = {
+        size: {key: strength_of[value] for key, value in values.items()}
+        for size, values in rank_values.items()
+    }
+    flush: list[int] = [0] * (1 << 13)
+    for mask, value in flush_values.items():
+        flush[mask] = strength_of[value]
+
+    seven: npt.NDArray[np.int16] = np.zeros(max(nonflush[7]) + 1, dtype=np.int16)
+    seven[list(nonflush[7])] = list(nonflush[7].values())
+    return nonflush, flush, category_of, seven
+
+
+_NONFLUSH, _FLUSH, _CATEGORY_OF, _NONFLUSH_7_NP = _build_tables()
+HAND_CLASSES: int = len(_CATEGORY_OF) - 1
+
+_CARD_KEY: list[int] = [_RANK_KEYS[card >> 2] for card in range(52)]
+_CARD_SUIT_BIT: list[tuple[int, int]] = [
+    (card & 3, 1 << (card >> 2)) for card in range(52)
+]
+
+# NumPy versions. A card's key also counts its suit in the low 12 bits, 3 bits
+# per suit, so one sum gives both the rank key and the suit counts of a hand
+_SUIT_SHIFT: int = 12
+_CARD_KEY_NP: npt.NDArray[np.int64] = np.array(
+    [(_CARD_KEY[card] << _SUIT_SHIFT) | (1 << (3 * (card & 3))) for card in range(52)],
+    dtype=np.int64,
+)
+_CARD_BIT_NP: npt.NDArray[np.int64] = np.array(
+    [1 << (card >> 2) for card in range(52)], dtype=np.int64
+)
+_FLUSH_NP: npt.NDArray[np.int16] = np.array(_FLUSH, dtype=np.int16)
+# Suit counts -> the suit with at least 5 cards, or -1
+_FLUSH_SUIT_NP: npt.NDArray[np.int8] = np.array(
+    [
+        next((suit for suit in range(4) if counts >> (3 * suit) & 7 >= 5), -1)
+        for counts in range(1 << _SUIT_SHIFT)
+    ],
+    dtype=np.int8,
+)
+_NONFLUSH_NP: dict[int, tuple[npt.NDArray[np.int64], npt.NDArray[np.int16]]] = {
+    size: (
+        np.array(sorted(table), dtype=np.int64),
+        np.array([table[key] for key in sorted(table)], dtype=np.int16),
+    )
+    for size, table in _NONFLUSH.items()
+}
+
+
+def evaluate(cards: Sequence[int]) -> int:
+    """
+    - Takes 5 to 7 distinct cards.
+    - Returns the strength of the best five card hand, higher is better.
+    """
+    key: int = 0
+    masks: list[int] = [0, 0, 0, 0]
+    for card in cards:
+        key += _CARD_KEY[card]
+        suit, bit = _CARD_SUIT_BIT[card]
+        masks[suit] |= bit
+
+    # With at most 7 cards a flush can't share the hand with quads or a full
+    # house, so it's always the best hand when there is one
+    for mask in masks:
+        strength: int = _FLUSH[mask]
+        if strength:
+            return strength
+    return _NONFLUSH[len(cards)][key]
+
+
+def evaluate_batch(cards: npt.NDArray[np.integer]) -> npt.NDArray[np.int16]:
+    """
+    - Takes an (n, k) array of cards, 5 <= k <= 7, one hand per row.
+    - Returns the n strengths, without a Python loop over the hands.
+    """
+    size: int = cards.shape[1]
+    columns: npt.NDArray[np.integer] = np.ascontiguousarray(cards.T)
+    keys: npt.NDArray[np.int64] = _CARD_KEY_NP[columns[0]]
+    for column in columns[1:]:
+        keys += _CARD_KEY_NP[column]
+
+    rank_keys: npt.NDArray[np.int64] = keys >> _SUIT_SHIFT
+    strengths: npt.NDArray[np.int16]
+    if size == 7:
+        strengths = _NONFLUSH_7_NP[rank_keys]
+    else:
+        sorted_keys, sorted_strengths = _NONFLUSH_NP[size]
+        strengths = sorted_strengths[np.searchsorted(sorted_keys, rank_keys)]
+
+    # Only the few hands with a flush need their suited rank mask
+    flush_suits: npt.NDArray[np.int8] = _FLUSH_SUIT_NP[keys & ((1 << _SUIT_SHIFT) - 1)]
+    rows: npt.NDArray[np.intp] = np.flatnonzero(flush_suits >= 0)
+    if rows.size:
+        flush_cards: npt.NDArray[np.integer] = cards[rows]
+        suited: npt.NDArray[np.bool_] = (flush_cards & 3) == flush_suits[rows, None]
+        masks: npt.NDArray[np.int64] = np.where(
+            suited, _CARD_BIT_NP[flush_cards], 0
+        ).sum(axis=1)
+        strengths[rows] = _FLUSH_NP[masks]
+    return strengths
+
+
+def hand_category(strength: int) -> int:
+    """Index into HAND_CATEGORIES for a strength"""
+    return _CATEGORY_OF[strength]
+
+
+def describe(strength: int) -> str:
+    return HAND_CATEGORIES[_CATEGORY_OF[strength]]
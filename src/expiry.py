@@ -0,0 +1,94 @@
+import asyncio
+import heapq
+import time
+from typing import Awaitable, Callable, Optional
+
+from activity import table_activity
+from constants import TABLE_EXPIRY_MINUTES
+
+
+class ExpiryScheduler:
+    """
+    - Keeps one deadline per table in a min-heap.
+    - Activity does not touch the heap: when a deadline comes up, the table's
+      latest activity is checked and the entry is pushed back if it moved.
+    - Due tables are handed to `on_expire` in a single batch.
+    """
+
+    def __init__(self, ttl: float = TABLE_EXPIRY_MINUTES * 60) -> None:
+        self.ttl: float = ttl
+        self._heap: list[tuple[float, int]] = []
+        self._armed_at: dict[int, float] = {}
+        self._wakeup: asyncio.Event = asyncio.Event()
+        self._task: Optional[asyncio.Task[None]] = None
+
+    def __len__(self) -> int:
+        return len(self._armed_at)
+
+    def arm(self, table_id: int, last_activity: Optional[float] = None) -> None:
+        """Start tracking a table, counting from its last activity (default now)"""
+        if last_activity is None:
+            last_activity = time.time()
+        self._armed_at[table_id] = last_activity
+        deadline: float = last_activity + self.ttl
+        if not self._heap or deadline < self._heap[0][0]:
+            self._wakeup.set()
+        heapq.heappush(self._heap, (deadline, table_id))
+
+    def cancel(self, table_id: int) -> None:
+        """Stop tracking a table, its heap entry is dropped when it comes up"""
+        self._armed_at.pop(table_id, None)
+
+    def deadline(self, table_id: int) -> Optional[float]:
+        armed_at: Optional[float] = self._armed_at.get(table_id)
+        if armed_at is None:
+            return None
+        return max(armed_at, table_activity.last_activity.get(table_id, 0.0)) + self.ttl
+
+    def pop_due(self, now: float) -> list[int]:
+        """Pop every table whose real deadline has passed"""
+        due: list[int] = []
+        while self._heap and self._heap[0][0] <= now:
+            _, table_id = heapq.heappop(self._heap)
+            deadline: Optional[float] = self.deadline(table_id)
+            if deadline is None:
+                continue  # Cancelled, or a stale duplicate entry
+            if deadline > now:
+                heapq.heappush(self._heap, (deadline, table_id))
+                continue
+            del self._armed_at[table_id]
+            due.append(table_id)
+        return due
+
+    def start(self, on_expire: Callable[[list[int]], Awaitable[None]]) -> None:
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run(on_expire))
+
+    def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    async def _run(self, on_expire: Callable[[list[int]], Awaitable[None]]) -> None:
+        while True:
+            self._wakeup.clear()
+            timeout: Optional[float] = None
+            if self._heap:
+                timeout = self._heap[0][0] - time.time()
+
+            if timeout is None or timeout > 0:
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            due: list[int] = self.pop_due(time.time())
+            if due:
+                try:
+                    await on_expire(due)
+                except Exception as e:
+                    print(f"Error expiring tables {due}: {e}")
+
+
+table_expiry: ExpiryScheduler = ExpiryScheduler()
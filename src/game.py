@@ -0,0 +1,573 @@
+"""
+In-memory state of a table's poker hands (no limit hold'em).
+
+- All per-seat state lives in fixed-size arrays indexed by seat, and cards
+  are stored as bytes (see evaluator.py for the encoding), so a table costs
+  the same handful of objects no matter how many hands it plays.
+- Actions validate in constant time and mutate the arrays in place.
+- Nothing here touches the database: the caller persists stacks when
+  `in_hand` turns False at the end of a hand.
+"""
+
+import random
+import struct
+import time
+from array import array
+from typing import Any, Optional
+
+from evaluator import cards_str, evaluate
+
+MAX_SEATS: int = 9
+
+# Streets
+PREFLOP, FLOP, TURN, RIVER = range(4)
+STREET_NAMES: tuple[str, ...] = ("Preflop", "Flop", "Turn", "River")
+
+# Seat status
+EMPTY, ACTIVE, FOLDED, ALL_IN = range(4)
+
+# Actions as recorded in the hand history
+ACTION_NAMES: tuple[str, ...] = ("post", "check", "call", "raise", "all-in", "fold")
+POST, CHECK, CALL, RAISE, ALL_IN_ACTION, FOLD = range(6)
+
+_shuffler: random.SystemRandom = random.SystemRandom()
+
+# Game.dump: the scalars, then the per-seat arrays and cards as raw bytes,
+# then the actions of the hand
+_SCALARS: struct.Struct = struct.Struct("<14q?H")
+_ACTION: struct.Struct = struct.Struct("<BBBq")
+_SEAT_ARRAYS: tuple[str, ...] = (
+    "user_ids",
+    "stacks",
+    "bets",
+    "committed",
+    "winnings",
+    "starting_stacks",
+)
+_CARDS_SIZE: int = 2 * MAX_SEATS + 52 + 5
+
+
+def mention(user_id: int) -> str:
+    """Bot players have negative ids (see bots.py) and no Discord account"""
+    return f"🤖 Bot {-user_id}" if user_id < 0 else f"<@{user_id}>"
+
+
+class IllegalAction(Exception):
+    """Raised when an action isn't allowed, the message is shown to the player"""
+
+
+def side_pots(committed: list[int], live: list[bool]) -> list[tuple[int, list[int]]]:
+    """
+    - Takes what every seat put in the pot this hand, and which seats can
+      still win it (haven't folded).
+    - Returns the main pot and the side pots as (amount, eligible seats), from
+      a single sweep over the seats sorted by contribution.
+    """
+    order: list[int] = sorted(
+        (seat for seat in range(len(committed)) if committed[seat] > 0),
+        key=lambda seat: committed[seat],
+    )
+    eligible: list[int] = sorted(seat for seat in order if live[seat])
+    pots: list[tuple[int, list[int]]] = []
+    previous: int = 0
+    for index, seat in enumerate(order):
+        level: int = committed[seat]
+        if level > previous:
+            amount: int = (level - previous) * (len(order) - index)
+            if pots and (pots[-1][1] == eligible or not eligible):
+                # Same players, or money nobody left can win: merge it
+                pots[-1] = (pots[-1][0] + amount, pots[-1][1])
+            else:
+                pots.append((amount, eligible))
+            previous = level
+        if live[seat]:
+            eligible = [other for other in eligible if other != seat]
+    return pots
+
+
+class Game:
+    __slots__ = (
+        "table_id",
+        "small_blind",
+        "big_blind",
+        "max_raise",
+        "seat_count",
+        "user_ids",
+        "stacks",
+        "bets",
+        "committed",
+        "status",
+        "acted",
+        "hole",
+        "deck",
+        "deck_position",
+        "board",
+        "board_size",
+        "street",
+        "button",
+        "to_act",
+        "current_bet",
+        "min_raise",
+        "pot",
+        "hand_number",
+        "in_hand",
+        "winnings",
+        "starting_stacks",
+        "actions",
+        "log",
+        "_seat_of",
+    )
+
+    def __init__(self, table_id: int, min_bet: int, max_bet: int) -> None:
+        self.table_id: int = table_id
+        self.big_blind: int = max(min_bet, 2)
+        self.small_blind: int = self.big_blind // 2
+        self.max_raise: int = max_bet  # 0 means no limit
+
+        self.seat_count: int = 0
+        self.user_ids: array[int] = array("q", bytes(8 * MAX_SEATS))
+        self.stacks: array[int] = array("q", bytes(8 * MAX_SEATS))
+        self.bets: array[int] = array("q", bytes(8 * MAX_SEATS))  # This street
+        self.committed: array[int] = array("q", bytes(8 * MAX_SEATS))  # This hand
+        self.winnings: array[int] = array("q", bytes(8 * MAX_SEATS))
+        self.starting_stacks: array[int] = array("q", bytes(8 * MAX_SEATS))
+        self.status: bytearray = bytearray(MAX_SEATS)
+        self.acted: bytearray = bytearray(MAX_SEATS)
+        self.hole: bytearray = bytearray(2 * MAX_SEATS)
+        self.deck: bytearray = bytearray(range(52))
+        self.deck_position: int = 0
+        self.board: bytearray = bytearray(5)
+        self.board_size: int = 0
+
+        self.street: int = PREFLOP
+        self.button: int = -1
+        self.to_act: int = -1
+        self.current_bet: int = 0
+        self.min_raise: int = self.big_blind
+        self.pot: int = 0  # Bets from previous streets
+        self.hand_number: int = 0
+        self.in_hand: bool = False
+        # (street, seat, action, amount) for every action this hand
+        self.actions: list[tuple[int, int, int, int]] = []
+        self.log: list[str] = []
+        self._seat_of: dict[int, int] = {}
+
+    # Seating
+    def seat_players(self, players: list[tuple[int, int]]) -> None:
+        """
+        - Takes (user id, stack) for everyone at the table, at most MAX_SEATS.
+        - Only allowed between hands.
+        """
+        if self.in_hand:
+            raise IllegalAction("Wait for the current hand to finish!")
+        players = players[:MAX_SEATS]
+        self.seat_count = len(players)
+        self._seat_of = {}
+        for seat in range(MAX_SEATS):
+            user_id, stack = players[seat] if seat < len(players) else (0, 0)
+            self.user_ids[seat] = user_id
+            self.stacks[seat] = stack
+            self.status[seat] = ACTIVE if stack > 0 else EMPTY
+            if user_id:
+                self._seat_of[user_id] = seat
+
+    def seat_of(self, user_id: int) -> int:
+        return self._seat_of.get(user_id, -1)
+
+    def player(self, seat: int) -> str:
+        return mention(self.user_ids[seat])
+
+    def hole_cards(self, seat: int) -> bytes:
+        return bytes(self.hole[2 * seat : 2 * seat + 2])
+
+    def board_cards(self) -> bytes:
+        return bytes(self.board[: self.board_size])
+
+    def total_pot(self) -> int:
+        return self.pot + sum(self.bets)
+
+    def to_call(self, seat: int) -> int:
+        return self.current_bet - self.bets[seat]
+
+    # Hand lifecycle
+    def start_hand(self, deck: Optional[bytes] = None) -> None:
+        """Deal a hand, from `deck` instead of a shuffled deck when replaying"""
+        if self.in_hand:
+            raise IllegalAction("A hand is already running!")
+        if sum(1 for seat in range(self.seat_count) if self.stacks[seat] > 0) < 2:
+            raise IllegalAction("You need at least 2 players with chips to start!")
+
+        self.hand_number += 1
+        self.in_hand = True
+        self.log = []
+        self.actions = []
+        self.street = PREFLOP
+        self.pot = 0
+        self.current_bet = 0
+        self.min_raise = self.big_blind
+        self.board_size = 0
+        for seat in range(MAX_SEATS):
+            self.bets[seat] = 0
+            self.committed[seat] = 0
+            self.winnings[seat] = 0
+            self.starting_stacks[seat] = self.stacks[seat]
+            self.acted[seat] = 0
+            self.status[seat] = (
+                ACTIVE if seat < self.seat_count and self.stacks[seat] > 0 else EMPTY
+            )
+
+        if deck is None:
+            _shuffler.shuffle(self.deck)
+        else:
+            self.deck[:] = deck
+        self.deck_position = 0
+        self.button = self._next_seat(self.button, (ACTIVE,))
+        for seat in self._seats_from(self.button + 1, (ACTIVE,)):
+            self.hole[2 * seat] = self._draw()
+        for seat in self._seats_from(self.button + 1, (ACTIVE,)):
+            self.hole[2 * seat + 1] = self._draw()
+
+        # Heads up, the button posts the small blind and acts first preflop
+        players: int = sum(1 for seat in range(MAX_SEATS) if self.status[seat])
+        small_blind_seat: int = (
+            self.button if players == 2 else self._next_seat(self.button, (ACTIVE,))
+        )
+        big_blind_seat: int = self._next_seat(small_blind_seat, (ACTIVE,))
+        self._put(
+            small_blind_seat, min(self.small_blind, self.stacks[small_blind_seat])
+        )
+        self._put(big_blind_seat, min(self.big_blind, self.stacks[big_blind_seat]))
+        self._record(small_blind_seat, POST, self.bets[small_blind_seat])
+        self._record(big_blind_seat, POST, self.bets[big_blind_seat])
+        self.current_bet = self.big_blind
+        self.log.append(
+            f"🃏 **Hand #{self.hand_number}** — {self.player(self.button)} has the button, "
+            f"{self.player(small_blind_seat)} posts {self.bets[small_blind_seat]}, "
+            f"{self.player(big_blind_seat)} posts {self.bets[big_blind_seat]}."
+        )
+        self.to_act = big_blind_seat
+        self._advance()
+
+    # Actions
+    def _require_turn(self, seat: int) -> None:
+        if not self.in_hand:
+            raise IllegalAction("There is no hand running, use `/start` to deal one!")
+        if seat < 0:
+            raise IllegalAction("You aren't playing in this hand!")
+        if seat != self.to_act:
+            raise IllegalAction(
+                f"It's not your turn, it's {self.player(self.to_act)}'s!"
+            )
+
+    def check(self, seat: int) -> None:
+        self._require_turn(seat)
+        if self.to_call(seat) > 0:
+            raise IllegalAction(f"You can't check, it's {self.to_call(seat)} to call!")
+        self.acted[seat] = 1
+        self._record(seat, CHECK, 0)
+        self.log.append(f"{self.player(seat)} checks.")
+        self._advance()
+
+    def call(self, seat: int) -> None:
+        self._require_turn(seat)
+        amount: int = self.to_call(seat)
+        if amount <= 0:
+            raise IllegalAction("There is nothing to call, use `/check`!")
+        if amount >= self.stacks[seat]:
+            self.all_in(seat)
+            return
+        self._put(seat, amount)
+        self.acted[seat] = 1
+        self._record(seat, CALL, amount)
+        self.log.append(f"{self.player(seat)} calls {amount}.")
+        self._advance()
+
+    def raise_by(self, seat: int, amount: int) -> None:
+        """Raise `amount` on top of the current bet"""
+        self._require_turn(seat)
+        if amount < self.min_raise:
+            raise IllegalAction(f"The minimum raise is {self.min_raise}!")
+        if self.max_raise and amount > self.max_raise:
+            raise IllegalAction(f"The maximum raise at this table is {self.max_raise}!")
+        needed: int = self.to_call(seat) + amount
+        if needed >= self.stacks[seat]:
+            raise IllegalAction(
+                f"You only have {self.stacks[seat]} chips, use `/all-in`!"
+            )
+        self._put(seat, needed)
+        self._reopen(seat, amount)
+        self._record(seat, RAISE, amount)
+        self.log.append(f"{self.player(seat)} raises to {self.current_bet}.")
+        self._advance()
+
+    def all_in(self, seat: int) -> None:
+        self._require_turn(seat)
+        amount: int = self.stacks[seat]
+        raised: int = self.bets[seat] + amount - self.current_bet
+        self._put(seat, amount)
+        if raised > 0:
+            if raised >= self.min_raise:
+                self._reopen(seat, raised)
+            else:
+                # Short all-in: doesn't reopen the betting for who already acted
+                self.current_bet = self.bets[seat]
+        self.acted[seat] = 1
+        self._record(seat, ALL_IN_ACTION, amount)
+        self.log.append(f"{self.player(seat)} goes all-in for {self.bets[seat]}!")
+        self._advance()
+
+    def fold(self, seat: int) -> None:
+        self._require_turn(seat)
+        self.status[seat] = FOLDED
+        self._record(seat, FOLD, 0)
+        self.log.append(f"{self.player(seat)} folds.")
+        self._advance()
+
+    # Internals
+    def _record(self, seat: int, action: int, amount: int) -> None:
+        self.actions.append((self.street, seat, action, amount))
+
+    def _draw(self) -> int:
+        card: int = self.deck[self.deck_position]
+        self.deck_position += 1
+        return card
+
+    def _put(self, seat: int, amount: int) -> None:
+        self.stacks[seat] -= amount
+        self.bets[seat] += amount
+        self.committed[seat] += amount
+        if self.stacks[seat] == 0:
+            self.status[seat] = ALL_IN
+
+    def _reopen(self, seat: int, raised: int) -> None:
+        """A full raise: everyone else has to act again"""
+        self.current_bet = self.bets[seat]
+        self.min_raise = raised
+        for other in range(MAX_SEATS):
+            self.acted[other] = 0
+        self.acted[seat] = 1
+
+    def _seats_from(self, start: int, statuses: tuple[int, ...]) -> list[int]:
+        return [
+            (start + offset) % MAX_SEATS
+            for offset in range(MAX_SEATS)
+            if self.status[(start + offset) % MAX_SEATS] in statuses
+        ]
+
+    def _next_seat(self, seat: int, statuses: tuple[int, ...]) -> int:
+        seats: list[int] = self._seats_from(seat + 1, statuses)
+        return seats[0] if seats else -1
+
+    def _needs_to_act(self, seat: int) -> bool:
+        return self.status[seat] == ACTIVE and (
+            not self.acted[seat] or self.bets[seat] < self.current_bet
+        )
+
+    def _advance(self) -> None:
+        """Move to the next player, street or the end of the hand"""
+        live: list[int] = self._seats_from(0, (ACTIVE, ALL_IN))
+        if len(live) == 1:
+            self._finish()
+            return
+
+        for seat in self._seats_from(self.to_act + 1, (ACTIVE,)):
+            if self._needs_to_act(seat):
+                self.to_act = seat
+                return
+
+        # Street is over
+        self.pot += sum(self.bets)
+        for seat in range(MAX_SEATS):
+            self.bets[seat] = 0
+            self.acted[seat] = 0
+        self.current_bet = 0
+        self.min_raise = self.big_blind
+
+        if self.street == RIVER:
+            self._finish()
+            return
+
+        # Nobody left who can bet: run the board out
+        if len(self._seats_from(0, (ACTIVE,))) <= 1:
+            while self.street < RIVER:
+                self._deal_street()
+            self._finish()
+            return
+
+        self._deal_street()
+        self.to_act = self._next_seat(self.button, (ACTIVE,))
+
+    def _deal_street(self) -> None:
+        self.street += 1
+        self.deck_position += 1  # Burn
+        for _ in range(3 if self.street == FLOP else 1):
+            self.board[self.board_size] = self._draw()
+            self.board_size += 1
+        self.log.append(
+            f"**{STREET_NAMES[self.street]}:** {cards_str(self.board_cards())} "
+            f"(pot {self.total_pot()})"
+        )
+
+    def _finish(self) -> None:
+        """Award the pots and end the hand"""
+        self.pot += sum(self.bets)
+        for seat in range(MAX_SEATS):
+            self.bets[seat] = 0
+        live_seats: list[int] = self._seats_from(0, (ACTIVE, ALL_IN))
+
+        if len(live_seats) == 1:
+            winner: int = live_seats[0]
+            self.winnings[winner] = self.pot
+            self.log.append(f"🏆 {self.player(winner)} wins {self.pot}.")
+        else:
+            strengths: dict[int, int] = {
+                seat: evaluate(self.hole_cards(seat) + self.board_cards())
+                for seat in live_seats
+            }
+            for seat in live_seats:
+                self.log.append(
+                    f"{self.player(seat)} shows {cards_str(self.hole_cards(seat))}."
+                )
+            live: list[bool] = [seat in strengths for seat in range(MAX_SEATS)]
+            for amount, eligible in side_pots(list(self.committed), live):
+                best: int = max(strengths[seat] for seat in eligible)
+                winners: list[int] = [
+                    seat for seat in eligible if strengths[seat] == best
+                ]
+                share, remainder = divmod(amount, len(winners))
+                # Odd chips go to the first winners left of the button
+                for seat in self._seats_from(self.button + 1, (ACTIVE, ALL_IN)):
+                    if seat in winners:
+                        self.winnings[seat] += share + (1 if remainder > 0 else 0)
+                        remainder -= 1
+            for seat in live_seats:
+                if self.winnings[seat]:
+                    self.log.append(
+                        f"🏆 {self.player(seat)} wins {self.winnings[seat]}."
+                    )
+
+        for seat in range(MAX_SEATS):
+            self.stacks[seat] += self.winnings[seat]
+        self.pot = 0
+        self.to_act = -1
+        self.in_hand = False
+
+    # Snapshots
+    def dump(self) -> bytes:
+        """
+        - The whole state of the game as compact bytes (the log aside), for
+          snapshots (see snapshots.py). Game.load reads them back.
+        """
+        parts: list[bytes | bytearray] = [
+            _SCALARS.pack(
+                self.table_id,
+                self.big_blind,
+                self.small_blind,
+                self.max_raise,
+                self.seat_count,
+                self.deck_position,
+                self.board_size,
+                self.street,
+                self.button,
+                self.to_act,
+                self.current_bet,
+                self.min_raise,
+                self.pot,
+                self.hand_number,
+                self.in_hand,
+                len(self.actions),
+            )
+        ]
+        parts += [getattr(self, name).tobytes() for name in _SEAT_ARRAYS]
+        parts += [self.status, self.acted, self.hole, self.deck, self.board]
+        parts += [_ACTION.pack(*action) for action in self.actions]
+        return b"".join(parts)
+
+    @classmethod
+    def load(cls, data: bytes) -> "Game":
+        """
+        - Takes bytes from Game.dump.
+        - Returns the game as it was, with an empty log.
+        """
+        game: Game = cls(0, 0, 0)
+        (
+            game.table_id,
+            game.big_blind,
+            game.small_blind,
+            game.max_raise,
+            game.seat_count,
+            game.deck_position,
+            game.board_size,
+            game.street,
+            game.button,
+            game.to_act,
+            game.current_bet,
+            game.min_raise,
+            game.pot,
+            game.hand_number,
+            game.in_hand,
+            actions,
+        ) = _SCALARS.unpack_from(data)
+
+        offset: int = _SCALARS.size
+        for name in _SEAT_ARRAYS:
+            setattr(game, name, array("q", data[offset : offset + 8 * MAX_SEATS]))
+            offset += 8 * MAX_SEATS
+        game.status = bytearray(data[offset : offset + MAX_SEATS])
+        game.acted = bytearray(data[offset + MAX_SEATS : offset + 2 * MAX_SEATS])
+        offset += 2 * MAX_SEATS
+        cards: bytes = data[offset : offset + _CARDS_SIZE]
+        game.hole = bytearray(cards[: 2 * MAX_SEATS])
+        game.deck = bytearray(cards[2 * MAX_SEATS : 2 * MAX_SEATS + 52])
+        game.board = bytearray(cards[2 * MAX_SEATS + 52 :])
+        offset += _CARDS_SIZE
+        game.actions = [
+            _ACTION.unpack_from(data, offset + index * _ACTION.size)
+            for index in range(actions)
+        ]
+        game._seat_of = {
+            game.user_ids[seat]: seat
+            for seat in range(game.seat_count)
+            if game.user_ids[seat]
+        }
+        return game
+
+    def hand_record(self) -> dict[str, Any]:
+        """
+        - Everything needed to replay the hand that just ended, for the hand
+          history (see history.py). The deck is kept in full so the replay
+          deals exactly the same cards.
+        """
+        seats: range = range(self.seat_count)
+        return {
+            "table": self.table_id,
+            "hand": self.hand_number,
+            "ended": round(time.time(), 3),
+            "big_blind": self.big_blind,
+            "max_raise": self.max_raise,
+            "button": self.button,
+            "seats": [
+                [self.user_ids[seat], self.starting_stacks[seat]] for seat in seats
+            ],
+            "deck": self.deck.hex(),
+            "hole": [
+                cards_str(self.hole_cards(seat)) if self.starting_stacks[seat] else ""
+                for seat in seats
+            ],
+            "board": cards_str(self.board_cards()),
+            "actions": [
+                [street, seat, ACTION_NAMES[action], amount]
+                for street, seat, action, amount in self.actions
+            ],
+            "winnings": [self.winnings[seat] for seat in seats],
+            "stacks": [self.stacks[seat] for seat in seats],
+        }
+
+    def status_line(self) -> str:
+        if not self.in_hand:
+            return "Use `/start` to deal the next hand."
+        return (
+            f"Pot: {self.total_pot()}. {self.player(self.to_act)} to act, "
+            f"{self.to_call(self.to_act)} to call, "
+            f"{self.stacks[self.to_act]} chips behind."
+        )
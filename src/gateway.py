@@ -0,0 +1,87 @@
+"""
+What the bot asks Discord's gateway for, and how much it gets.
+
+- The "full" profile takes every intent and discord.py's default caches.
+- The "lean" profile takes only what the bot uses: guilds and their threads,
+  guild messages for table activity and members for on_member_join. It
+  doesn't cache members or messages and doesn't chunk guilds at startup, so
+  large guilds cost neither events nor memory. Prefix commands like `$ip`
+  can't read message content in it.
+- Gateway events are counted per type as they arrive, with their rate over
+  the last GATEWAY_RATE_SECONDS, next to the process' resident memory, to
+  compare the profiles.
+
+    CLIENT_PROFILE=lean python src/main.py
+"""
+
+import os
+import resource
+import time
+from typing import Any
+
+import discord
+
+from constants import GATEWAY_RATE_SECONDS
+
+CLIENT_PROFILES: tuple[str, ...] = ("full", "lean")
+
+
+def client_options(profile: str) -> dict[str, Any]:
+    """
+    - Takes one of CLIENT_PROFILES.
+    - Returns the intents and cache options to construct the bot with.
+    """
+    if profile == "full":
+        return {"intents": discord.Intents.all()}
+    if profile != "lean":
+        raise ValueError(
+            f"Unknown client profile {profile}, use one of {CLIENT_PROFILES}"
+        )
+
+    intents: discord.Intents = discord.Intents.none()
+    intents.guilds = True
+    intents.guild_messages = True
+    intents.members = True
+    return {
+        "intents": intents,
+        "member_cache_flags": discord.MemberCacheFlags.none(),
+        "max_messages": None,
+        "chunk_guilds_at_startup": False,
+    }
+
+
+def resident_memory() -> int:
+    """Bytes of memory the process holds right now, or at its peak off Linux"""
+    try:
+        with open("/proc/self/statm") as file:
+            return int(file.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except OSError:
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+class GatewayStats:
+    def __init__(self, window: float = GATEWAY_RATE_SECONDS) -> None:
+        self.window: float = window
+        self.events: int = 0
+        self.by_type: dict[str, int] = {}
+        self.rate: float = 0.0  # Events per second over the last full window
+        self._window_start: float = time.monotonic()
+        self._window_events: int = 0
+
+    def observe(self, event_type: str) -> None:
+        self.events += 1
+        self.by_type[event_type] = self.by_type.get(event_type, 0) + 1
+        self._window_events += 1
+        now: float = time.monotonic()
+        if now - self._window_start >= self.window:
+            self.rate = self._window_events / (now - self._window_start)
+            self._window_start = now
+            self._window_events = 0
+
+    def busiest(self, limit: int = 5) -> list[tuple[str, int]]:
+        return sorted(self.by_type.items(), key=lambda item: item[1], reverse=True)[
+            :limit
+        ]
+
+
+gateway_stats: GatewayStats = GatewayStats()
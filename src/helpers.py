@@ -1,59 +1,158 @@
 import random
 
 import discord
+from discord import app_commands
 from discord.ext import commands
 
+from constants import LEADERBOARD_PAGE_SIZE
 from database import *
+from game import mention
+from interactions import deferred, reply
+from leaderboard import LEADERBOARD_METRICS, LEADERBOARD_TITLES
+from metrics import metrics, timed
+from workers import worker_pool
 
 
-def setup_helper_commands(bot: commands.Bot) -> None:
+def setup_helper_commands(bot: commands.AutoShardedBot) -> None:
     """Setup all helper commands for the bot"""
 
     @bot.command()
+    @timed("command", "ip")
     async def ip(ctx: commands.Context) -> None:
         random_int_1: int = random.randint(1, 255)
         random_int_2: int = random.randint(1, 255)
         await ctx.send(f"Your IP is 192.168.{random_int_1}.{random_int_2}")
 
     @bot.tree.command(name="ping", description="Ping the bot")
+    @timed("command", "ping")
     async def ping(interaction: discord.Interaction) -> None:
-        await interaction.response.send_message("Pong!")
+        await reply(interaction, "Pong!")
 
     @bot.tree.command(name="init", description="Initialize your account")
+    @timed("command", "init")
+    @deferred(ephemeral=True)
     async def init(interaction: discord.Interaction) -> None:
-        if not check_user_exists(interaction.user.id):
-            add_user(interaction.user.id)
-            await interaction.response.send_message(
-                "Your account has been initialized!", ephemeral=True
+        if not await check_user_exists(interaction.user.id):
+            await add_user(interaction.user.id)
+            await reply(
+                interaction, "Your account has been initialized!", ephemeral=True
             )
         else:
-            await interaction.response.send_message(
-                "Your account has already been initialized!", ephemeral=True
+            await reply(
+                interaction,
+                "Your account has already been initialized!",
+                ephemeral=True,
             )
 
     @bot.tree.command(name="stats", description="View your stats")
+    @timed("command", "stats")
+    @deferred(ephemeral=True)
     async def stats(interaction: discord.Interaction) -> None:
-        if not check_user_exists(interaction.user.id):
-            await interaction.response.send_message(
+        if not await check_user_exists(interaction.user.id):
+            await reply(
+                interaction,
                 "You don't have an account (somehow), use `/init` to initialize your account",
                 ephemeral=True,
             )
             return
 
-        user_data: Optional[UserData] = get_user_data(interaction.user.id)
+        user_data: Optional[UserData] = await get_user_data(interaction.user.id)
         if user_data is None:
-            await interaction.response.send_message(
+            await reply(
+                interaction,
                 "You don't exist in the database! Use `/init` to initialize your account.",
                 ephemeral=True,
             )
             return
 
-        await interaction.response.send_message(
+        poker: PlayerStats = await get_player_stats(interaction.user.id)
+        # Broke players have no money to compare their profit to
+        profit_percentage: str = (
+            f"{user_data.lifttime_profit / user_data.money * 100:.1f}%"
+            if user_data.money
+            else "n/a"
+        )
+        await reply(
+            interaction,
             f"Your stats:\n"
             f"Money: {user_data.money}\n"
             f"Lifttime losses: {user_data.lifttime_losses}\n"
-            f"Lifttime wins: {user_data.lifttime_wins}\n"
+            f"Lifttime hands won: {user_data.lifttime_wins}\n"
             f"Lifttime profit: {user_data.lifttime_profit}\n"
-            f"Lifttime profit percentage: {user_data.lifttime_profit / user_data.money * 100}%",
+            f"Lifttime profit percentage: {profit_percentage}\n"
+            f"Hands played: {poker.hands}\n"
+            f"VPIP: {poker.vpip * 100:.1f}%, PFR: {poker.pfr * 100:.1f}%\n"
+            f"Showdowns won: {poker.showdowns_won}/{poker.showdowns} "
+            f"({poker.showdown_win_rate * 100:.1f}%)\n"
+            f"Biggest pot: {poker.biggest_pot}\n"
+            f"Profit per 100 hands: {poker.profit_per_100:.1f} chips",
+            ephemeral=True,
+        )
+
+    @bot.tree.command(name="leaderboard", description="View the leaderboard")
+    @app_commands.describe(metric="What to rank by", page="Which page to show")
+    @app_commands.choices(
+        metric=[
+            app_commands.Choice(name="Profit", value="lifttime_profit"),
+            app_commands.Choice(name="Money", value="money"),
+            app_commands.Choice(name="Hands won", value="lifttime_wins"),
+        ]
+    )
+    @timed("command", "leaderboard")
+    @deferred()
+    async def leaderboard(
+        interaction: discord.Interaction, metric: str = "money", page: int = 1
+    ) -> None:
+        if metric not in LEADERBOARD_METRICS:
+            await reply(interaction, "Unknown leaderboard!", ephemeral=True)
+            return
+        page = max(page, 1)
+
+        rows: list[tuple[int, int]] = await get_leaderboard(
+            metric, (page - 1) * LEADERBOARD_PAGE_SIZE, LEADERBOARD_PAGE_SIZE
+        )
+        if not rows:
+            await reply(interaction, f"There's nobody on page {page}!", ephemeral=True)
+            return
+
+        first_rank: int = (page - 1) * LEADERBOARD_PAGE_SIZE + 1
+        lines: list[str] = [
+            f"**{rank}.** {mention(user_id)} — {value}"
+            for rank, (user_id, value) in enumerate(rows, first_rank)
+        ]
+        user_rank: Optional[int] = await get_user_rank(metric, interaction.user.id)
+        if user_rank is not None:
+            lines.append(f"\nYour rank: **#{user_rank}**")
+
+        title: str = LEADERBOARD_TITLES[metric]
+        await reply(
+            interaction,
+            f"🏆 **{title} leaderboard**, page {page}\n" + "\n".join(lines),
+            allowed_mentions=discord.AllowedMentions.none(),
+        )
+
+    @bot.tree.command(name="metrics", description="View the bot's performance")
+    @app_commands.default_permissions(administrator=True)
+    @timed("command", "metrics")
+    @deferred(ephemeral=True)
+    async def metrics_command(interaction: discord.Interaction) -> None:
+        # default_permissions only hides the command, so check again here
+        if not (
+            isinstance(interaction.user, discord.Member)
+            and interaction.user.guild_permissions.administrator
+        ):
+            await reply(
+                interaction,
+                "Only server administrators can view metrics!",
+                ephemeral=True,
+            )
+            return
+
+        # Measuring the overhead runs its own event loop
+        overhead: float = await worker_pool.run(metrics.overhead)
+        await reply(
+            interaction,
+            f"```\n{metrics.summary()[:1800]}\n```"
+            f"Timing overhead: {overhead * 1_000_000:.2f}µs per call",
             ephemeral=True,
         )
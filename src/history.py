@@ -0,0 +1,236 @@
+"""
+Append-only hand history.
+
+- Every finished hand is one JSON line (see Game.hand_record) in a segment
+  per UTC day, hands-YYYY-MM-DD.ndjson, so old days can be archived or
+  deleted as whole files and the database stays small.
+- Lines are buffered in memory and appended by a dedicated writer thread,
+  in the order the hands finished.
+- Reading memory-maps one segment at a time and decodes one line at a time,
+  so scanning millions of hands never holds more than one of them.
+
+    python src/history.py                 # Totals per player
+    python src/history.py --verify        # Also replay every hand
+    python src/history.py --table 1234    # Only one table
+"""
+
+import argparse
+import asyncio
+import glob
+import json
+import mmap
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Iterator, Optional
+
+from discord.ext import tasks
+
+from constants import (HISTORY_BUFFER_HANDS, HISTORY_DIRECTORY,
+                       HISTORY_FLUSH_SECONDS)
+from game import Game, IllegalAction
+
+
+class HandHistory:
+    def __init__(self, directory: str = HISTORY_DIRECTORY) -> None:
+        self.directory: str = directory
+        # (day, encoded line) waiting to be written
+        self._buffer: list[tuple[str, bytes]] = []
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._flushing: Optional[asyncio.Task[int]] = None
+        self.hands: int = 0
+        self.bytes_written: int = 0
+
+    def segment_path(self, day: str) -> str:
+        return os.path.join(self.directory, f"hands-{day}.ndjson")
+
+    def record(self, hand: dict[str, Any]) -> None:
+        """Buffer a finished hand, flushing in the background once enough pile up"""
+        day: str = time.strftime("%Y-%m-%d", time.gmtime(hand["ended"]))
+        line: bytes = json.dumps(hand, separators=(",", ":")).encode() + b"\n"
+        self._buffer.append((day, line))
+        self.hands += 1
+        if len(self._buffer) >= HISTORY_BUFFER_HANDS and (
+            self._flushing is None or self._flushing.done()
+        ):
+            self._flushing = asyncio.create_task(self.flush())
+
+    async def flush(self) -> int:
+        """
+        - Append everything buffered on the writer thread.
+        - Returns the number of hands written.
+        """
+        if not self._buffer:
+            return 0
+
+        lines: list[tuple[str, bytes]] = self._buffer
+        self._buffer = []
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(
+                max_workers=1, thread_name_prefix="history"
+            )
+        try:
+            await asyncio.get_running_loop().run_in_executor(
+                self._executor, self._write, lines
+            )
+        except Exception:
+            # Keep them so the next flush retries, ahead of newer hands
+            self._buffer = lines + self._buffer
+            raise
+        return len(lines)
+
+    def _write(self, lines: list[tuple[str, bytes]]) -> None:
+        os.makedirs(self.directory, exist_ok=True)
+        by_day: dict[str, list[bytes]] = {}
+        for day, line in lines:
+            by_day.setdefault(day, []).append(line)
+        for day, day_lines in by_day.items():
+            # One append per segment, so lines from several processes sharing
+            # the directory never interleave
+            data: bytes = b"".join(day_lines)
+            with open(self.segment_path(day), "ab", buffering=0) as file:
+                file.write(data)
+            self.bytes_written += len(data)
+
+    def close(self) -> None:
+        """Write whatever is left and stop the writer thread"""
+        if self._buffer:
+            self._write(self._buffer)
+            self._buffer = []
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+
+
+hand_history: HandHistory = HandHistory()
+
+
+def setup_history_writer() -> None:
+    @tasks.loop(seconds=HISTORY_FLUSH_SECONDS)
+    async def flush_hand_history() -> None:
+        """Write the buffered hands to the history"""
+        try:
+            await hand_history.flush()
+        except Exception as e:
+            print(f"Error writing hand history: {e}")
+
+    flush_hand_history.start()
+
+
+# Reading
+def segments(directory: str = HISTORY_DIRECTORY) -> list[str]:
+    """Every segment in the directory, oldest day first"""
+    return sorted(glob.glob(os.path.join(directory, "hands-*.ndjson")))
+
+
+def read_segment(path: str) -> Iterator[dict[str, Any]]:
+    """
+    - Takes the path of a segment.
+    - Yields its hands one at a time, straight from a memory map. A last line
+      without a newline is a write that was cut off, and is skipped.
+    """
+    with open(path, "rb") as file:
+        if os.fstat(file.fileno()).st_size == 0:
+            return
+        with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as view:
+            position: int = 0
+            while True:
+                end: int = view.find(b"\n", position)
+                if end < 0:
+                    return
+                if end > position:
+                    yield json.loads(view[position:end])
+                position = end + 1
+
+
+def read_hands(
+    directory: str = HISTORY_DIRECTORY,
+    since: Optional[str] = None,
+    until: Optional[str] = None,
+) -> Iterator[dict[str, Any]]:
+    """
+    - Takes an optional range of days, YYYY-MM-DD, both inclusive.
+    - Yields every hand in those days, in the order they finished.
+    """
+    for path in segments(directory):
+        day: str = os.path.basename(path)[len("hands-") : -len(".ndjson")]
+        if (since is None or day >= since) and (until is None or day <= until):
+            yield from read_segment(path)
+
+
+MOVES: dict[str, Callable[[Game, int, int], None]] = {
+    "check": lambda game, seat, amount: game.check(seat),
+    "call": lambda game, seat, amount: game.call(seat),
+    "raise": lambda game, seat, amount: game.raise_by(seat, amount),
+    "all-in": lambda game, seat, amount: game.all_in(seat),
+    "fold": lambda game, seat, amount: game.fold(seat),
+}
+
+
+def replay(hand: dict[str, Any]) -> Game:
+    """
+    - Takes a hand from the history.
+    - Deals it again from the recorded deck and applies every action through
+      the game engine, so any illegal action raises IllegalAction.
+    - Returns the game at the end of the hand.
+    """
+    game: Game = Game(hand["table"], hand["big_blind"], hand["max_raise"])
+    game.seat_players([(user_id, stack) for user_id, stack in hand["seats"]])
+    game.hand_number = hand["hand"] - 1
+    # start_hand moves the button to the next player, so start one seat back
+    game.button = hand["button"] - 1
+    game.start_hand(bytes.fromhex(hand["deck"]))
+    for _, seat, action, amount in hand["actions"]:
+        if action != "post":
+            MOVES[action](game, seat, amount)
+    return game
+
+
+def verify(hand: dict[str, Any]) -> bool:
+    """Check that replaying a hand ends with the recorded stacks and winnings"""
+    try:
+        game: Game = replay(hand)
+    except IllegalAction:
+        return False
+    seats: range = range(game.seat_count)
+    return (
+        not game.in_hand
+        and [game.stacks[seat] for seat in seats] == hand["stacks"]
+        and [game.winnings[seat] for seat in seats] == hand["winnings"]
+    )
+
+
+def main() -> None:
+    parser: argparse.ArgumentParser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("--directory", default=HISTORY_DIRECTORY)
+    parser.add_argument("--since", help="First day, YYYY-MM-DD")
+    parser.add_argument("--until", help="Last day, YYYY-MM-DD")
+    parser.add_argument("--table", type=int, help="Only hands from this table")
+    parser.add_argument("--verify", action="store_true", help="Replay every hand")
+    args: argparse.Namespace = parser.parse_args()
+
+    start_time: float = time.perf_counter()
+    hands: int = 0
+    failed: list[tuple[int, int]] = []
+    net: dict[int, int] = {}
+    for hand in read_hands(args.directory, args.since, args.until):
+        if args.table is not None and hand["table"] != args.table:
+            continue
+        hands += 1
+        for (user_id, stack), final in zip(hand["seats"], hand["stacks"]):
+            net[user_id] = net.get(user_id, 0) + final - stack
+        if args.verify and not verify(hand):
+            failed.append((hand["table"], hand["hand"]))
+
+    elapsed: float = time.perf_counter() - start_time
+    print(f"{hands} hands in {elapsed:.2f} seconds")
+    for user_id, chips in sorted(net.items(), key=lambda item: -item[1])[:20]:
+        print(f"{user_id:>20} {chips:+}")
+    if args.verify:
+        print(f"{len(failed)} hands didn't replay: {failed[:20]}")
+
+
+if __name__ == "__main__":
+    main()
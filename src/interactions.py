@@ -0,0 +1,62 @@
+import functools
+from typing import Any, Awaitable, Callable, TypeVar
+
+import discord
+
+from workers import PoolBusy
+
+F = TypeVar("F", bound=Callable[..., Awaitable[None]])
+
+# Interaction id -> whether it was deferred ephemerally, until its first reply
+_deferred: dict[int, bool] = {}
+
+
+async def reply(
+    interaction: discord.Interaction,
+    content: str,
+    ephemeral: bool = False,
+    **kwargs: Any,
+) -> None:
+    """
+    - Answer an interaction, whether or not it was deferred.
+    - The first reply to a public deferral replaces its "thinking" message
+      and can't be ephemeral, so an ephemeral one deletes that message first.
+    """
+    if not interaction.response.is_done():
+        await interaction.response.send_message(content, ephemeral=ephemeral, **kwargs)
+        return
+
+    if _deferred.pop(interaction.id, None) is False and ephemeral:
+        await interaction.delete_original_response()
+    await interaction.followup.send(content, ephemeral=ephemeral, **kwargs)
+
+
+def deferred(ephemeral: bool = False) -> Callable[[F], F]:
+    """
+    - Decorator for app commands that touch the database or the worker pool.
+    - Defers right away, so Discord's 3 second deadline to acknowledge the
+      interaction can't be missed, and the command answers with reply().
+    - A saturated worker pool is answered with a "busy" message.
+    """
+
+    def decorator(handler: F) -> F:
+        @functools.wraps(handler)
+        async def wrapper(
+            interaction: discord.Interaction, *args: Any, **kwargs: Any
+        ) -> None:
+            await interaction.response.defer(ephemeral=ephemeral, thinking=True)
+            _deferred[interaction.id] = ephemeral
+            try:
+                await handler(interaction, *args, **kwargs)
+            except PoolBusy:
+                await reply(
+                    interaction,
+                    "⏳ The bot is busy right now, try again in a moment!",
+                    ephemeral=True,
+                )
+            finally:
+                _deferred.pop(interaction.id, None)
+
+        return wrapper  # type: ignore[return-value]
+
+    return decorator
@@ -0,0 +1,118 @@
+import math
+import time
+from bisect import bisect_left, insort
+from typing import Optional
+
+from constants import LEADERBOARD_SIZE
+
+# Columns of `users` that can be ranked, each has a covering index
+LEADERBOARD_METRICS: tuple[str, ...] = ("lifttime_profit", "money", "lifttime_wins")
+# lifttime_wins counts hands, the others are chips
+LEADERBOARD_TITLES: dict[str, str] = {
+    "lifttime_profit": "Lifetime profit",
+    "money": "Money",
+    "lifttime_wins": "Hands won",
+}
+
+
+class Leaderboard:
+    """
+    - The best users for one metric, ordered by value then user id.
+    - Holds every user ranked at or above `floor`, which is what makes it
+      correct to update one user at a time: a user dropping below the floor
+      leaves the board, a user rising to it joins. Ties are ranked by user
+      id, so the floor is a single position.
+    - Loaded with the top 2 * LEADERBOARD_SIZE users so it can shrink for a
+      while before it has to be loaded again.
+    - When other processes change users too, the board is only as fresh as
+      its last load, so it's loaded again once older than `max_age` seconds.
+    - Bots (negative user ids, see bots.is_bot) are never ranked.
+    """
+
+    def __init__(self, metric: str) -> None:
+        self.metric: str = metric
+        # (-value, user id), so the natural sort order is the ranking
+        self.entries: list[tuple[int, int]] = []
+        self.values: dict[int, int] = {}
+        # Sort key of the last user on the board, None if every user is on it
+        self.floor: Optional[tuple[int, int]] = None
+        self.loaded: bool = False
+        self.loaded_at: float = 0.0
+        self.max_age: float = math.inf
+        self.loads: int = 0
+
+    def load(self, rows: list[tuple[int, int]], limit: int) -> None:
+        """Takes the top `limit` (user id, value) rows, best first"""
+        self.entries = [(-value, user_id) for user_id, value in rows]
+        self.values = dict(rows)
+        self.floor = self.entries[-1] if len(rows) == limit else None
+        self.loaded = True
+        self.loaded_at = time.monotonic()
+        self.loads += 1
+
+    def update(self, user_id: int, value: int) -> None:
+        if not self.loaded or user_id < 0:
+            return
+        old: Optional[int] = self.values.pop(user_id, None)
+        if old is not None:
+            del self.entries[bisect_left(self.entries, (-old, user_id))]
+        if self.floor is None or (-value, user_id) <= self.floor:
+            insort(self.entries, (-value, user_id))
+            self.values[user_id] = value
+        self._trim()
+
+    def _trim(self) -> None:
+        """Drop the tail past twice the size, raising the floor to match"""
+        if len(self.entries) > 2 * LEADERBOARD_SIZE:
+            for _, user_id in self.entries[2 * LEADERBOARD_SIZE :]:
+                del self.values[user_id]
+            del self.entries[2 * LEADERBOARD_SIZE :]
+            self.floor = self.entries[-1]
+
+    def fresh(self) -> bool:
+        return self.loaded and time.monotonic() - self.loaded_at <= self.max_age
+
+    def covers(self, count: int) -> bool:
+        """Check if the first `count` ranks can be answered from memory"""
+        return self.fresh() and (self.floor is None or len(self.entries) >= count)
+
+    def page(self, offset: int, limit: int) -> list[tuple[int, int]]:
+        return [
+            (user_id, -value)
+            for value, user_id in self.entries[offset : offset + limit]
+        ]
+
+    def rank(self, user_id: int) -> Optional[int]:
+        """1-based rank of a user on the board, None if they're below it or it's stale"""
+        if not self.fresh():
+            return None
+        value: Optional[int] = self.values.get(user_id)
+        if value is None:
+            return None
+        return bisect_left(self.entries, (-value, user_id)) + 1
+
+
+class Leaderboards:
+    def __init__(self) -> None:
+        self.boards: dict[str, Leaderboard] = {
+            metric: Leaderboard(metric) for metric in LEADERBOARD_METRICS
+        }
+
+    def get(self, metric: str) -> Leaderboard:
+        return self.boards[metric]
+
+    def update(self, metric: str, user_id: int, value: int) -> None:
+        self.boards[metric].update(user_id, value)
+
+    def set_max_age(self, seconds: float) -> None:
+        for board in self.boards.values():
+            board.max_age = seconds
+
+    def stats(self) -> dict[str, dict[str, int]]:
+        return {
+            metric: {"users": len(board.entries), "loads": board.loads}
+            for metric, board in self.boards.items()
+        }
+
+
+leaderboards: Leaderboards = Leaderboards()
@@ -1,16 +1,35 @@
+import hashlib
+import json
 import os
 import time
-from typing import Optional
+from typing import Any, Optional
 
 import discord
 from discord.ext import commands
 from dotenv import load_dotenv
 
+from activity import setup_activity_flusher, table_activity
+from actor import table_actors
+from bots import bot_players
+from constants import (METRICS_PATH, SHARDED_LEADERBOARD_MAX_AGE_SECONDS,
+                       SHARDED_USER_CACHE_TTL_SECONDS)
 from database import *
-from database import channel_is_table, update_table_last_message_time
+from database import channel_is_table, get_bot_state, set_bot_state
+from game import Game
+from gateway import client_options, gateway_stats, resident_memory
 from helpers import setup_helper_commands
-from poker import setup_poker_commands
+from history import hand_history, setup_history_writer
+from leaderboard import leaderboards
+from metrics import metrics, setup_metrics_writer, timed
+from poker import restore_tables, setup_poker_commands
+from registry import table_registry
+from shards import shard_config
+from snapshots import setup_snapshot_writer, table_snapshots
+from status import status_messages
+from storage import storage
 from timer import setup_table_timer
+from users import user_cache
+from workers import worker_pool
 
 load_dotenv()
 
@@ -21,50 +40,197 @@ if TOKEN is None:
         "TOKEN is not set. Set it in the .env file as TOKEN=your_token_here"
     )
 
-
-bot: commands.Bot = commands.Bot(command_prefix="$", intents=discord.Intents.all())
+# "lean" for only the intents and caches the bot needs, see gateway.py
+CLIENT_PROFILE: str = os.getenv("CLIENT_PROFILE", "full")
+
+
+class PokerBot(commands.AutoShardedBot):
+    """
+    - Runs every shard in one process by default. Set SHARD_COUNT and
+      SHARD_IDS to run some of them, `python src/run.py --shards N
+      --processes P` starts P processes that split the shards between them.
+    - Every process shares the database. Each one keeps only the tables of
+      its own guilds in memory and expires only those.
+    """
+
+    def __init__(self, *args: Any, **kwargs: Any) -> None:
+        super().__init__(*args, **kwargs)
+        self.started_up: bool = False
+
+    async def setup_hook(self) -> None:
+        """
+        - Runs once, after logging in and before connecting to the gateway.
+        - on_ready fires again on every reconnect, so all one-time setup
+          lives here instead.
+        """
+        await create_tables()
+        await load_table_registry()
+        games: list[Game] = await restore_tables()
+        print(
+            f"Restored {len(games)} tables in "
+            f"{table_snapshots.restore_seconds * 1000:.1f}ms"
+        )
+
+        # Setup helper commands
+        setup_helper_commands(self)
+        setup_poker_commands(self)
+
+        # Setup table timer
+        await setup_table_timer(self)
+        setup_activity_flusher()
+        setup_metrics_writer(
+            METRICS_PATH
+            if not shard_config.sharded
+            else f"metrics-{shard_config.name}.prom"
+        )
+        setup_history_writer()
+        setup_snapshot_writer()
+
+        await self.sync_commands()
+
+    def command_tree_hash(self) -> str:
+        """A hash of everything Discord knows about our slash commands"""
+        payload: list[dict[str, Any]] = sorted(
+            (command.to_dict(self.tree) for command in self.tree.get_commands()),
+            key=lambda command: (command["type"], command["name"]),
+        )
+        return hashlib.sha256(
+            json.dumps([self.application_id, payload], sort_keys=True).encode()
+        ).hexdigest()
+
+    async def sync_commands(self) -> bool:
+        """
+        - Sync the command tree only if the commands changed since the last
+          sync, which is a slow and rate limited HTTP round trip.
+        - The command tree is global, so only the primary process syncs it.
+        - Returns whether a sync happened.
+        """
+        if not shard_config.is_primary:
+            return False
+
+        tree_hash: str = self.command_tree_hash()
+        if await get_bot_state("command_tree_hash") == tree_hash:
+            print("Commands unchanged, skipping sync")
+            return False
+
+        await self.tree.sync()
+        await set_bot_state("command_tree_hash", tree_hash)
+        print("Synced commands")
+        return True
+
+    async def close(self) -> None:
+        # Write any buffered table activity and hands before shutting down
+        try:
+            await table_activity.flush()
+        except Exception as e:
+            print(f"Error flushing table activity: {e}")
+        try:
+            await hand_history.flush()
+        except Exception as e:
+            print(f"Error writing hand history: {e}")
+        try:
+            await table_snapshots.snapshot()
+        except Exception as e:
+            print(f"Error writing table snapshot: {e}")
+        await super().close()
+
+
+if shard_config.sharded:
+    user_cache.ttl = SHARDED_USER_CACHE_TTL_SECONDS
+    leaderboards.set_max_age(SHARDED_LEADERBOARD_MAX_AGE_SECONDS)
+
+bot: PokerBot = PokerBot(
+    command_prefix="$",
+    **client_options(CLIENT_PROFILE),
+    shard_count=shard_config.count,
+    shard_ids=shard_config.ids,
+)
 
 start_time: float = time.time()
 
+metrics.gauge("storage_queries", lambda: storage.queries)
+metrics.gauge("table_registry_hits", lambda: table_registry.hits)
+metrics.gauge("table_registry_misses", lambda: table_registry.misses)
+metrics.gauge("tables", lambda: len(table_registry.tables))
+metrics.gauge("table_actors", lambda: len(table_actors.actors))
+metrics.gauge("table_actor_queue_depth", lambda: table_actors.depth)
+metrics.gauge("table_actor_peak_depth", lambda: table_actors.peak_depth)
+metrics.gauge("hands_recorded", lambda: hand_history.hands)
+metrics.gauge("user_cache_hits", lambda: user_cache.hits)
+metrics.gauge("user_cache_misses", lambda: user_cache.misses)
+metrics.gauge("user_cache_size", lambda: len(user_cache.users))
+metrics.gauge("worker_pool_pending", lambda: worker_pool.pending)
+metrics.gauge("worker_pool_rejected", lambda: worker_pool.rejected)
+metrics.gauge("bot_decisions", lambda: bot_players.decisions)
+metrics.gauge("bot_decision_timeouts", lambda: bot_players.timeouts)
+metrics.gauge("bot_pool_busy", lambda: bot_players.busy)
+metrics.gauge("snapshot_log_bytes", lambda: table_snapshots.log_bytes)
+metrics.gauge("snapshot_bytes", lambda: table_snapshots.snapshot_bytes)
+metrics.gauge("snapshot_restore_seconds", lambda: table_snapshots.restore_seconds)
+metrics.gauge("resident_memory_bytes", resident_memory)
+metrics.gauge("gateway_events", lambda: gateway_stats.events)
+metrics.gauge("gateway_events_per_second", lambda: gateway_stats.rate)
+metrics.gauge("status_updates", lambda: status_messages.updates)
+metrics.gauge("status_edits", lambda: status_messages.edits + status_messages.sends)
+metrics.gauge(
+    "status_edits_saved",
+    lambda: status_messages.coalesced + status_messages.unchanged,
+)
+
 
 @bot.event
+@timed("event")
 async def on_member_join(member: discord.Member) -> None:
-    add_user(member.id)
+    await add_user(member.id)
 
 
 @bot.event
+@timed("event")
 async def on_ready() -> None:
     print(f"{bot.user} has connected to Discord!")
 
-    create_tables()
-
-    # Setup helper commands
-    setup_helper_commands(bot)
-    setup_poker_commands(bot)
-
-    # Setup table timer
-    setup_table_timer(bot)
-
-    await bot.tree.sync()
+    # Reconnects fire on_ready again, setup already ran in setup_hook
+    if bot.started_up:
+        return
+    bot.started_up = True
 
     end_time: float = time.time()
 
     elapsed_time: float = end_time - start_time
 
+    metrics.gauge("startup_seconds", lambda: elapsed_time)
     print("Time to start up", round(elapsed_time, 2), "seconds")
+    print(
+        f"Client profile {CLIENT_PROFILE}, "
+        f"{resident_memory() / 2**20:.1f}MiB resident, "
+        f"{gateway_stats.events} gateway events so far"
+    )
+
+
+@bot.event
+async def on_socket_event_type(event_type: str) -> None:
+    # Every gateway event, so not timed: counting is all it does
+    gateway_stats.observe(event_type)
 
 
 @bot.event
+@timed("event")
 async def on_message(message: discord.Message) -> None:
     # Only process messages in table threads
-    if isinstance(message.channel, discord.Thread) and channel_is_table(
+    if isinstance(message.channel, discord.Thread) and await channel_is_table(
         message.channel.id
     ):
-        update_table_last_message_time(message.channel.id)
+        table_activity.touch(message.channel.id)
 
     # Let the bot process commands
     await bot.process_commands(message)
 
 
 if __name__ == "__main__":
+    bot_players.load()
     bot.run(TOKEN)
+    hand_history.close()
+    table_snapshots.close()
+    worker_pool.close()
+    bot_players.close()
+    storage.close()
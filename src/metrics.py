@@ -0,0 +1,247 @@
+import asyncio
+import functools
+import inspect
+import os
+import time
+from bisect import bisect_left
+from typing import Any, Callable, Optional, TypeVar
+
+from discord.ext import tasks
+
+from constants import METRICS_PATH, METRICS_WRITE_SECONDS
+
+F = TypeVar("F", bound=Callable[..., Any])
+
+# Upper bounds in seconds, the last bucket catches everything slower
+BUCKETS: tuple[float, ...] = (
+    0.00001,
+    0.000025,
+    0.00005,
+    0.0001,
+    0.00025,
+    0.0005,
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+    float("inf"),
+)
+
+
+class Histogram:
+    """Latencies of one function, bucketed Prometheus style"""
+
+    __slots__ = ("kind", "name", "counts", "count", "total", "errors")
+
+    def __init__(self, kind: str, name: str) -> None:
+        self.kind: str = kind
+        self.name: str = name
+        self.counts: list[int] = [0] * len(BUCKETS)
+        self.count: int = 0
+        self.total: float = 0.0
+        self.errors: int = 0
+
+    def observe(self, seconds: float) -> None:
+        self.counts[bisect_left(BUCKETS, seconds)] += 1
+        self.count += 1
+        self.total += seconds
+
+    def quantile(self, q: float) -> float:
+        """Estimate a quantile by interpolating inside its bucket"""
+        if self.count == 0:
+            return 0.0
+        rank: float = q * self.count
+        seen: int = 0
+        for index, bucket_count in enumerate(self.counts):
+            if bucket_count and seen + bucket_count >= rank:
+                lower: float = BUCKETS[index - 1] if index else 0.0
+                upper: float = BUCKETS[index]
+                if upper == float("inf"):
+                    return lower
+                return lower + (upper - lower) * (rank - seen) / bucket_count
+            seen += bucket_count
+        return BUCKETS[-2]
+
+
+class Metrics:
+    """
+    - Holds every histogram, counter and gauge in memory.
+    - Histograms are created once when a function is decorated, so timing a
+      call is two clock reads and a bisect.
+    """
+
+    def __init__(self) -> None:
+        self.histograms: dict[tuple[str, str], Histogram] = {}
+        self.counters: dict[str, int] = {}
+        self.gauges: dict[str, Callable[[], float]] = {}
+        self.started_at: float = time.time()
+
+    def histogram(self, kind: str, name: str) -> Histogram:
+        histogram: Optional[Histogram] = self.histograms.get((kind, name))
+        if histogram is None:
+            histogram = self.histograms[(kind, name)] = Histogram(kind, name)
+        return histogram
+
+    def inc(self, name: str, amount: int = 1) -> None:
+        self.counters[name] = self.counters.get(name, 0) + amount
+
+    def gauge(self, name: str, read: Callable[[], float]) -> None:
+        """Register a value that is read whenever metrics are exported"""
+        self.gauges[name] = read
+
+    def timed(self, kind: str, name: Optional[str] = None) -> Callable[[F], F]:
+        """
+        - Takes the kind of function (command, event, db, task) and an
+          optional name, which defaults to the function's name.
+        - Returns a decorator that records the latency and errors of every
+          call. Works on both coroutine and plain functions.
+        """
+
+        def decorator(func: F) -> F:
+            histogram: Histogram = self.histogram(kind, name or func.__name__)
+            perf_counter: Callable[[], float] = time.perf_counter
+
+            if inspect.iscoroutinefunction(func):
+
+                @functools.wraps(func)
+                async def async_wrapper(*args: Any, **kwargs: Any) -> Any:
+                    start_time: float = perf_counter()
+                    try:
+                        return await func(*args, **kwargs)
+                    except BaseException:
+                        histogram.errors += 1
+                        raise
+                    finally:
+                        histogram.observe(perf_counter() - start_time)
+
+                return async_wrapper  # type: ignore[return-value]
+
+            @functools.wraps(func)
+            def wrapper(*args: Any, **kwargs: Any) -> Any:
+                start_time: float = perf_counter()
+                try:
+                    return func(*args, **kwargs)
+                except BaseException:
+                    histogram.errors += 1
+                    raise
+                finally:
+                    histogram.observe(perf_counter() - start_time)
+
+            return wrapper  # type: ignore[return-value]
+
+        return decorator
+
+    def overhead(self, calls: int = 20_000) -> float:
+        """Seconds one timed call adds to a coroutine that does nothing"""
+
+        async def bare() -> None:
+            pass
+
+        probe: Metrics = Metrics()
+        wrapped: Callable[[], Any] = probe.timed("probe")(bare)
+
+        async def measure(func: Callable[[], Any]) -> float:
+            start_time: float = time.perf_counter()
+            for _ in range(calls):
+                await func()
+            return time.perf_counter() - start_time
+
+        async def compare() -> float:
+            return (await measure(wrapped) - await measure(bare)) / calls
+
+        # Runs in its own loop so it can also be called from a thread
+        return max(asyncio.run(compare()), 0.0)
+
+    def summary(self, limit: int = 15) -> str:
+        """The busiest functions by total time, as a fixed width table"""
+        rows: list[Histogram] = sorted(
+            (h for h in self.histograms.values() if h.count),
+            key=lambda h: h.total,
+            reverse=True,
+        )[:limit]
+        lines: list[str] = [
+            f"{'kind':<8}{'name':<26}{'calls':>8}{'p50 ms':>9}{'p99 ms':>9}{'err':>5}"
+        ]
+        for h in rows:
+            lines.append(
+                f"{h.kind:<8}{h.name[:25]:<26}{h.count:>8}"
+                f"{h.quantile(0.5) * 1000:>9.2f}{h.quantile(0.99) * 1000:>9.2f}"
+                f"{h.errors:>5}"
+            )
+        for counter_name, value in sorted(self.counters.items()):
+            lines.append(f"{counter_name}: {value}")
+        for gauge_name, read in sorted(self.gauges.items()):
+            lines.append(f"{gauge_name}: {read():g}")
+        return "\n".join(lines)
+
+    def render(self) -> str:
+        """Everything in the Prometheus text exposition format"""
+        lines: list[str] = []
+        for kind in sorted({kind for kind, _ in self.histograms}):
+            metric: str = f"pokerbot_{kind}_seconds"
+            lines.append(f"# TYPE {metric} histogram")
+            for (histogram_kind, name), h in sorted(self.histograms.items()):
+                if histogram_kind != kind:
+                    continue
+                cumulative: int = 0
+                for bound, bucket_count in zip(BUCKETS, h.counts):
+                    cumulative += bucket_count
+                    le: str = "+Inf" if bound == float("inf") else f"{bound:g}"
+                    lines.append(
+                        f'{metric}_bucket{{name="{name}",le="{le}"}} {cumulative}'
+                    )
+                lines.append(f'{metric}_sum{{name="{name}"}} {h.total}')
+                lines.append(f'{metric}_count{{name="{name}"}} {h.count}')
+
+            errors: str = f"pokerbot_{kind}_errors_total"
+            lines.append(f"# TYPE {errors} counter")
+            for (histogram_kind, name), h in sorted(self.histograms.items()):
+                if histogram_kind == kind:
+                    lines.append(f'{errors}{{name="{name}"}} {h.errors}')
+
+        for counter_name, value in sorted(self.counters.items()):
+            lines.append(f"# TYPE pokerbot_{counter_name} counter")
+            lines.append(f"pokerbot_{counter_name} {value}")
+        for gauge_name, read in sorted(self.gauges.items()):
+            lines.append(f"# TYPE pokerbot_{gauge_name} gauge")
+            lines.append(f"pokerbot_{gauge_name} {read()}")
+        lines.append("# TYPE pokerbot_uptime_seconds gauge")
+        lines.append(f"pokerbot_uptime_seconds {time.time() - self.started_at}")
+        return "\n".join(lines) + "\n"
+
+    async def write(self, path: str = METRICS_PATH) -> None:
+        """Write the Prometheus file, replacing the old one atomically"""
+        text: str = self.render()
+        await asyncio.to_thread(_write_atomic, path, text)
+
+
+def _write_atomic(path: str, text: str) -> None:
+    temp_path: str = f"{path}.tmp"
+    with open(temp_path, "w") as file:
+        file.write(text)
+    os.replace(temp_path, path)
+
+
+metrics: Metrics = Metrics()
+timed = metrics.timed
+
+
+def setup_metrics_writer(path: str = METRICS_PATH) -> None:
+    @tasks.loop(seconds=METRICS_WRITE_SECONDS)
+    async def write_metrics() -> None:
+        """Write the metrics for Prometheus' node exporter to pick up"""
+        try:
+            await metrics.write(path)
+        except Exception as e:
+            print(f"Error writing metrics: {e}")
+
+    write_metrics.start()
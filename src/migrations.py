@@ -0,0 +1,195 @@
+import sqlite3
+from typing import Callable, Optional
+
+# Every change to the schema is a new migration at the end of this list, never
+# an edit to an old one. Databases from before schema_version existed already
+# have some of these applied, so the early ones are safe to run again.
+
+
+def create_users_and_tables(conn: sqlite3.Connection) -> None:
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS users (
+            user_id INTEGER NOT NULL PRIMARY KEY,
+            money INTEGER NOT NULL DEFAULT 1000,
+            temp_money INTEGER NOT NULL DEFAULT 0,
+            lifttime_losses INTEGER NOT NULL DEFAULT 0,
+            lifttime_wins INTEGER NOT NULL DEFAULT 0,
+            lifttime_profit INTEGER NOT NULL DEFAULT 0,
+            joined_table INTEGER NOT NULL DEFAULT 0,
+            joined_table_name TEXT NOT NULL DEFAULT ""
+        )"""
+    )
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS tables (
+            table_id INTEGER NOT NULL PRIMARY KEY,
+            table_owner_id INTEGER NOT NULL,
+            temp_money BOOLEAN NOT NULL DEFAULT FALSE,
+            table_name TEXT NOT NULL,
+            min_bet INTEGER NOT NULL DEFAULT 5,
+            max_bet INTEGER NOT NULL DEFAULT 0,
+            last_message_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+        )"""
+    )
+
+
+def add_table_last_activity(conn: sqlite3.Connection) -> None:
+    """Integer epoch copy of last_message_at, so expiry compares integers"""
+    if "last_activity" not in columns(conn, "tables"):
+        conn.execute(
+            "ALTER TABLE tables ADD COLUMN last_activity INTEGER NOT NULL DEFAULT 0"
+        )
+        conn.execute(
+            "UPDATE tables SET last_activity = CAST(strftime('%s', last_message_at) AS INTEGER)"
+        )
+    conn.execute(
+        "CREATE INDEX IF NOT EXISTS idx_tables_last_activity ON tables (last_activity)"
+    )
+
+
+def create_bot_state(conn: sqlite3.Connection) -> None:
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS bot_state (
+            key TEXT NOT NULL PRIMARY KEY,
+            value TEXT NOT NULL
+        )"""
+    )
+
+
+def index_users_joined_table(conn: sqlite3.Connection) -> None:
+    """Seating, unseating and dealing look users up by the table they're at"""
+    conn.execute(
+        "CREATE INDEX IF NOT EXISTS idx_users_joined_table ON users (joined_table)"
+    )
+
+
+def index_leaderboards(conn: sqlite3.Connection) -> None:
+    """
+    Ranked reads walk these in order and rank counts are range scans, both
+    without touching the table since user_id is the rowid
+    """
+    for column in ("lifttime_profit", "money", "lifttime_wins"):
+        conn.execute(
+            f"CREATE INDEX IF NOT EXISTS idx_users_{column} ON users ({column} DESC, user_id)"
+        )
+
+
+def create_ledger(conn: sqlite3.Connection) -> None:
+    """Every change to a balance, opened with the balances as they are now"""
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS ledger (
+            entry_id INTEGER NOT NULL PRIMARY KEY,
+            user_id INTEGER NOT NULL,
+            currency TEXT NOT NULL,
+            delta INTEGER NOT NULL,
+            balance INTEGER NOT NULL,
+            kind TEXT NOT NULL,
+            table_id INTEGER,
+            hand_number INTEGER,
+            created_at INTEGER NOT NULL DEFAULT (CAST(strftime('%s', 'now') AS INTEGER))
+        )"""
+    )
+    conn.execute(
+        "CREATE INDEX IF NOT EXISTS idx_ledger_user_id ON ledger (user_id, entry_id)"
+    )
+    for currency in ("money", "temp_money"):
+        conn.execute(
+            f"""
+            INSERT INTO ledger (user_id, currency, delta, balance, kind)
+            SELECT user_id, '{currency}', {currency}, {currency}, 'opening'
+            FROM users WHERE {currency} != 0
+            """
+        )
+
+
+def add_table_guild_id(conn: sqlite3.Connection) -> None:
+    """Which guild a table is in, so each shard only handles its own tables"""
+    if "guild_id" not in columns(conn, "tables"):
+        conn.execute(
+            "ALTER TABLE tables ADD COLUMN guild_id INTEGER NOT NULL DEFAULT 0"
+        )
+
+
+def create_player_stats(conn: sqlite3.Connection) -> None:
+    """Poker stats per player, counters added to as every hand is settled"""
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS player_stats (
+            user_id INTEGER NOT NULL PRIMARY KEY,
+            hands INTEGER NOT NULL DEFAULT 0,
+            vpip_hands INTEGER NOT NULL DEFAULT 0,
+            pfr_hands INTEGER NOT NULL DEFAULT 0,
+            showdowns INTEGER NOT NULL DEFAULT 0,
+            showdowns_won INTEGER NOT NULL DEFAULT 0,
+            biggest_pot INTEGER NOT NULL DEFAULT 0,
+            profit INTEGER NOT NULL DEFAULT 0
+        ) WITHOUT ROWID"""
+    )
+
+
+MIGRATIONS: list[tuple[int, str, Callable[[sqlite3.Connection], None]]] = [
+    (1, "create users and tables", create_users_and_tables),
+    (2, "add tables.last_activity", add_table_last_activity),
+    (3, "create bot_state", create_bot_state),
+    (4, "index users.joined_table", index_users_joined_table),
+    (5, "index leaderboard columns", index_leaderboards),
+    (6, "create ledger", create_ledger),
+    (7, "add tables.guild_id", add_table_guild_id),
+    (8, "create player_stats", create_player_stats),
+]
+
+
+def columns(conn: sqlite3.Connection, table: str) -> list[str]:
+    return [row[1] for row in conn.execute(f"PRAGMA table_info({table})")]
+
+
+def schema_version(conn: sqlite3.Connection) -> int:
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS schema_version (
+            version INTEGER NOT NULL PRIMARY KEY,
+            name TEXT NOT NULL,
+            applied_at INTEGER NOT NULL DEFAULT (CAST(strftime('%s', 'now') AS INTEGER))
+        )"""
+    )
+    row: tuple[Optional[int]] = conn.execute(
+        "SELECT MAX(version) FROM schema_version"
+    ).fetchone()
+    return row[0] or 0
+
+
+def migrate(conn: sqlite3.Connection, target: Optional[int] = None) -> list[int]:
+    """
+    - Apply every migration newer than the database, up to `target` if given.
+    - Each migration and its schema_version row commit in one transaction, so
+      a failed migration leaves the database at the previous version.
+    - Safe to run from several processes at once: each migration takes the
+      write lock first and is skipped if another process applied it meanwhile.
+    - Returns the versions that were applied.
+    """
+    current: int = schema_version(conn)
+    applied: list[int] = []
+    for version, name, apply in MIGRATIONS:
+        if version <= current or (target is not None and version > target):
+            continue
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            current = schema_version(conn)
+            if version <= current:
+                conn.rollback()
+                continue
+            apply(conn)
+            conn.execute(
+                "INSERT INTO schema_version (version, name) VALUES (?, ?)",
+                (version, name),
+            )
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        print(f"Applied migration {version}: {name}")
+        applied.append(version)
+    return applied
@@ -1,17 +1,38 @@
+import asyncio
+from typing import Awaitable, Callable, Optional
+
 import discord
+from discord import app_commands
 from discord.ext import commands
 
-from database import (add_table, add_user_to_table, channel_is_table,
-                      delete_table, get_table_name, get_user_data,
-                      remove_user_from_table, user_is_in_table,
+from activity import table_activity
+from actor import TableActor, table_actors
+from bots import bot_players, is_bot
+from database import (add_bots, add_table, add_user_to_table, channel_is_table,
+                      delete_table, get_table, get_table_name,
+                      get_table_players, get_user_data, hand_is_settled,
+                      remove_bots, settle_hand, user_is_in_table,
                       user_is_owner_of_table)
-
-
-def setup_poker_commands(bot: commands.Bot) -> None:
+from equity import EquityResult, equity
+from evaluator import cards_str, parse_cards
+from game import Game, IllegalAction, mention
+from history import hand_history
+from interactions import deferred, reply
+from metrics import timed
+from registry import TableInfo, table_registry
+from settlement import settle
+from snapshots import table_snapshots
+from status import status_messages, status_text
+from workers import worker_pool
+
+
+def setup_poker_commands(bot: commands.AutoShardedBot) -> None:
     """Setup all poker commands for the bot"""
 
     # Table management
     @bot.tree.command(name="create", description="Create a poker table")
+    @timed("command", "create")
+    @deferred()
     async def create(
         interaction: discord.Interaction,
         temp_money: bool = False,
@@ -24,9 +45,10 @@ def setup_poker_commands(bot: commands.Bot) -> None:
         discord_user_name: str = discord_user.display_name
 
         # Check if the user exists in the database
-        if not get_user_data(discord_user_id):
-            await interaction.response.send_message(
-                "You don't exist in the database! Use `/init` to initialize your account."
+        if not await get_user_data(discord_user_id):
+            await reply(
+                interaction,
+                "You don't exist in the database! Use `/init` to initialize your account.",
             )
             return
 
@@ -42,15 +64,17 @@ def setup_poker_commands(bot: commands.Bot) -> None:
         if not isinstance(
             interaction.channel, (discord.TextChannel, discord.ForumChannel)
         ):
-            await interaction.response.send_message(
-                "This command can only be used in text channels or forum channels! NOT TABLES!"
+            await reply(
+                interaction,
+                "This command can only be used in text channels or forum channels! NOT TABLES!",
             )
             return
 
         try:
-            # Send initial response to acknowledge the command
-            await interaction.response.send_message(
-                f"Creating table `{table_name}`, Temp money: {temp_money}, Min bet: {min_bet}, Max bet: {max_bet}"
+            # Tell the user what's being created, the interaction is already deferred
+            await reply(
+                interaction,
+                f"Creating table `{table_name}`, Temp money: {temp_money}, Min bet: {min_bet}, Max bet: {max_bet}",
             )
 
             # Create thread with the table name
@@ -64,26 +88,19 @@ def setup_poker_commands(bot: commands.Bot) -> None:
                 await interaction.followup.send("❌ Unsupported channel type!")
                 return
 
-            # Create a message in the thread
-            await thread.send(
-                f"🎰 **Table {table_name}** created!\n"
-                f"💸 Temp money: {temp_money}\n"
-                f"💰 Min bet: {min_bet}\n"
-                f"💎 Max bet: {max_bet}\n"
-                f"👤 Created by: {discord_user.mention}\n"
-                f"⏰ **Auto-delete:** This table will be automatically deleted after 5 minutes of inactivity"
-            )
-
-            add_table(
+            await add_table(
                 thread.id,
                 discord_user_id,
                 table_name,
                 temp_money,
                 min_bet,
                 max_bet,
+                interaction.guild_id or 0,
             )
 
-            add_user_to_table(discord_user_id, thread.id)
+            await add_user_to_table(discord_user_id, thread.id)
+            # The table's details go in its status message
+            await show_table(thread)
 
         except discord.Forbidden:
             await interaction.followup.send(
@@ -93,10 +110,13 @@ def setup_poker_commands(bot: commands.Bot) -> None:
             await interaction.followup.send(f"❌ Failed to create table: {str(e)}")
 
     @bot.tree.command(name="join", description="Join's the current table")
+    @timed("command", "join")
+    @deferred(ephemeral=True)
     async def join(interaction: discord.Interaction) -> None:
         if interaction.channel is None:
-            await interaction.response.send_message(
-                "This command can only be used in a text channel with a table!"
+            await reply(
+                interaction,
+                "This command can only be used in a text channel with a table!",
             )
             return
 
@@ -104,31 +124,37 @@ def setup_poker_commands(bot: commands.Bot) -> None:
         discord_user: discord.User | discord.Member = interaction.user
         discord_user_id: int = discord_user.id
 
-        if not channel_is_table(channel_id):
-            await interaction.response.send_message(
-                "This channel is not a table! Use `/create` to create a table."
+        if not await channel_is_table(channel_id):
+            await reply(
+                interaction,
+                "This channel is not a table! Use `/create` to create a table.",
             )
             return
 
-        if user_is_in_table(discord_user_id):
-            table_name: str = get_table_name(discord_user_id)
-            await interaction.response.send_message(
+        if await user_is_in_table(discord_user_id):
+            table_name: str = await get_table_name(discord_user_id)
+            await reply(
+                interaction,
                 f"You are already in a table, {table_name}!",
                 ephemeral=True,
             )
             return
 
-        # Add the user to the table
-        add_user_to_table(discord_user_id, channel_id)
-        await interaction.response.send_message(
-            f"{discord_user.display_name} joined the table!"
-        )
+        # Add the user to the table, everyone sees it in the status message
+        await add_user_to_table(discord_user_id, channel_id)
+        table_activity.touch(channel_id)
+        if isinstance(interaction.channel, discord.Thread):
+            await show_table(interaction.channel)
+        await reply(interaction, "You joined the table!", ephemeral=True)
 
     @bot.tree.command(name="delete", description="Deletes the current table")
+    @timed("command", "delete")
+    @deferred(ephemeral=True)
     async def delete(interaction: discord.Interaction) -> None:
         if interaction.channel is None:
-            await interaction.response.send_message(
-                "This command can only be used in a text channel with a table!"
+            await reply(
+                interaction,
+                "This command can only be used in a text channel with a table!",
             )
             return
 
@@ -136,15 +162,17 @@ def setup_poker_commands(bot: commands.Bot) -> None:
         discord_user: discord.User | discord.Member = interaction.user
         discord_user_id: int = discord_user.id
 
-        if not channel_is_table(channel_id):
-            await interaction.response.send_message(
+        if not await channel_is_table(channel_id):
+            await reply(
+                interaction,
                 "This channel is not a table! Use `/create` to create a table.",
                 ephemeral=True,
             )
             return
 
-        if not user_is_owner_of_table(discord_user_id, channel_id):
-            await interaction.response.send_message(
+        if not await user_is_owner_of_table(discord_user_id, channel_id):
+            await reply(
+                interaction,
                 "You are not the owner of this table! Use `/create` to create a table.",
                 ephemeral=True,
             )
@@ -152,48 +180,334 @@ def setup_poker_commands(bot: commands.Bot) -> None:
         # This check is useless because the channel_is_table function checks if the channel is a table
         # and all tables are threads, but it makes mypy happy, because else it might not have the .delete() method
         if not isinstance(interaction.channel, discord.Thread):
-            await interaction.response.send_message(
-                "This command can only be used in a thread with a table!"
+            await reply(
+                interaction, "This command can only be used in a thread with a table!"
             )
             return
 
-        # Delete the table
-        delete_table(channel_id)
-        remove_user_from_table(discord_user_id)
-        await interaction.response.send_message("Deleting table...", ephemeral=True)
+        # Delete the table, which unseats everyone at it
+        await delete_table(channel_id)
+        await reply(interaction, "Deleting table...", ephemeral=True)
         await interaction.channel.delete()
 
+    @bot.tree.command(name="bots", description="Seat bots at the current table")
+    @app_commands.describe(count="How many bots to add, 0 removes them all")
+    @timed("command", "bots")
+    @deferred(ephemeral=True)
+    async def bots(interaction: discord.Interaction, count: int = 1) -> None:
+        if interaction.channel is None or not await channel_is_table(
+            interaction.channel.id
+        ):
+            await reply(
+                interaction,
+                "This channel is not a table! Use `/create` to create a table.",
+                ephemeral=True,
+            )
+            return
+
+        channel_id: int = interaction.channel.id
+        if not await user_is_owner_of_table(interaction.user.id, channel_id):
+            await reply(
+                interaction,
+                "Only the owner of this table can seat bots!",
+                ephemeral=True,
+            )
+            return
+
+        if count <= 0:
+            removed: list[int] = await remove_bots(channel_id)
+            table_activity.touch(channel_id)
+            if isinstance(interaction.channel, discord.Thread):
+                await show_table(interaction.channel)
+            await reply(
+                interaction, f"🤖 {len(removed)} bots left the table.", ephemeral=True
+            )
+            return
+
+        seated: list[int] = await add_bots(channel_id, count)
+        if not seated:
+            await reply(
+                interaction, "There are no free seats or bots left!", ephemeral=True
+            )
+            return
+        table_activity.touch(channel_id)
+        if isinstance(interaction.channel, discord.Thread):
+            await show_table(interaction.channel)
+        await reply(
+            interaction,
+            f"🤖 {', '.join(mention(bot_id) for bot_id in seated)} joined the table! "
+            "They're dealt in from the next hand.",
+            ephemeral=True,
+        )
+
+    @bot.tree.command(name="odds", description="Calculate your odds of winning")
+    @app_commands.describe(
+        hole="Your two hole cards, like AsKd",
+        board="The cards on the board, like 7h8h9c",
+        opponents="How many opponents are still in the hand",
+    )
+    @timed("command", "odds")
+    @deferred(ephemeral=True)
+    async def odds(
+        interaction: discord.Interaction,
+        hole: str,
+        board: str = "",
+        opponents: int = 1,
+    ) -> None:
+        try:
+            hole_cards: list[int] = parse_cards(hole)
+            board_cards: list[int] = parse_cards(board)
+            # Simulations are CPU bound, run them off the event loop
+            result: EquityResult = await worker_pool.run(
+                equity, hole_cards, board_cards, opponents
+            )
+        except ValueError as e:
+            await reply(interaction, f"❌ {e}", ephemeral=True)
+            return
+
+        method: str = "exact" if result.exact else f"{result.samples} simulations"
+        await reply(
+            interaction,
+            f"🎲 **{cards_str(hole_cards)}** on **{cards_str(board_cards) or 'no board'}** "
+            f"against {opponents} opponent{'s' if opponents != 1 else ''}:\n"
+            f"Equity: {result.equity * 100:.1f}%\n"
+            f"Win: {result.win * 100:.1f}%, Tie: {result.tie * 100:.1f}%\n"
+            f"({method})",
+            ephemeral=True,
+        )
+
     @bot.tree.command(name="list", description="List's everyone in the current table")
+    @timed("command", "list")
     async def list(interaction: discord.Interaction) -> None:
         pass
 
     @bot.tree.command(name="leave", description="Leave's the current table")
+    @timed("command", "leave")
     async def leave(interaction: discord.Interaction) -> None:
         pass
 
     @bot.tree.command(name="start", description="Start's the current table")
+    @timed("command", "start")
+    @deferred(ephemeral=True)
     async def start(interaction: discord.Interaction) -> None:
-        pass
+        async def action(actor: TableActor) -> str:
+            game: Optional[Game] = actor.state
+            if game is None:
+                table: Optional[TableInfo] = await get_table(actor.table_id)
+                if table is None:
+                    raise IllegalAction("This table doesn't exist anymore!")
+                game = actor.state = Game(actor.table_id, table.min_bet, table.max_bet)
+            if game.in_hand:
+                raise IllegalAction("A hand is already running!")
+
+            game.seat_players(await get_table_players(actor.table_id))
+            game.start_hand()
+            return await finish_action(actor, game)
+
+        await run_table_action(interaction, action)
+
+    @bot.tree.command(name="cards", description="Show your hole cards")
+    @timed("command", "cards")
+    @deferred(ephemeral=True)
+    async def cards(interaction: discord.Interaction) -> None:
+        async def action(actor: TableActor) -> str:
+            game: Game = current_game(actor)
+            seat: int = game.seat_of(interaction.user.id)
+            if seat < 0 or not game.in_hand:
+                raise IllegalAction("You aren't playing in this hand!")
+            return f"Your cards: **{cards_str(game.hole_cards(seat))}**"
+
+        await run_table_action(interaction, action, show=False)
 
     # Actions
     @bot.tree.command(name="check", description="Check's the current table")
+    @timed("command", "check")
+    @deferred(ephemeral=True)
     async def check(interaction: discord.Interaction) -> None:
-        pass
+        await run_player_action(interaction, Game.check)
 
     @bot.tree.command(name="call", description="Call's the current table")
+    @timed("command", "call")
+    @deferred(ephemeral=True)
     async def call(interaction: discord.Interaction) -> None:
-        pass
+        await run_player_action(interaction, Game.call)
 
     @bot.tree.command(name="raise", description="Raise's the current table")
+    @timed("command", "raise")
+    @deferred(ephemeral=True)
     async def raise_command(interaction: discord.Interaction, amount: int) -> None:
-        pass
+        await run_player_action(
+            interaction, lambda game, seat: game.raise_by(seat, amount)
+        )
 
     @bot.tree.command(name="fold", description="Fold's the current table")
+    @timed("command", "fold")
+    @deferred(ephemeral=True)
     async def fold(interaction: discord.Interaction) -> None:
-        pass
+        await run_player_action(interaction, Game.fold)
 
     @bot.tree.command(name="all-in", description="All-in's the current table")
+    @timed("command", "all-in")
+    @deferred(ephemeral=True)
     async def all_in(interaction: discord.Interaction) -> None:
-        pass
+        await run_player_action(interaction, Game.all_in)
 
     pass
+
+
+async def run_table_action(
+    interaction: discord.Interaction,
+    action: Callable[[TableActor], Awaitable[str]],
+    show: bool = True,
+) -> None:
+    """
+    - Takes an interaction and an action that returns the reply to send.
+    - Queues the action on the table's actor, so actions on the same table are
+      applied strictly in order while other tables carry on in parallel.
+    - The reply is for the user only, what happened is shown to everyone by
+      updating the table's status message, unless `show` is False.
+    - Replies are ephemeral, so no message marks the table as active: every
+      action that goes through counts as activity itself.
+    - An IllegalAction is shown to the user only, as is any other error so
+      the deferred interaction always gets its followup.
+    """
+    # Tables are threads, and only a thread can hold the status message
+    if not isinstance(
+        interaction.channel, discord.Thread
+    ) or not await channel_is_table(interaction.channel.id):
+        await reply(
+            interaction,
+            "This channel is not a table! Use `/create` to create a table.",
+            ephemeral=True,
+        )
+        return
+
+    try:
+        message: str = await table_actors.get(interaction.channel.id).submit(action)
+    except IllegalAction as e:
+        await reply(interaction, f"❌ {e}", ephemeral=True)
+        return
+    except Exception as e:
+        print(f"Error at table {interaction.channel.id}: {e}")
+        await reply(interaction, f"❌ Something went wrong: {e}", ephemeral=True)
+        return
+    table_activity.touch(interaction.channel.id)
+    if show:
+        await show_table(interaction.channel)
+    await reply(interaction, message, ephemeral=True)
+
+
+async def run_player_action(
+    interaction: discord.Interaction, move: Callable[[Game, int], None]
+) -> None:
+    """Apply a betting action for the user who sent the interaction"""
+
+    async def action(actor: TableActor) -> str:
+        game: Game = current_game(actor)
+        move(game, game.seat_of(interaction.user.id))
+        return await finish_action(actor, game)
+
+    await run_table_action(interaction, action)
+
+
+def current_game(actor: TableActor) -> Game:
+    if actor.state is None:
+        raise IllegalAction("There is no hand running, use `/start` to deal one!")
+    return actor.state
+
+
+async def finish_action(actor: TableActor, game: Game) -> str:
+    """
+    - Log the action for crash recovery, then let the bots act if it's their
+      turn and log theirs.
+    - Settle the hand if it just ended, and only once the settlement is
+      committed record it in the history and mark it settled.
+    - Keep what happened for the table's status message.
+    - Returns what happened, followed by whose turn it is.
+    """
+    table_snapshots.log(actor.table_id, game)
+    await bot_players.play(game)
+    table_snapshots.log(actor.table_id, game)
+    if not game.in_hand and not table_snapshots.is_settled(
+        actor.table_id, game.hand_number
+    ):
+        # Neither goes to worker_pool: the showdown was evaluated by the last
+        # action (a few µs a seat, less than a trip to the pool), and the
+        # settlement is written on the storage thread, which owns the connection
+        table: Optional[TableInfo] = await get_table(actor.table_id)
+        await settle_hand(settle(game, bool(table and table.temp_money)))
+        hand_history.record(game.hand_record())
+        table_snapshots.mark_settled(actor.table_id, game.hand_number)
+
+    status_messages.get(actor.table_id).log.extend(game.log)
+    lines: list[str] = game.log + [game.status_line()]
+    game.log = []
+    return "\n".join(lines)
+
+
+async def show_table(thread: discord.Thread) -> None:
+    """
+    - Bring the status message of a table up to date: its details, the
+      players with their chips and the latest of the game log.
+    - Returns right away, the message is edited in the background (see
+      status.py).
+    """
+    table: Optional[TableInfo] = await get_table(thread.id)
+    if table is None:
+        return
+    game: Optional[Game] = table_actors.get(thread.id).state
+    players: list[tuple[int, int]] = (
+        [(game.user_ids[seat], game.stacks[seat]) for seat in range(game.seat_count)]
+        if game is not None and game.in_hand
+        else await get_table_players(thread.id)
+    )
+    log: list[str] = list(status_messages.get(thread.id).log)
+    status_messages.update(thread, status_text(table, players, game, log))
+
+
+# Hands picked up again after a restart, kept until they're done
+_resuming: set[asyncio.Task[str]] = set()
+
+
+async def restore_tables() -> list[Game]:
+    """
+    - Put the games of the last run back at their tables (see snapshots.py),
+      before any interaction comes in.
+    - A hand that ended without being settled is settled, and bots whose
+      turn it was act, in the background.
+    - Returns the restored games.
+    """
+    games: list[Game] = table_snapshots.restore(set(table_registry.tables))
+    for game in games:
+        actor: TableActor = table_actors.get(game.table_id)
+        actor.state = game
+        if game.in_hand:
+            resume: bool = is_bot(game.user_ids[game.to_act])
+        elif game.hand_number and not table_snapshots.is_settled(
+            game.table_id, game.hand_number
+        ):
+            seat: int = next(
+                seat for seat in range(game.seat_count) if game.starting_stacks[seat]
+            )
+            # The crash may have come after the settlement, but before it was logged
+            resume = not await hand_is_settled(
+                game.table_id, game.hand_number, game.user_ids[seat]
+            )
+            if not resume:
+                table_snapshots.mark_settled(game.table_id, game.hand_number)
+        else:
+            resume = False
+
+        if resume:
+            task: asyncio.Task[str] = asyncio.create_task(
+                actor.submit(lambda actor: finish_action(actor, actor.state))
+            )
+            _resuming.add(task)
+            task.add_done_callback(_resumed)
+    return games
+
+
+def _resumed(task: asyncio.Task[str]) -> None:
+    _resuming.discard(task)
+    if not task.cancelled() and task.exception() is not None:
+        print(f"Error resuming a table: {task.exception()}")
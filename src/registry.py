@@ -0,0 +1,78 @@
+from typing import Optional
+
+
+class TableInfo:
+    __slots__ = (
+        "table_id",
+        "table_owner_id",
+        "table_name",
+        "temp_money",
+        "min_bet",
+        "max_bet",
+        "guild_id",
+    )
+
+    def __init__(
+        self,
+        table_id: int,
+        table_owner_id: int,
+        table_name: str,
+        temp_money: bool,
+        min_bet: int,
+        max_bet: int,
+        guild_id: int = 0,
+    ):
+        self.table_id = table_id
+        self.table_owner_id = table_owner_id
+        self.table_name = table_name
+        self.temp_money = temp_money
+        self.min_bet = min_bet
+        self.max_bet = max_bet
+        self.guild_id = guild_id
+
+
+class TableRegistry:
+    """
+    - Process-wide copy of the `tables` table, keyed by table id. When sharded,
+      only the tables of this process' shards.
+    - Loaded once at startup and kept in sync by `add_table`/`delete_table`.
+    - `hits`/`misses` count lookups answered from memory, `db_lookups` counts
+      lookups that had to go to the database because it was not loaded yet.
+    """
+
+    def __init__(self) -> None:
+        self.tables: dict[int, TableInfo] = {}
+        self.loaded: bool = False
+        self.hits: int = 0
+        self.misses: int = 0
+        self.db_lookups: int = 0
+
+    def load(self, tables: list[TableInfo]) -> None:
+        self.tables = {table.table_id: table for table in tables}
+        self.loaded = True
+
+    def add(self, table: TableInfo) -> None:
+        self.tables[table.table_id] = table
+
+    def remove(self, table_id: int) -> None:
+        self.tables.pop(table_id, None)
+
+    def get(self, table_id: int) -> Optional[TableInfo]:
+        """Look up a table, only valid once the registry is loaded"""
+        table: Optional[TableInfo] = self.tables.get(table_id)
+        if table is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return table
+
+    def stats(self) -> dict[str, int]:
+        return {
+            "tables": len(self.tables),
+            "hits": self.hits,
+            "misses": self.misses,
+            "db_lookups": self.db_lookups,
+        }
+
+
+table_registry: TableRegistry = TableRegistry()
@@ -1,12 +1,46 @@
+import argparse
+import os
 import subprocess
 
 
+def shard_processes(shards: int, processes: int) -> list[dict[str, str]]:
+    """
+    - Split `shards` shards between `processes` processes, round robin.
+    - Returns the environment of each process.
+    """
+    return [
+        dict(
+            os.environ,
+            SHARD_COUNT=str(shards),
+            SHARD_IDS=",".join(str(i) for i in range(process, shards, processes)),
+        )
+        for process in range(processes)
+    ]
+
+
 def main() -> None:
+    parser: argparse.ArgumentParser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--shards", type=int, default=0, help="Total shards, all in one process"
+    )
+    parser.add_argument(
+        "--processes", type=int, default=1, help="Bot processes to split them over"
+    )
+    parser.add_argument(
+        "--lean",
+        action="store_true",
+        help="Only the intents and caches the bot needs (CLIENT_PROFILE=lean)",
+    )
+    args: argparse.Namespace = parser.parse_args()
+    if args.lean:
+        os.environ["CLIENT_PROFILE"] = "lean"
+    if args.processes > 1 and args.shards < args.processes:
+        parser.error("--shards must be at least --processes")
+
     commands: list[list[str]] = [
         ["uv", "run", "black", "src/"],
         ["uv", "run", "isort", "src/"],
         ["uv", "run", "mypy", "src/"],
-        ["uv", "run", "src/main.py"],
     ]
 
     for command in commands:
@@ -15,7 +49,29 @@ def main() -> None:
             print(
                 f"Command {' '.join(command)} failed with exit code {result.returncode}"
             )
-            break
+            return
+
+    bot: list[str] = ["uv", "run", "src/main.py"]
+    if args.processes <= 1:
+        env: dict[str, str] = dict(os.environ)
+        if args.shards:
+            env["SHARD_COUNT"] = str(args.shards)
+        subprocess.run(bot, env=env)
+        return
+
+    # One bot per process, all sharing the database
+    processes: list[subprocess.Popen[bytes]] = [
+        subprocess.Popen(bot, env=env)
+        for env in shard_processes(args.shards, args.processes)
+    ]
+    try:
+        for process in processes:
+            process.wait()
+    except KeyboardInterrupt:
+        for process in processes:
+            process.terminate()
+        for process in processes:
+            process.wait()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,290 @@
+"""
+Turning a finished hand into balance changes.
+
+- settle() reads the result off the game: what every player put in, won
+  and netted, and the pots they were paid from (see game.side_pots).
+- database.settle_hand() applies a settlement as deltas, with the lifetime
+  stats, the player_stats counters and a ledger row per player, in a single
+  transaction.
+- The ledger holds every change to a balance, so balances can be audited
+  against it and rebuilt from it:
+
+    python src/settlement.py             # Audit the balances
+    python src/settlement.py --rebuild   # Rewrite them from the ledger
+"""
+
+import argparse
+import sqlite3
+from typing import Optional
+
+from game import (ACTIVE, ALL_IN, ALL_IN_ACTION, CALL, PREFLOP, RAISE, Game,
+                  side_pots)
+from migrations import migrate
+from storage import storage
+
+# What a ledger row is for
+LEDGER_OPENING: str = "opening"  # Balances from before the ledger existed
+LEDGER_GRANT: str = "grant"  # New accounts and temp money stacks
+LEDGER_HAND: str = "hand"
+LEDGER_RESET: str = "reset"  # Temp money taken back when players leave a table
+
+
+class SeatResult:
+    __slots__ = ("user_id", "committed", "won", "net", "vpip", "pfr", "showdown")
+
+    def __init__(
+        self,
+        user_id: int,
+        committed: int,
+        won: int,
+        vpip: bool = False,
+        pfr: bool = False,
+        showdown: bool = False,
+    ) -> None:
+        self.user_id = user_id
+        self.committed = committed
+        self.won = won
+        self.net = won - committed
+        self.vpip = vpip  # Called or raised preflop
+        self.pfr = pfr  # Raised preflop
+        self.showdown = showdown
+
+
+class Settlement:
+    __slots__ = ("table_id", "hand_number", "temp_money", "results", "pots")
+
+    def __init__(
+        self,
+        table_id: int,
+        hand_number: int,
+        temp_money: bool,
+        results: list[SeatResult],
+        pots: list[tuple[int, list[int]]],
+    ) -> None:
+        self.table_id = table_id
+        self.hand_number = hand_number
+        self.temp_money = temp_money
+        self.results = results
+        self.pots = pots  # (amount, user ids who could win it)
+
+    @property
+    def column(self) -> str:
+        return "temp_money" if self.temp_money else "money"
+
+
+def settle(game: Game, temp_money: bool) -> Settlement:
+    """
+    - Takes a game whose hand just ended.
+    - Returns what every player in the hand netted.
+    - Raises ValueError if the chips don't add up, nothing is paid then.
+    """
+    if game.in_hand:
+        raise ValueError("The hand hasn't ended yet")
+
+    seats: list[int] = [
+        seat for seat in range(game.seat_count) if game.starting_stacks[seat] > 0
+    ]
+    # Who put money in preflop of their own will, and who raised
+    vpip: set[int] = set()
+    pfr: set[int] = set()
+    for street, seat, action, _ in game.actions:
+        if street == PREFLOP and action in (CALL, RAISE, ALL_IN_ACTION):
+            vpip.add(seat)
+            if action != CALL:
+                pfr.add(seat)
+    live: list[bool] = [status in (ACTIVE, ALL_IN) for status in game.status]
+    showdown: bool = sum(live) > 1
+
+    results: list[SeatResult] = [
+        SeatResult(
+            game.user_ids[seat],
+            game.committed[seat],
+            game.winnings[seat],
+            seat in vpip,
+            seat in pfr,
+            showdown and live[seat],
+        )
+        for seat in seats
+    ]
+    if sum(result.net for result in results) != 0:
+        raise ValueError(
+            f"Hand #{game.hand_number} at {game.table_id} doesn't balance: "
+            f"{[(result.user_id, result.net) for result in results]}"
+        )
+
+    pots: list[tuple[int, list[int]]] = [
+        (amount, [game.user_ids[seat] for seat in eligible])
+        for amount, eligible in side_pots(list(game.committed), live)
+    ]
+    return Settlement(game.table_id, game.hand_number, temp_money, results, pots)
+
+
+def apply_settlement(
+    conn: sqlite3.Connection, settlement: Settlement
+) -> list[tuple[int, int, int, int, int, int]]:
+    """
+    - Takes the storage connection and a settlement.
+    - Adds every player's net to their balance and, for real money, to their
+      lifetime stats (lifttime_wins counts the hands they won, the others are
+      chips), adds the hand to their player_stats counters and writes a
+      ledger row each. One transaction.
+    - Returns the players' updated rows as (user id, money, temp money,
+      lifetime losses, lifetime wins, lifetime profit).
+    """
+    column: str = settlement.column
+    lifetime: int = 0 if settlement.temp_money else 1
+    with conn:
+        conn.executemany(
+            f"""
+            UPDATE users SET
+                {column} = {column} + ?1,
+                lifttime_wins = lifttime_wins + (?1 > 0) * ?2,
+                lifttime_losses = lifttime_losses + MAX(-?1, 0) * ?2,
+                lifttime_profit = lifttime_profit + ?1 * ?2
+            WHERE user_id = ?3
+            """,
+            [(result.net, lifetime, result.user_id) for result in settlement.results],
+        )
+        conn.executemany(
+            f"""
+            INSERT INTO ledger (user_id, currency, delta, balance, kind, table_id, hand_number)
+            VALUES (?1, ?2, ?3, (SELECT {column} FROM users WHERE user_id = ?1), ?4, ?5, ?6)
+            """,
+            [
+                (
+                    result.user_id,
+                    column,
+                    result.net,
+                    LEDGER_HAND,
+                    settlement.table_id,
+                    settlement.hand_number,
+                )
+                for result in settlement.results
+            ],
+        )
+        conn.executemany(
+            """
+            INSERT INTO player_stats
+                (user_id, hands, vpip_hands, pfr_hands, showdowns, showdowns_won, biggest_pot, profit)
+            VALUES (?, 1, ?, ?, ?, ?, ?, ?)
+            ON CONFLICT (user_id) DO UPDATE SET
+                hands = hands + 1,
+                vpip_hands = vpip_hands + excluded.vpip_hands,
+                pfr_hands = pfr_hands + excluded.pfr_hands,
+                showdowns = showdowns + excluded.showdowns,
+                showdowns_won = showdowns_won + excluded.showdowns_won,
+                biggest_pot = MAX(biggest_pot, excluded.biggest_pot),
+                profit = profit + excluded.profit
+            """,
+            [
+                (
+                    result.user_id,
+                    result.vpip,
+                    result.pfr,
+                    result.showdown,
+                    result.showdown and result.won > 0,
+                    result.won,
+                    result.net,
+                )
+                for result in settlement.results
+            ],
+        )
+        user_ids: list[int] = [result.user_id for result in settlement.results]
+        return conn.execute(
+            "SELECT user_id, money, temp_money, lifttime_losses, lifttime_wins, lifttime_profit "
+            f"FROM users WHERE user_id IN ({','.join('?' * len(user_ids))})",
+            user_ids,
+        ).fetchall()
+
+
+# Auditing
+LEDGER_BALANCES: str = """
+    ledger_balances (user_id, money, temp_money, losses, wins, profit) AS (
+        SELECT
+            user_id,
+            SUM(CASE WHEN currency = 'money' THEN delta ELSE 0 END),
+            SUM(CASE WHEN currency = 'temp_money' THEN delta ELSE 0 END),
+            SUM(CASE WHEN currency = 'money' AND kind = 'hand' AND delta < 0 THEN -delta ELSE 0 END),
+            SUM(CASE WHEN currency = 'money' AND kind = 'hand' AND delta > 0 THEN 1 ELSE 0 END),
+            SUM(CASE WHEN currency = 'money' AND kind = 'hand' THEN delta ELSE 0 END)
+        FROM ledger GROUP BY user_id
+    )
+"""
+BALANCE_COLUMNS: tuple[str, ...] = (
+    "money",
+    "temp_money",
+    "lifttime_losses",
+    "lifttime_wins",
+    "lifttime_profit",
+)
+
+
+def audit_ledger(
+    conn: sqlite3.Connection, limit: Optional[int] = None
+) -> list[tuple[int, str, int, int]]:
+    """
+    - Compares every user's balances and lifetime stats with the ledger.
+    - Returns (user id, column, stored value, ledger value) for each mismatch.
+    """
+    mismatches: list[tuple[int, str, int, int]] = []
+    stored: dict[int, tuple[int, ...]] = {
+        row[0]: row[1:]
+        for row in conn.execute(
+            f"SELECT user_id, {', '.join(BALANCE_COLUMNS)} FROM users"
+        )
+    }
+    for row in conn.execute(f"WITH {LEDGER_BALANCES} SELECT * FROM ledger_balances"):
+        values: Optional[tuple[int, ...]] = stored.pop(row[0], None)
+        if values is None:
+            continue
+        for column, value, expected in zip(BALANCE_COLUMNS, values, row[1:]):
+            if value != expected:
+                mismatches.append((row[0], column, value, expected))
+    # Users without a single ledger row should have nothing
+    for user_id, values in stored.items():
+        for column, value in zip(BALANCE_COLUMNS, values):
+            if value:
+                mismatches.append((user_id, column, value, 0))
+    return mismatches[:limit]
+
+
+def rebuild_from_ledger(conn: sqlite3.Connection) -> int:
+    """
+    - Overwrites every user's balances and lifetime stats with the ledger's.
+    - Returns the number of users whose rows were rewritten.
+    """
+    # rowcount isn't set for statements starting with WITH
+    changes: int = conn.total_changes
+    with conn:
+        conn.execute(
+            f"""
+            WITH {LEDGER_BALANCES}
+            UPDATE users SET ({', '.join(BALANCE_COLUMNS)}) = (
+                SELECT money, temp_money, losses, wins, profit
+                FROM ledger_balances WHERE ledger_balances.user_id = users.user_id
+            )
+            WHERE user_id IN (SELECT user_id FROM ledger)
+            """
+        )
+    return conn.total_changes - changes
+
+
+def main() -> None:
+    parser: argparse.ArgumentParser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("--rebuild", action="store_true")
+    args: argparse.Namespace = parser.parse_args()
+
+    storage.run_sync(migrate)
+    mismatches: list[tuple[int, str, int, int]] = storage.run_sync(audit_ledger)
+    print(f"{len(mismatches)} balances don't match the ledger")
+    for user_id, column, value, expected in mismatches[:20]:
+        print(f"{user_id:>20} {column:<16} {value:>10} ledger {expected:>10}")
+    if args.rebuild and mismatches:
+        print(f"Rebuilt {storage.run_sync(rebuild_from_ledger)} users from the ledger")
+    storage.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,60 @@
+import os
+from typing import Optional
+
+
+class ShardConfig:
+    """
+    - Which shards this process runs, from SHARD_COUNT and SHARD_IDS
+      ("0,1"). Without them a single process runs every shard.
+    - A process owns the tables of the guilds on its shards: it keeps them in
+      its registry and is the only one that expires them.
+    """
+
+    def __init__(self, count: Optional[int], ids: Optional[list[int]]) -> None:
+        if ids is not None and (count is None or any(i >= count for i in ids)):
+            raise ValueError(f"Shard ids {ids} don't fit in a shard count of {count}")
+        self.count: Optional[int] = count
+        self.ids: Optional[list[int]] = ids
+
+    @classmethod
+    def from_env(cls) -> "ShardConfig":
+        count: Optional[str] = os.getenv("SHARD_COUNT")
+        ids: Optional[str] = os.getenv("SHARD_IDS")
+        return cls(
+            int(count) if count else None,
+            [int(i) for i in ids.split(",")] if ids else None,
+        )
+
+    @property
+    def sharded(self) -> bool:
+        """True if other processes run the other shards"""
+        return self.ids is not None
+
+    @property
+    def is_primary(self) -> bool:
+        """The process with shard 0 does the work only one process should do"""
+        return self.ids is None or 0 in self.ids
+
+    @property
+    def name(self) -> str:
+        """Tells processes apart in file names, "0-1" for shards 0 and 1"""
+        return "all" if self.ids is None else "-".join(map(str, self.ids))
+
+    def shard_of(self, guild_id: int) -> int:
+        # Discord's formula, tables outside a guild (0) land on shard 0
+        return (guild_id >> 22) % (self.count or 1)
+
+    def owns(self, guild_id: int) -> bool:
+        return self.ids is None or self.shard_of(guild_id) in self.ids
+
+    def where(self, column: str = "guild_id") -> tuple[str, list[int]]:
+        """A SQL condition and its parameters matching the rows this process owns"""
+        if self.ids is None:
+            return "1", []
+        return (
+            f"(({column} >> 22) % ?) IN ({', '.join('?' * len(self.ids))})",
+            [self.count or 1, *self.ids],
+        )
+
+
+shard_config: ShardConfig = ShardConfig.from_env()
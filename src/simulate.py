@@ -0,0 +1,326 @@
+"""
+Headless self-play on the same engine as the slash commands.
+
+- Plays hands between scripted players with game.Game, settles every hand
+  with settlement.settle and plays bots with strategy.py, exactly as
+  poker.py and bots.py do, just without Discord or the database.
+- Hands are split into chunks played by a process pool, one table per
+  chunk, so it scales with the cores.
+- Every hand is checked: chips are conserved, the pots add up to what was
+  committed and the settlement balances. Every --verify-every hands is also
+  replayed from its hand history record.
+
+    python src/simulate.py --hands 1000000
+    python src/simulate.py --players bot,bot,calling,random --verify-every 100
+"""
+
+import argparse
+import multiprocessing
+import os
+import random
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Callable, Optional
+
+from game import (ACTIVE, ALL_IN, ALL_IN_ACTION, CALL, CHECK, FOLD, PREFLOP,
+                  RAISE, Game)
+from history import verify
+from settlement import settle
+from strategy import (apply, choose, decide_postflop, hand_class,
+                      load_preflop_table, opponents, situation)
+
+# Who can sit at the simulated table
+POLICIES: tuple[str, ...] = ("bot", "calling", "random", "tight")
+# Phases of a hand timed in the profile
+PHASES: tuple[str, ...] = ("deal", "decide", "act", "settle", "verify")
+
+Policy = Callable[[Game, int], tuple[int, int]]
+
+
+class Players:
+    """The decisions of every policy, for one worker process"""
+
+    def __init__(self, rng: random.Random, bot_samples: int) -> None:
+        self.rng: random.Random = rng
+        self.bot_samples: int = bot_samples
+        self.preflop: list[list[float]] = load_preflop_table()
+
+    def policy(self, name: str) -> Policy:
+        policies: dict[str, Policy] = {
+            "bot": self.bot,
+            "calling": self.calling,
+            "random": self.any_action,
+            "tight": self.tight,
+        }
+        return policies[name]
+
+    def preflop_equity(self, game: Game, seat: int, others: int) -> float:
+        hole: bytes = game.hole_cards(seat)
+        return self.preflop[hand_class(hole[0], hole[1])][min(others, 8) - 1]
+
+    def bot(self, game: Game, seat: int) -> tuple[int, int]:
+        """What bots.py does, simulating postflop only with --bot-samples"""
+        others: int = opponents(game, seat)
+        if game.street != PREFLOP and self.bot_samples:
+            return decide_postflop(
+                game.hole_cards(seat),
+                game.board_cards(),
+                others,
+                *situation(game, seat),
+                self.bot_samples,
+            )
+        return choose(
+            self.preflop_equity(game, seat, others), others, *situation(game, seat)
+        )
+
+    def calling(self, game: Game, seat: int) -> tuple[int, int]:
+        return (CALL, 0) if game.to_call(seat) else (CHECK, 0)
+
+    def any_action(self, game: Game, seat: int) -> tuple[int, int]:
+        """Any legal action, raises of a random size"""
+        to_call: int = game.to_call(seat)
+        actions: list[int] = [CALL, FOLD] if to_call else [CHECK]
+        if game.stacks[seat] > to_call + game.min_raise:
+            actions.append(RAISE)
+        actions.append(ALL_IN_ACTION)
+        action: int = self.rng.choice(actions)
+        if action != RAISE:
+            return action, 0
+        most: int = game.stacks[seat] - to_call - 1
+        if game.max_raise:
+            most = min(most, game.max_raise)
+        return RAISE, self.rng.randint(game.min_raise, max(game.min_raise, most))
+
+    def tight(self, game: Game, seat: int) -> tuple[int, int]:
+        """Only plays the best hands, and then never folds"""
+        others: int = opponents(game, seat)
+        if self.preflop_equity(game, seat, others) * (others + 1) < 1.5:
+            return (FOLD, 0) if game.to_call(seat) else (CHECK, 0)
+        return self.calling(game, seat)
+
+
+def play_chunk(
+    chunk: int,
+    hands: int,
+    players: list[str],
+    stack: int,
+    big_blind: int,
+    verify_every: int,
+    bot_samples: int,
+) -> dict[str, list[int]]:
+    """
+    - Play `hands` hands at one table, in a worker process. Busted players
+      buy in again for `stack`.
+    - Returns the counters of the chunk, each a list so they add up per
+      item: hands, actions, showdowns, checks failed, replays failed, chips
+      won per seat, time per phase in nanoseconds.
+    """
+    rng: random.Random = random.Random(chunk)
+    decisions: Players = Players(rng, bot_samples)
+    policies: list[Policy] = [decisions.policy(name) for name in players]
+    game: Game = Game(chunk, big_blind, 0)
+    # User ids start at 1, 0 marks an empty seat
+    game.seat_players([(seat + 1, stack) for seat in range(len(players))])
+    deck: bytearray = bytearray(range(52))
+
+    counts: dict[str, list[int]] = {
+        "hands": [0],
+        "actions": [0],
+        "showdowns": [0],
+        "broken": [0],
+        "replays_failed": [0],
+        "net": [0] * len(players),
+        "phases": [0] * len(PHASES),
+    }
+    phases: list[int] = counts["phases"]
+    clock: Callable[[], int] = time.perf_counter_ns
+
+    for hand in range(hands):
+        for seat in range(len(players)):
+            if game.stacks[seat] == 0:
+                counts["net"][seat] -= stack
+                game.stacks[seat] = stack
+        before: int = sum(game.stacks)
+
+        started: int = clock()
+        rng.shuffle(deck)
+        game.start_hand(bytes(deck))
+        phases[0] += clock() - started
+
+        while game.in_hand:
+            seat = game.to_act
+            started = clock()
+            action, amount = policies[seat](game, seat)
+            decided: int = clock()
+            apply(game, seat, action, amount)
+            phases[1] += decided - started
+            phases[2] += clock() - decided
+            counts["actions"][0] += 1
+
+        started = clock()
+        try:
+            settle(game, False)
+            broken: bool = sum(game.stacks) != before or sum(game.winnings) != sum(
+                game.committed
+            )
+        except ValueError:
+            broken = True
+        counts["broken"][0] += broken
+        counts["showdowns"][0] += (
+            sum(1 for status in game.status if status in (ACTIVE, ALL_IN)) > 1
+        )
+        phases[3] += clock() - started
+
+        if verify_every and hand % verify_every == 0:
+            started = clock()
+            counts["replays_failed"][0] += not verify(game.hand_record())
+            phases[4] += clock() - started
+        counts["hands"][0] += 1
+
+    for seat in range(len(players)):
+        counts["net"][seat] += game.stacks[seat] - stack
+    return counts
+
+
+def simulate(
+    hands: int,
+    players: list[str],
+    processes: int,
+    chunk_size: int,
+    stack: int,
+    big_blind: int,
+    verify_every: int,
+    bot_samples: int,
+) -> tuple[dict[str, list[int]], float]:
+    """
+    - Split `hands` into chunks and play them in `processes` processes.
+    - Returns the summed counters and the wall time.
+    """
+    chunks: list[int] = [
+        min(chunk_size, hands - start) for start in range(0, hands, chunk_size)
+    ]
+    totals: dict[str, list[int]] = {}
+    start_time: float = time.perf_counter()
+    with ProcessPoolExecutor(
+        max_workers=processes, mp_context=multiprocessing.get_context("fork")
+    ) as executor:
+        futures = [
+            executor.submit(
+                play_chunk,
+                chunk,
+                size,
+                players,
+                stack,
+                big_blind,
+                verify_every,
+                bot_samples,
+            )
+            for chunk, size in enumerate(chunks)
+        ]
+        for future in futures:
+            for name, values in future.result().items():
+                total: Optional[list[int]] = totals.get(name)
+                if total is None:
+                    totals[name] = list(values)
+                else:
+                    for index, value in enumerate(values):
+                        total[index] += value
+    return totals, time.perf_counter() - start_time
+
+
+def report(
+    totals: dict[str, list[int]],
+    elapsed: float,
+    players: list[str],
+    processes: int,
+    big_blind: int,
+) -> bool:
+    """Print the results, returns whether every check passed"""
+    hands: int = totals["hands"][0]
+    print(
+        f"{hands} hands in {elapsed:.1f} seconds on {processes} processes: "
+        f"{hands / elapsed:,.0f} hands/s"
+    )
+    print(
+        f"{totals['actions'][0] / hands:.2f} actions per hand, "
+        f"{totals['showdowns'][0] / hands * 100:.1f}% went to showdown"
+    )
+
+    print(f"\n{'seat':<6}{'player':<10}{'bb/100':>10}")
+    for seat, (name, net) in enumerate(zip(players, totals["net"])):
+        print(f"{seat:<6}{name:<10}{net / big_blind / hands * 100:>10.1f}")
+
+    # The time of every phase, summed over all processes
+    phases: list[int] = totals["phases"]
+    print(f"\n{'phase':<10}{'µs/hand':>10}{'share':>8}")
+    for name, spent in zip(PHASES, phases):
+        print(
+            f"{name:<10}{spent / hands / 1000:>10.2f}"
+            f"{spent / max(sum(phases), 1) * 100:>7.1f}%"
+        )
+
+    conserved: bool = sum(totals["net"]) == 0
+    print(
+        f"\nchips conserved: {'yes' if conserved else 'NO'}, "
+        f"hands that didn't balance: {totals['broken'][0]}, "
+        f"replays that failed: {totals['replays_failed'][0]}"
+    )
+    return conserved and not totals["broken"][0] and not totals["replays_failed"][0]
+
+
+def main() -> None:
+    parser: argparse.ArgumentParser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("--hands", type=int, default=100_000)
+    parser.add_argument(
+        "--players",
+        default="bot,bot,bot,calling,random,tight",
+        help=f"Comma separated, 2 to 9 of {', '.join(POLICIES)}",
+    )
+    parser.add_argument("--processes", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--chunk-size", type=int, default=10_000)
+    parser.add_argument("--stack", type=int, default=1000)
+    parser.add_argument("--big-blind", type=int, default=10)
+    parser.add_argument(
+        "--verify-every", type=int, default=0, help="Replay every Nth hand"
+    )
+    parser.add_argument(
+        "--bot-samples",
+        type=int,
+        default=0,
+        help="Simulate bots' postflop equity like bots.py, slow. "
+        "0 plays their preflop equity, their fallback",
+    )
+    args: argparse.Namespace = parser.parse_args()
+
+    if args.hands < 1:
+        parser.error("--hands takes at least 1")
+    if args.chunk_size < 1:
+        parser.error("--chunk-size takes at least 1")
+    if args.processes < 1:
+        parser.error("--processes takes at least 1")
+    if args.stack < 1:
+        parser.error("--stack takes at least 1")
+    if args.big_blind < 1:
+        parser.error("--big-blind takes at least 1")
+    players: list[str] = args.players.split(",")
+    if not 2 <= len(players) <= 9 or any(name not in POLICIES for name in players):
+        parser.error(f"--players takes 2 to 9 of {', '.join(POLICIES)}")
+
+    totals, elapsed = simulate(
+        args.hands,
+        players,
+        args.processes,
+        args.chunk_size,
+        args.stack,
+        args.big_blind,
+        args.verify_every,
+        args.bot_samples,
+    )
+    if not report(totals, elapsed, players, args.processes, args.big_blind):
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,350 @@
+"""
+Crash recovery for the games at every table.
+
+- Every change to a game is appended to a write-ahead log before anything
+  leaves the process: an image of the whole game (Game.dump) when a hand is
+  dealt, then a small record per action, then a marker once the hand is
+  settled in the database.
+- Every SNAPSHOT_SECONDS the images of the tables that changed since are
+  brought up to date, and a writer thread writes all of them to the
+  snapshot file and deletes the log segments it covers.
+- At startup the snapshot is loaded and the log replayed on top of it, so
+  every hand carries on from its last action. Replaying is idempotent: a
+  record only applies to the game state it follows.
+
+    python src/snapshots.py     # Restore from the files and list the tables
+"""
+
+import argparse
+import asyncio
+import glob
+import os
+import struct
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Iterator, Optional
+
+from discord.ext import tasks
+
+from constants import SNAPSHOT_DIRECTORY, SNAPSHOT_SECONDS
+from game import ACTION_NAMES, Game, IllegalAction
+from history import MOVES
+from shards import shard_config
+
+# Records, in the log and in the snapshot: kind, table id, payload size
+_RECORD: struct.Struct = struct.Struct("<BqI")
+IMAGE, ACTION, SETTLED = range(3)
+# Payload of an ACTION: hand number, index in Game.actions, seat, action, amount
+_ACTION: struct.Struct = struct.Struct("<qHBBq")
+# Payload of a SETTLED: hand number
+_SETTLED: struct.Struct = struct.Struct("<q")
+
+
+def record(kind: int, table_id: int, payload: bytes) -> bytes:
+    return _RECORD.pack(kind, table_id, len(payload)) + payload
+
+
+def read_records(data: bytes) -> Iterator[tuple[int, int, bytes]]:
+    """
+    - Takes the contents of a snapshot or log segment.
+    - Yields (kind, table id, payload) for every record. A record cut short
+      by a crash ends the file.
+    """
+    offset: int = 0
+    while offset + _RECORD.size <= len(data):
+        kind, table_id, size = _RECORD.unpack_from(data, offset)
+        offset += _RECORD.size
+        if offset + size > len(data):
+            return
+        yield kind, table_id, data[offset : offset + size]
+        offset += size
+
+
+class TableSnapshots:
+    def __init__(self, directory: str = SNAPSHOT_DIRECTORY, name: str = "all") -> None:
+        self.directory: str = directory
+        # Tells processes apart when sharded, see ShardConfig.name
+        self.name: str = name
+        self.games: dict[int, Game] = {}
+        # Table id -> (hand number, actions) already in the log
+        self.logged: dict[int, tuple[int, int]] = {}
+        # Table id -> last hand settled in the database
+        self.settled: dict[int, int] = {}
+        # Table id -> its records in the next snapshot
+        self.images: dict[int, bytes] = {}
+        self._dirty: set[int] = set()
+        # Log segments are numbered, a snapshot covers the ones before its own
+        self.segment: int = 0
+        self._log: Optional[int] = None
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._writing: Optional[asyncio.Future[None]] = None
+
+        # Metrics
+        self.records: int = 0
+        self.log_bytes: int = 0
+        self.snapshots: int = 0
+        self.snapshot_bytes: int = 0
+        self.restored: int = 0
+        self.restore_seconds: float = 0.0
+
+    @property
+    def snapshot_path(self) -> str:
+        return os.path.join(self.directory, f"tables-{self.name}.snap")
+
+    def segment_path(self, segment: int) -> str:
+        return os.path.join(self.directory, f"tables-{self.name}-{segment:08d}.wal")
+
+    def segments(self) -> list[tuple[int, str]]:
+        """(number, path) of every log segment on disk, oldest first"""
+        paths: list[str] = glob.glob(
+            os.path.join(self.directory, f"tables-{self.name}-*.wal")
+        )
+        return sorted((int(path[-12:-4]), path) for path in paths)
+
+    # Logging
+    def log(self, table_id: int, game: Game) -> None:
+        """
+        - Append what changed in a game since it was last logged: its image
+          if a new hand was dealt, its new actions otherwise.
+        - A single unbuffered write on the calling thread, so it's in the
+          file before the caller goes on (no fsync, it's for process crashes).
+        """
+        self.games[table_id] = game
+        hand, logged = self.logged.get(table_id, (-1, 0))
+        records: list[bytes]
+        if hand != game.hand_number:
+            records = [record(IMAGE, table_id, game.dump())]
+        else:
+            records = [
+                record(
+                    ACTION,
+                    table_id,
+                    _ACTION.pack(game.hand_number, index, seat, action, amount),
+                )
+                for index, (_, seat, action, amount) in enumerate(
+                    game.actions[logged:], logged
+                )
+            ]
+        self.logged[table_id] = (game.hand_number, len(game.actions))
+        self._append(records)
+        self._dirty.add(table_id)
+
+    def mark_settled(self, table_id: int, hand_number: int) -> None:
+        self.settled[table_id] = hand_number
+        self._append([record(SETTLED, table_id, _SETTLED.pack(hand_number))])
+        self._dirty.add(table_id)
+
+    def is_settled(self, table_id: int, hand_number: int) -> bool:
+        return self.settled.get(table_id, 0) >= hand_number
+
+    def _append(self, records: list[bytes]) -> None:
+        if not records:
+            return
+        if self._log is None:
+            os.makedirs(self.directory, exist_ok=True)
+            self._log = os.open(
+                self.segment_path(self.segment),
+                os.O_WRONLY | os.O_APPEND | os.O_CREAT,
+                0o644,
+            )
+        data: bytes = b"".join(records)
+        os.write(self._log, data)
+        self.records += len(records)
+        self.log_bytes += len(data)
+
+    def forget(self, table_id: int) -> None:
+        """Drop a deleted table, it's left out of the next snapshot"""
+        self.games.pop(table_id, None)
+        self.logged.pop(table_id, None)
+        self.settled.pop(table_id, None)
+        if self.images.pop(table_id, None) is not None:
+            self._dirty.add(table_id)
+
+    # Snapshots
+    async def snapshot(self) -> int:
+        """
+        - Bring the images of the tables that changed up to date, start a new
+          log segment and write the snapshot on the writer thread.
+        - Returns the number of tables that changed.
+        """
+        if not self._dirty or (self._writing is not None and not self._writing.done()):
+            return 0
+
+        dirty: set[int] = self._dirty
+        self._dirty = set()
+        for table_id in dirty:
+            game: Optional[Game] = self.games.get(table_id)
+            if game is None:
+                continue
+            self.images[table_id] = record(IMAGE, table_id, game.dump()) + record(
+                SETTLED, table_id, _SETTLED.pack(self.settled.get(table_id, 0))
+            )
+
+        # Everything logged so far is in the images, later records go to a
+        # new segment
+        if self._log is not None:
+            os.close(self._log)
+            self._log = None
+        self.segment += 1
+        data: bytes = b"".join(self.images.values())
+
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(
+                max_workers=1, thread_name_prefix="snapshots"
+            )
+        self._writing = asyncio.get_running_loop().run_in_executor(
+            self._executor, self._write, data, self.segment
+        )
+        try:
+            await self._writing
+        except Exception:
+            # Write them all again next time, the old segments are still there
+            self._dirty |= dirty
+            raise
+        return len(dirty)
+
+    def _write(self, data: bytes, segment: int) -> None:
+        os.makedirs(self.directory, exist_ok=True)
+        temporary: str = self.snapshot_path + ".tmp"
+        with open(temporary, "wb") as file:
+            file.write(data)
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(temporary, self.snapshot_path)
+        for number, path in self.segments():
+            if number < segment:
+                os.remove(path)
+        self.snapshots += 1
+        self.snapshot_bytes = len(data)
+
+    # Recovery
+    def restore(self, table_ids: set[int]) -> list[Game]:
+        """
+        - Takes the ids of the tables that still exist.
+        - Loads the snapshot and replays the log segments after it.
+        - Returns the restored games, which are logged from here on.
+        """
+        start_time: float = time.perf_counter()
+        games: dict[int, Game] = {}
+        paths: list[str] = [self.snapshot_path] + [path for _, path in self.segments()]
+        for path in paths:
+            if not os.path.exists(path):
+                continue
+            with open(path, "rb") as file:
+                data: bytes = file.read()
+            for kind, table_id, payload in read_records(data):
+                if table_id in table_ids:
+                    self._replay(games, kind, table_id, payload)
+
+        for table_id, game in games.items():
+            game.log = []
+            self.games[table_id] = game
+            self.logged[table_id] = (game.hand_number, len(game.actions))
+            self._dirty.add(table_id)
+        # Carry on after the newest segment
+        self.segment = max((number for number, _ in self.segments()), default=0) + 1
+
+        self.restored = len(games)
+        self.restore_seconds = time.perf_counter() - start_time
+        return list(games.values())
+
+    def _replay(
+        self, games: dict[int, Game], kind: int, table_id: int, payload: bytes
+    ) -> None:
+        game: Optional[Game] = games.get(table_id)
+        if kind == IMAGE:
+            image: Game = Game.load(payload)
+            if game is None or (image.hand_number, len(image.actions)) >= (
+                game.hand_number,
+                len(game.actions),
+            ):
+                games[table_id] = image
+        elif kind == ACTION:
+            hand, index, seat, action, amount = _ACTION.unpack(payload)
+            # Only the action that comes next, anything else is already in
+            if (
+                game is not None
+                and game.in_hand
+                and game.hand_number == hand
+                and len(game.actions) == index
+            ):
+                try:
+                    MOVES[ACTION_NAMES[action]](game, seat, amount)
+                except IllegalAction as e:
+                    print(f"Can't replay an action at table {table_id}: {e}")
+        elif kind == SETTLED:
+            self.settled[table_id] = max(
+                self.settled.get(table_id, 0), _SETTLED.unpack(payload)[0]
+            )
+
+    def close(self) -> None:
+        if self._log is not None:
+            os.close(self._log)
+            self._log = None
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+
+    def stats(self) -> dict[str, float]:
+        return {
+            "tables": len(self.games),
+            "records": self.records,
+            "log_bytes": self.log_bytes,
+            "snapshots": self.snapshots,
+            "snapshot_bytes": self.snapshot_bytes,
+            "restored": self.restored,
+            "restore_ms": self.restore_seconds * 1000,
+        }
+
+
+table_snapshots: TableSnapshots = TableSnapshots(name=shard_config.name)
+
+
+def setup_snapshot_writer() -> None:
+    @tasks.loop(seconds=SNAPSHOT_SECONDS)
+    async def snapshot_tables() -> None:
+        """Write the tables that changed to the snapshot"""
+        try:
+            await table_snapshots.snapshot()
+        except Exception as e:
+            print(f"Error writing table snapshot: {e}")
+
+    snapshot_tables.start()
+
+
+def main() -> None:
+    parser: argparse.ArgumentParser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("--directory", default=SNAPSHOT_DIRECTORY)
+    parser.add_argument("--name", default="all", help="ShardConfig.name")
+    args: argparse.Namespace = parser.parse_args()
+
+    snapshots: TableSnapshots = TableSnapshots(args.directory, args.name)
+    # Every table in the files, whether or not it still exists
+    table_ids: set[int] = set()
+    for path in [snapshots.snapshot_path] + [p for _, p in snapshots.segments()]:
+        if os.path.exists(path):
+            with open(path, "rb") as file:
+                table_ids |= {table_id for _, table_id, _ in read_records(file.read())}
+
+    games: list[Game] = snapshots.restore(table_ids)
+    for game in sorted(games, key=lambda game: game.table_id):
+        settled: str = (
+            "settled"
+            if snapshots.is_settled(game.table_id, game.hand_number)
+            else "not settled"
+        )
+        print(
+            f"{game.table_id}: hand #{game.hand_number}, "
+            + (
+                f"in progress, {len(game.actions)} actions, pot {game.total_pot()}"
+                if game.in_hand
+                else settled
+            )
+        )
+    print(f"Restored {len(games)} tables in {snapshots.restore_seconds * 1000:.1f}ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,168 @@
+"""
+One status message per table thread, edited in place.
+
+- Whatever happens at a table (it's created, players join, hands are
+  played) is shown by editing the table's pinned status message, instead
+  of posting a message per event and running into Discord's per-channel
+  rate limits on busy tables.
+- A table's message is edited at most once every STATUS_EDIT_SECONDS.
+  Updates in between are coalesced into the next edit, and an edit that
+  wouldn't change the text is skipped.
+"""
+
+import asyncio
+from collections import deque
+from typing import Optional
+
+import discord
+
+from constants import (STATUS_EDIT_SECONDS, STATUS_LOG_LINES,
+                       TABLE_EXPIRY_MINUTES)
+from game import Game, mention
+from registry import TableInfo
+
+
+def status_text(
+    table: TableInfo,
+    players: list[tuple[int, int]],
+    game: Optional[Game],
+    log: list[str],
+) -> str:
+    """
+    - Takes a table, (user id, chips) for its players, its game if a hand
+      was dealt and the latest lines of the game log.
+    - Returns the text of its status message.
+    """
+    lines: list[str] = [
+        f"🎰 **Table {table.table_name}**",
+        f"💸 Temp money: {table.temp_money}, 💰 Min bet: {table.min_bet}, "
+        f"💎 Max bet: {table.max_bet}",
+        f"👤 Created by: {mention(table.table_owner_id)}",
+        f"⏰ **Auto-delete:** This table will be automatically deleted after "
+        f"{TABLE_EXPIRY_MINUTES} minutes of inactivity",
+        "",
+        f"**Players ({len(players)}):** "
+        + (
+            ", ".join(f"{mention(user_id)} ({chips})" for user_id, chips in players)
+            or "nobody yet"
+        ),
+    ]
+    if log:
+        lines += [""] + log
+    lines.append(
+        game.status_line()
+        if game is not None
+        else "Use `/start` to deal the first hand."
+    )
+    return "\n".join(lines)
+
+
+class TableStatus:
+    __slots__ = ("thread", "message", "content", "rendered", "pending", "task", "log")
+
+    def __init__(self) -> None:
+        self.thread: Optional[discord.Thread] = None
+        self.message: Optional[discord.Message] = None
+        self.content: str = ""  # What the message should say
+        self.rendered: str = ""  # What it says
+        self.pending: int = 0  # Updates since the last render
+        self.task: Optional[asyncio.Task[None]] = None
+        self.log: deque[str] = deque(maxlen=STATUS_LOG_LINES)
+
+
+class StatusMessages:
+    """
+    - The status message of every table, keyed by table id.
+    - `edits`/`sends` count calls to Discord, `coalesced` the updates
+      folded into a later edit and `unchanged` the edits skipped because
+      the text was the same. Together they're the edits saved.
+    """
+
+    def __init__(self, interval: float = STATUS_EDIT_SECONDS) -> None:
+        self.interval: float = interval
+        self.tables: dict[int, TableStatus] = {}
+        self.updates: int = 0
+        self.sends: int = 0
+        self.edits: int = 0
+        self.coalesced: int = 0
+        self.unchanged: int = 0
+        self.failed: int = 0
+
+    def get(self, table_id: int) -> TableStatus:
+        status: Optional[TableStatus] = self.tables.get(table_id)
+        if status is None:
+            status = self.tables[table_id] = TableStatus()
+        return status
+
+    def update(self, thread: discord.Thread, content: str) -> None:
+        """
+        - Set what the table's status message should say.
+        - Returns right away, the message is sent or edited in the background.
+        """
+        self.updates += 1
+        status: TableStatus = self.get(thread.id)
+        status.thread = thread
+        status.content = content
+        status.pending += 1
+        if status.task is None:
+            status.task = asyncio.create_task(self._render(status))
+
+    async def _render(self, status: TableStatus) -> None:
+        """Write the latest content, then wait out the interval before the next"""
+        try:
+            while status.pending:
+                self.coalesced += status.pending - 1
+                status.pending = 0
+                if status.content == status.rendered:
+                    self.unchanged += 1
+                    continue
+                await self._write(status, status.content)
+                await asyncio.sleep(self.interval)
+        finally:
+            status.task = None
+
+    async def _write(self, status: TableStatus, content: str) -> None:
+        if status.thread is None:
+            return
+        try:
+            if status.message is not None:
+                try:
+                    await status.message.edit(content=content)
+                    self.edits += 1
+                    status.rendered = content
+                    return
+                except discord.NotFound:
+                    status.message = None  # Deleted by someone, post a new one
+
+            status.message = await status.thread.send(
+                content, allowed_mentions=discord.AllowedMentions.none()
+            )
+            self.sends += 1
+            status.rendered = content
+            try:
+                await status.message.pin()
+            except discord.HTTPException:
+                pass  # Can't pin, but the message is there
+        except discord.HTTPException as e:
+            self.failed += 1
+            print(f"Error updating the status of table {status.thread.id}: {e}")
+
+    def forget(self, table_id: int) -> None:
+        """Drop a table that no longer exists, with any edit still waiting"""
+        status: Optional[TableStatus] = self.tables.pop(table_id, None)
+        if status is not None and status.task is not None:
+            status.task.cancel()
+
+    def stats(self) -> dict[str, int]:
+        return {
+            "tables": len(self.tables),
+            "updates": self.updates,
+            "sends": self.sends,
+            "edits": self.edits,
+            "coalesced": self.coalesced,
+            "unchanged": self.unchanged,
+            "failed": self.failed,
+        }
+
+
+status_messages: StatusMessages = StatusMessages()
@@ -0,0 +1,99 @@
+import asyncio
+import functools
+import sqlite3
+from concurrent.futures import ThreadPoolExecutor
+from typing import (Any, Awaitable, Callable, Concatenate, Optional, ParamSpec,
+                    TypeVar)
+
+from constants import DATABASE_PATH
+from metrics import metrics
+
+P = ParamSpec("P")
+T = TypeVar("T")
+
+
+class Storage:
+    """
+    - Owns a single long-lived SQLite connection.
+    - Every query runs on one dedicated worker thread, so the event loop never
+      blocks on disk I/O and the connection is never shared between threads.
+    """
+
+    def __init__(self, path: str = DATABASE_PATH) -> None:
+        self.path: str = path
+        self._conn: Optional[sqlite3.Connection] = None
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self.queries: int = 0  # Round trips to the storage thread
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            # Writes take the lock when their transaction starts, so several
+            # processes sharing the database wait on busy_timeout instead of
+            # failing to upgrade a read lock
+            conn: sqlite3.Connection = sqlite3.connect(
+                self.path,
+                check_same_thread=False,
+                cached_statements=256,
+                isolation_level="IMMEDIATE",
+            )
+            conn.execute("PRAGMA journal_mode = WAL")
+            conn.execute("PRAGMA synchronous = NORMAL")
+            conn.execute("PRAGMA busy_timeout = 5000")
+            self._conn = conn
+        return self._conn
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(
+                max_workers=1, thread_name_prefix="storage"
+            )
+        return self._executor
+
+    def _call(self, func: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+        self.queries += 1
+        return func(self._connect(), *args, **kwargs)
+
+    async def run(self, func: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+        """Run `func(conn, *args, **kwargs)` on the storage thread and await it"""
+        loop: asyncio.AbstractEventLoop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            self._get_executor(),
+            functools.partial(self._call, func, *args, **kwargs),
+        )
+
+    def run_sync(self, func: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+        """Run `func(conn, *args, **kwargs)` on the storage thread and block on it"""
+        return self._get_executor().submit(self._call, func, *args, **kwargs).result()
+
+    def close(self) -> None:
+        """Close the connection and stop the storage thread"""
+        if self._executor is None:
+            return
+
+        def _close(_: Any) -> None:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+        self._executor.submit(_close, None).result()
+        self._executor.shutdown(wait=True)
+        self._executor = None
+
+
+storage: Storage = Storage()
+
+
+def query(
+    func: Callable[Concatenate[sqlite3.Connection, P], T],
+) -> Callable[P, Awaitable[T]]:
+    """
+    - Takes a function whose first argument is the connection.
+    - Returns an awaitable version of it that runs on the storage thread and
+      is timed from the caller's side, waiting for the thread included.
+    """
+
+    @functools.wraps(func)
+    async def wrapper(*args: P.args, **kwargs: P.kwargs) -> T:
+        return await storage.run(func, *args, **kwargs)
+
+    return metrics.timed("db")(wrapper)
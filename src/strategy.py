@@ -0,0 +1,197 @@
+"""
+How bot players decide what to do (see bots.py for seating and driving them).
+
+- Preflop, a hand is one of 169 classes (pairs, suited and offsuit
+  combinations), and its equity against 1 to 8 random hands is read from a
+  table built offline into preflop.json and loaded once at startup.
+- Postflop, equity is simulated against the board. That takes milliseconds
+  of numpy work, so it runs in a process pool.
+- Either way the action follows from the equity: bet strong hands, call when
+  the pot odds are good enough, otherwise check or fold.
+
+    python src/strategy.py    # Rebuild preflop.json
+"""
+
+import argparse
+import json
+import os
+import time
+
+from equity import equity
+from evaluator import RANKS
+from game import (ACTIVE, ALL_IN, ALL_IN_ACTION, CALL, CHECK, FOLD, MAX_SEATS,
+                  RAISE, Game, IllegalAction)
+
+PREFLOP_TABLE_PATH: str = os.path.join(os.path.dirname(__file__), "preflop.json")
+# Bet when equity is this many times a fair share of the pot
+RAISE_EDGE: float = 1.3
+
+
+def hand_class(first: int, second: int) -> int:
+    """
+    - Takes two hole cards.
+    - Returns their class: 13 * high + low rank for suited hands and pairs,
+      13 * low + high rank for offsuit hands. Ranks count from the deuce.
+    """
+    high, low = max(first >> 2, second >> 2), min(first >> 2, second >> 2)
+    if (first & 3) == (second & 3) or high == low:
+        return 13 * high + low
+    return 13 * low + high
+
+
+def class_name(index: int) -> str:
+    row, column = divmod(index, 13)
+    if row == column:
+        return RANKS[row] * 2
+    if row > column:
+        return f"{RANKS[row]}{RANKS[column]}s"
+    return f"{RANKS[column]}{RANKS[row]}o"
+
+
+def class_cards(index: int) -> list[int]:
+    """Two cards that make up a class, to simulate it with"""
+    row, column = divmod(index, 13)
+    if row == column:
+        return [4 * row, 4 * row + 1]
+    if row > column:
+        return [4 * row, 4 * column]
+    return [4 * column, 4 * row + 1]
+
+
+def build_preflop_table(samples: int, seed: int = 0) -> list[list[float]]:
+    """Equity of every class against 1 to MAX_SEATS - 1 random hands"""
+    return [
+        [
+            round(equity(class_cards(index), [], opponents, samples, seed).equity, 4)
+            for opponents in range(1, MAX_SEATS)
+        ]
+        for index in range(169)
+    ]
+
+
+def load_preflop_table(path: str = PREFLOP_TABLE_PATH) -> list[list[float]]:
+    with open(path) as file:
+        table: list[list[float]] = json.load(file)["equity"]
+    if len(table) != 169 or any(len(row) != MAX_SEATS - 1 for row in table):
+        raise ValueError(f"{path} doesn't have an equity for every hand class")
+    return table
+
+
+def opponents(game: Game, seat: int) -> int:
+    """How many other players can still win the pot"""
+    return sum(
+        1
+        for other in range(MAX_SEATS)
+        if other != seat and game.status[other] in (ACTIVE, ALL_IN)
+    )
+
+
+def situation(game: Game, seat: int) -> tuple[int, int, int, int, int]:
+    """The betting situation of a seat, as choose() takes it after the opponents"""
+    return (
+        game.total_pot(),
+        game.to_call(seat),
+        game.stacks[seat],
+        game.min_raise,
+        game.max_raise,
+    )
+
+
+def choose(
+    hand_equity: float,
+    opponents: int,
+    pot: int,
+    to_call: int,
+    stack: int,
+    min_raise: int,
+    max_raise: int,
+) -> tuple[int, int]:
+    """
+    - Takes the bot's equity and the betting situation.
+    - Returns the action (from game.py) and the amount to raise by.
+    """
+    can_raise: bool = stack > to_call + min_raise and (
+        not max_raise or max_raise >= min_raise
+    )
+    if hand_equity * (opponents + 1) >= RAISE_EDGE and can_raise:
+        amount: int = max(min_raise, pot // 2)
+        if max_raise:
+            amount = min(amount, max_raise)
+        if to_call + amount >= stack:
+            return ALL_IN_ACTION, 0
+        return RAISE, amount
+    if to_call == 0:
+        return CHECK, 0
+    if hand_equity >= to_call / (pot + to_call):
+        return CALL, 0
+    return FOLD, 0
+
+
+def apply(game: Game, seat: int, action: int, amount: int) -> None:
+    """
+    - Take a chosen action through the game engine.
+    - An action the engine refuses becomes a check or fold, so a bot can
+      never stall a table.
+    """
+    try:
+        if action == RAISE:
+            game.raise_by(seat, amount)
+        elif action == ALL_IN_ACTION:
+            game.all_in(seat)
+        elif action == CALL:
+            game.call(seat)
+        elif action == CHECK:
+            game.check(seat)
+        else:
+            game.fold(seat)
+    except IllegalAction:
+        if game.to_call(seat):
+            game.fold(seat)
+        else:
+            game.check(seat)
+
+
+def decide_postflop(
+    hole: bytes,
+    board: bytes,
+    opponents: int,
+    pot: int,
+    to_call: int,
+    stack: int,
+    min_raise: int,
+    max_raise: int,
+    samples: int,
+) -> tuple[int, int]:
+    """Simulate the bot's equity against the board, then choose. Runs in a worker process"""
+    result_equity: float = equity(list(hole), list(board), opponents, samples).equity
+    return choose(result_equity, opponents, pot, to_call, stack, min_raise, max_raise)
+
+
+def main() -> None:
+    parser: argparse.ArgumentParser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("--samples", type=int, default=50_000)
+    parser.add_argument("--output", default=PREFLOP_TABLE_PATH)
+    args: argparse.Namespace = parser.parse_args()
+
+    start_time: float = time.perf_counter()
+    table: list[list[float]] = build_preflop_table(args.samples)
+    with open(args.output, "w") as file:
+        json.dump(
+            {
+                "samples": args.samples,
+                "classes": [class_name(index) for index in range(169)],
+                "equity": table,
+            },
+            file,
+            separators=(",", ":"),
+        )
+    print(
+        f"Wrote {args.output} in {time.perf_counter() - start_time:.1f} seconds, "
+        f"AA heads up {table[hand_class(48, 49)][0]:.3f}"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -1,43 +1,93 @@
+import asyncio
+import time
 from typing import Any
 
 import discord
-from discord.ext import commands, tasks
+from discord.ext import commands
 
-from database import (delete_table, get_expired_tables,
-                      remove_all_users_from_table)
+from constants import EXPIRY_CONCURRENCY, TABLE_EXPIRY_MINUTES
+from database import delete_tables, get_table_activity
+from expiry import table_expiry
+from metrics import timed
 
 
-def setup_table_timer(bot: commands.Bot) -> None:
-    @tasks.loop(minutes=5)  # Check every 5 minutes
-    async def check_expired_tables(bot: commands.Bot):
-        """Check for expired tables and delete them"""
-        try:
-            expired_table_ids: list[int] = get_expired_tables(mintues=5)
+async def setup_table_timer(bot: commands.AutoShardedBot) -> None:
+    """
+    - Rebuild the expiry schedule from the database.
+    - Start deleting tables as soon as their deadline passes.
+    """
+    for table_id, last_activity in await get_table_activity():
+        table_expiry.arm(table_id, last_activity)
+
+    async def on_expire(table_ids: list[int]) -> None:
+        await expire_tables(bot, table_ids)
+
+    table_expiry.start(on_expire)
+
+
+@timed("task")
+async def expire_tables(bot: commands.AutoShardedBot, table_ids: list[int]) -> None:
+    """
+    - Delete a batch of expired tables.
+    - Threads are closed concurrently, at most EXPIRY_CONCURRENCY at a time so a
+      backlog doesn't run into the global rate limit (discord.py already waits
+      out per-route buckets).
+    - The database cleanup for the whole batch is a single transaction.
+    """
+    start_time: float = time.perf_counter()
+    semaphore: asyncio.Semaphore = asyncio.Semaphore(EXPIRY_CONCURRENCY)
 
-            for table_id in expired_table_ids:
-                await delete_expired_table(bot, table_id)
+    async def close(table_id: int) -> bool:
+        async with semaphore:
+            return await close_expired_thread(bot, table_id)
 
+    closed: list[bool] = await asyncio.gather(
+        *(close(table_id) for table_id in table_ids)
+    )
+    done: list[int] = [table_id for table_id, ok in zip(table_ids, closed) if ok]
+    failed: list[int] = [table_id for table_id, ok in zip(table_ids, closed) if not ok]
+
+    if done:
+        try:
+            await delete_tables(done)
         except Exception as e:
-            print(f"Error checking expired tables: {e}")
+            print(f"Error deleting expired tables {done}: {e}")
+            failed += done
+            done = []
+
+    # Cleanup failed, try again after another timeout
+    for table_id in failed:
+        table_expiry.arm(table_id)
 
-    check_expired_tables.start(bot)
+    elapsed_time: float = time.perf_counter() - start_time
+    print(
+        f"Expired {len(done)} tables ({len(failed)} failed) in {round(elapsed_time, 2)} seconds"
+    )
 
 
-async def delete_expired_table(bot: commands.Bot, table_id: int) -> None:
-    """Delete an expired table from Discord and database"""
+async def close_expired_thread(bot: commands.AutoShardedBot, table_id: int) -> bool:
+    """
+    - Announce and delete the thread of an expired table.
+    - Returns True if the thread is gone, or the channel isn't a thread, and
+      the table can be removed from the database, False if it should be
+      retried later.
+    """
     try:
-        # Get the channel/thread
+        # Get the channel/thread, threads that aren't cached have to be fetched
         channel: Any = bot.get_channel(table_id)
+        if channel is None:
+            channel = await bot.fetch_channel(table_id)
 
-        if channel is None or not isinstance(channel, discord.Thread):
-            raise ValueError(f"Channel {table_id} is not a thread")
-        else:
-            discord_thread: discord.Thread = channel
+        # Not a table anymore, retrying won't change that, so drop its rows
+        if not isinstance(channel, discord.Thread):
+            print(f"Channel {table_id} is not a thread, dropping the table")
+            return True
+        discord_thread: discord.Thread = channel
 
         # Send a message before deleting
         try:
             await discord_thread.send(
-                "⏰ **Table expired!** This table has been automatically deleted after 5 minutes of inactivity."
+                f"⏰ **Table expired!** This table has been automatically deleted after {TABLE_EXPIRY_MINUTES} minutes of inactivity."
             )
         except discord.Forbidden:
             pass  # Can't send message, but continue with deletion
@@ -52,11 +102,13 @@ async def delete_expired_table(bot: commands.Bot, table_id: int) -> None:
         except Exception as e:
             print(f"Error deleting thread {table_id}: {e}")
 
-        # Clean up database
-        remove_all_users_from_table(table_id)
-        delete_table(table_id)
-
         print(f"Deleted expired table {table_id}")
+        return True
+
+    except discord.NotFound:
+        print(f"Thread {table_id} not found (already deleted)")
+        return True
 
     except Exception as e:
         print(f"Error deleting expired table {table_id}: {e}")
+        return False
@@ -0,0 +1,187 @@
+import time
+from collections import OrderedDict
+from typing import Optional
+
+from constants import USER_CACHE_SIZE, USER_CACHE_TTL_SECONDS
+
+
+class UserData:
+    __slots__ = (
+        "user_id",
+        "money",
+        "temp_money",
+        "lifttime_losses",
+        "lifttime_wins",
+        "lifttime_profit",
+        "joined_table",
+        "joined_table_name",
+    )
+
+    def __init__(
+        self,
+        user_id: int,
+        money: int,
+        temp_money: int,
+        lifttime_losses: int,
+        lifttime_wins: int,
+        lifttime_profit: int,
+        joined_table: int,
+        joined_table_name: str,
+    ):
+        self.user_id = user_id
+        self.money = money
+        self.temp_money = temp_money
+        self.lifttime_losses = lifttime_losses
+        self.lifttime_wins = lifttime_wins
+        self.lifttime_profit = lifttime_profit
+        self.joined_table = joined_table
+        self.joined_table_name = joined_table_name
+
+
+class PlayerStats:
+    """A row of `player_stats`, counted over every hand the player finished"""
+
+    __slots__ = (
+        "user_id",
+        "hands",
+        "vpip_hands",
+        "pfr_hands",
+        "showdowns",
+        "showdowns_won",
+        "biggest_pot",
+        "profit",
+    )
+
+    def __init__(
+        self,
+        user_id: int,
+        hands: int = 0,
+        vpip_hands: int = 0,
+        pfr_hands: int = 0,
+        showdowns: int = 0,
+        showdowns_won: int = 0,
+        biggest_pot: int = 0,
+        profit: int = 0,
+    ):
+        self.user_id = user_id
+        self.hands = hands
+        self.vpip_hands = vpip_hands
+        self.pfr_hands = pfr_hands
+        self.showdowns = showdowns
+        self.showdowns_won = showdowns_won
+        self.biggest_pot = biggest_pot
+        self.profit = profit
+
+    # Rates are 0 until there's a hand to count them over
+    @property
+    def vpip(self) -> float:
+        return self.vpip_hands / self.hands if self.hands else 0.0
+
+    @property
+    def pfr(self) -> float:
+        return self.pfr_hands / self.hands if self.hands else 0.0
+
+    @property
+    def showdown_win_rate(self) -> float:
+        return self.showdowns_won / self.showdowns if self.showdowns else 0.0
+
+    @property
+    def profit_per_100(self) -> float:
+        return self.profit / self.hands * 100 if self.hands else 0.0
+
+
+class UserCache:
+    """
+    - Bounded copy of recently used rows of the `users` table, keyed by user id.
+    - Filled on read by `get_user_data` and written through by every function
+      in database.py that changes a user, so a cached row matches the database.
+    - The least recently used row is evicted past `capacity` rows, and rows
+      older than `ttl` seconds are read again in case something else wrote them.
+    """
+
+    def __init__(
+        self, capacity: int = USER_CACHE_SIZE, ttl: float = USER_CACHE_TTL_SECONDS
+    ) -> None:
+        self.capacity: int = capacity
+        self.ttl: float = ttl
+        # user id -> (row, time it was read)
+        self.users: OrderedDict[int, tuple[UserData, float]] = OrderedDict()
+        self.hits: int = 0
+        self.misses: int = 0
+        self.evictions: int = 0
+
+    def get(self, user_id: int) -> Optional[UserData]:
+        entry: Optional[tuple[UserData, float]] = self.users.get(user_id)
+        if entry is None or time.monotonic() - entry[1] > self.ttl:
+            self.misses += 1
+            return None
+        self.users.move_to_end(user_id)
+        self.hits += 1
+        return entry[0]
+
+    def peek(self, user_id: int) -> Optional[UserData]:
+        """Look up a row to update it, without touching the LRU order or stats"""
+        entry: Optional[tuple[UserData, float]] = self.users.get(user_id)
+        return entry[0] if entry else None
+
+    def put(self, user: UserData) -> None:
+        self.users[user.user_id] = (user, time.monotonic())
+        self.users.move_to_end(user.user_id)
+        while len(self.users) > self.capacity:
+            self.users.popitem(last=False)
+            self.evictions += 1
+
+    def forget(self, user_id: int) -> None:
+        self.users.pop(user_id, None)
+
+    def seat(self, user_id: int, table_id: int, table_name: str) -> None:
+        user: Optional[UserData] = self.peek(user_id)
+        if user is not None:
+            user.joined_table = table_id
+            user.joined_table_name = table_name
+
+    def unseat_table(self, table_id: int) -> None:
+        """Mirror every user of a table being removed from it, temp money too"""
+        for user, _ in self.users.values():
+            if user.joined_table == table_id:
+                user.joined_table = 0
+                user.joined_table_name = ""
+                user.temp_money = 0
+
+    def set_chips(self, user_id: int, chips: int, temp_money: bool) -> None:
+        user: Optional[UserData] = self.peek(user_id)
+        if user is None:
+            return
+        if temp_money:
+            user.temp_money = chips
+        else:
+            user.money = chips
+
+    def set_balances(
+        self,
+        user_id: int,
+        money: int,
+        temp_money: int,
+        lifttime_losses: int,
+        lifttime_wins: int,
+        lifttime_profit: int,
+    ) -> None:
+        user: Optional[UserData] = self.peek(user_id)
+        if user is None:
+            return
+        user.money = money
+        user.temp_money = temp_money
+        user.lifttime_losses = lifttime_losses
+        user.lifttime_wins = lifttime_wins
+        user.lifttime_profit = lifttime_profit
+
+    def stats(self) -> dict[str, int]:
+        return {
+            "users": len(self.users),
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+        }
+
+
+user_cache: UserCache = UserCache()
@@ -0,0 +1,112 @@
+import asyncio
+import functools
+import multiprocessing
+import time
+from concurrent.futures import (Executor, ProcessPoolExecutor,
+                                ThreadPoolExecutor)
+from typing import Callable, Optional, TypeVar
+
+from constants import WORKER_QUEUE_SIZE, WORKER_THREADS
+from metrics import Histogram, metrics
+
+T = TypeVar("T")
+
+
+class PoolBusy(Exception):
+    """The pool already has as much work as it will take"""
+
+
+def _timed_call(
+    queued_at: float, function: Callable[..., T], *args: object
+) -> tuple[float, T]:
+    # monotonic is the same clock in every process
+    return time.monotonic() - queued_at, function(*args)
+
+
+class WorkerPool:
+    """
+    - Bounded pool for the blocking and CPU heavy parts of commands (equity
+      simulations), so they never run on the event loop. Threads by default,
+      or processes for pure Python work that would hold the GIL.
+    - Takes at most `workers` running plus `queue_size` waiting calls. Past
+      that, run() raises PoolBusy right away instead of queueing work that
+      would miss Discord's deadline anyway.
+    - Records how long every call waited for a worker.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        workers: int = WORKER_THREADS,
+        queue_size: int = WORKER_QUEUE_SIZE,
+        processes: bool = False,
+    ) -> None:
+        self.name: str = name
+        self.workers: int = workers
+        self.queue_size: int = queue_size
+        self.processes: bool = processes
+        self._executor: Optional[Executor] = None
+        self.pending: int = 0
+        self.completed: int = 0
+        self.rejected: int = 0
+        self.wait: Histogram = metrics.histogram("pool_wait", name)
+
+    async def run(self, function: Callable[..., T], *args: object) -> T:
+        """
+        - Takes a plain function and its arguments, which have to be picklable
+          for a process pool.
+        - Returns its result once a worker ran it.
+        - Raises PoolBusy if the pool is saturated.
+        """
+        if self.pending >= self.workers + self.queue_size:
+            self.rejected += 1
+            raise PoolBusy(f"The {self.name} pool is busy")
+
+        self.pending += 1
+        try:
+            waited, result = await asyncio.get_running_loop().run_in_executor(
+                self.executor(),
+                functools.partial(_timed_call, time.monotonic(), function, *args),
+            )
+        finally:
+            self.pending -= 1
+        self.wait.observe(waited)
+        self.completed += 1
+        return result
+
+    def start(self) -> None:
+        """
+        - Start the workers now instead of on the first call.
+        - Process pools fork every worker on their first call, which is only
+          safe before any other thread runs, so they're started first thing.
+          The workers then share the parent's imported modules and tables.
+        """
+        self.executor().submit(int)
+
+    def executor(self) -> Executor:
+        if self._executor is None:
+            if self.processes:
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    mp_context=multiprocessing.get_context("fork"),
+                )
+            else:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=self.workers, thread_name_prefix=self.name
+                )
+        return self._executor
+
+    def close(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    def stats(self) -> dict[str, int]:
+        return {
+            "pending": self.pending,
+            "completed": self.completed,
+            "rejected": self.rejected,
+        }
+
+
+worker_pool: WorkerPool = WorkerPool("workers")
@@ -0,0 +1,77 @@
+import sqlite3
+from typing import Iterator
+
+import pytest
+
+from evaluator import parse_cards
+from game import Game
+from migrations import migrate
+
+
+@pytest.fixture
+def conn() -> Iterator[sqlite3.Connection]:
+    """An in-memory database with every migration, opened like storage.py does"""
+    conn: sqlite3.Connection = sqlite3.connect(":memory:", isolation_level="IMMEDIATE")
+    migrate(conn)
+    yield conn
+    conn.close()
+
+
+def rigged_deck(holes: str, board: str) -> bytes:
+    """
+    - Takes the hole cards in the order they're dealt (one card a seat from
+      the left of the button, then the second) and the 5 board cards.
+    - Returns a deck that deals them, with the burns from the rest.
+    """
+    dealt: list[int] = parse_cards(holes)
+    flop_turn_river: list[int] = parse_cards(board)
+    rest: list[int] = [
+        card for card in range(52) if card not in dealt + flop_turn_river
+    ]
+    burns: list[int] = rest[:3]
+    deck: list[int] = (
+        dealt
+        + [burns[0]]
+        + flop_turn_river[:3]
+        + [burns[1], flop_turn_river[3], burns[2]]
+        + flop_turn_river[4:]
+    )
+    return bytes(deck + [card for card in rest if card not in burns])
+
+
+@pytest.fixture
+def split_pot() -> Game:
+    """
+    - Three players, the button (seat 0) calls, the small blind folds and the
+      big blind checks it down. The board is a royal flush, so seats 0 and 2
+      split a pot of 5.
+    """
+    game: Game = Game(1, 2, 0)
+    game.seat_players([(101, 100), (102, 100), (103, 100)])
+    game.start_hand(rigged_deck("2c3c4c2d3d4d", "AsKsQsJsTs"))
+    game.call(0)
+    game.fold(1)
+    game.check(2)
+    while game.in_hand:
+        game.check(game.to_act)
+    return game
+
+
+@pytest.fixture
+def side_pot() -> Game:
+    """
+    - Seat 1 goes all-in for 20 with aces, seats 0 and 2 call and bet 10
+      more each into a side pot on the flop, which seat 2's kings win.
+    """
+    game: Game = Game(1, 2, 0)
+    game.seat_players([(101, 100), (102, 20), (103, 100)])
+    game.start_hand(rigged_deck("AhKh2cAdKd7h", "3s8c9dJsQh"))
+    game.call(0)
+    game.all_in(1)
+    game.call(2)
+    game.call(0)
+    game.raise_by(2, 10)
+    game.call(0)
+    while game.in_hand:
+        game.check(game.to_act)
+    return game
@@ -0,0 +1,55 @@
+import inspect
+import sqlite3
+from typing import Any, Callable
+
+from constants import TEMP_MONEY_STACK
+from database import (_add_table, _add_user, _add_user_to_table,
+                      _delete_tables, _get_table_players,
+                      _remove_user_from_table)
+from settlement import audit_ledger
+
+
+def on_conn(function: Callable[..., Any]) -> Callable[..., Any]:
+    """The function a @query wraps, to call on the test's connection"""
+    return inspect.unwrap(function)
+
+
+def seat_temp_money_table(conn: sqlite3.Connection, table_id: int) -> None:
+    on_conn(_add_table)(conn, table_id, 1, "table", True, 5, 0, 0)
+    for user_id in (1, 2):
+        on_conn(_add_user)(conn, user_id, 1000)
+        on_conn(_add_user_to_table)(conn, user_id, table_id)
+    assert on_conn(_get_table_players)(conn, table_id) == [
+        (1, TEMP_MONEY_STACK),
+        (2, TEMP_MONEY_STACK),
+    ]
+
+
+def test_leaving_takes_temp_money_back(conn: sqlite3.Connection) -> None:
+    seat_temp_money_table(conn, 10)
+    with conn:
+        conn.execute("UPDATE users SET temp_money = temp_money - 5 WHERE user_id = 1")
+        conn.execute(
+            "INSERT INTO ledger (user_id, currency, delta, balance, kind) "
+            "VALUES (1, 'temp_money', -5, ?, 'hand')",
+            (TEMP_MONEY_STACK - 5,),
+        )
+    on_conn(_remove_user_from_table)(conn, 1)
+
+    assert conn.execute(
+        "SELECT user_id, joined_table, temp_money FROM users ORDER BY user_id"
+    ).fetchall() == [(1, 0, 0), (2, 10, TEMP_MONEY_STACK)]
+    assert audit_ledger(conn) == []
+
+
+def test_deleted_tables_take_temp_money_back(conn: sqlite3.Connection) -> None:
+    seat_temp_money_table(conn, 10)
+    on_conn(_delete_tables)(conn, [10])
+
+    assert conn.execute("SELECT joined_table, temp_money FROM users").fetchall() == [
+        (0, 0),
+        (0, 0),
+    ]
+    assert audit_ledger(conn) == []
+    # The next temp money table starts them from a full stack again
+    seat_temp_money_table(conn, 11)
@@ -0,0 +1,84 @@
+import itertools
+import os
+
+import numpy as np
+import numpy.typing as npt
+import pytest
+
+from evaluator import (HAND_CATEGORIES, evaluate, evaluate_batch,
+                       hand_category, parse_cards)
+
+# Known frequencies of every category, High Card first
+FIVE_CARD_COUNTS: list[int] = [
+    1302540,
+    1098240,
+    123552,
+    54912,
+    10200,
+    5108,
+    3744,
+    624,
+    40,
+]
+SEVEN_CARD_COUNTS: list[int] = [
+    23294460,
+    58627800,
+    31433400,
+    6461620,
+    6180020,
+    4047644,
+    3473184,
+    224848,
+    41584,
+]
+
+
+def count_categories(size: int, chunk: int = 2_000_000) -> tuple[list[int], int]:
+    """Evaluate every `size` card hand, returns category counts and classes seen"""
+    category_of: npt.NDArray[np.int8] = np.array(
+        [0] + [hand_category(strength) for strength in range(1, 7463)], dtype=np.int8
+    )
+    counts: npt.NDArray[np.int64] = np.zeros(len(HAND_CATEGORIES), dtype=np.int64)
+    seen: npt.NDArray[np.bool_] = np.zeros(7463, dtype=np.bool_)
+    combos = itertools.combinations(range(52), size)
+    while True:
+        flat: npt.NDArray[np.uint8] = np.fromiter(
+            itertools.chain.from_iterable(itertools.islice(combos, chunk)),
+            dtype=np.uint8,
+        )
+        if not flat.size:
+            break
+        strengths: npt.NDArray[np.int16] = evaluate_batch(flat.reshape(-1, size))
+        counts += np.bincount(category_of[strengths], minlength=len(counts))
+        seen[strengths] = True
+    return counts.tolist(), int(seen.sum())
+
+
+def test_five_card_frequencies() -> None:
+    assert count_categories(5) == (FIVE_CARD_COUNTS, 7462)
+
+
+@pytest.mark.skipif(
+    not os.getenv("SLOW_TESTS"), reason="133M hands, set SLOW_TESTS=1 to run"
+)
+def test_seven_card_frequencies() -> None:
+    assert count_categories(7) == (SEVEN_CARD_COUNTS, 4824)
+
+
+@pytest.mark.parametrize("size", [5, 6, 7])
+def test_evaluate_matches_batch(size: int) -> None:
+    rng: np.random.Generator = np.random.default_rng(size)
+    hands: npt.NDArray[np.int64] = rng.random((20000, 52)).argsort(axis=1)[:, :size]
+    assert evaluate_batch(hands).tolist() == [evaluate(hand) for hand in hands.tolist()]
+
+
+def test_ordering() -> None:
+    royal_flush: int = evaluate(parse_cards("AsKsQsJsTs"))
+    wheel: int = evaluate(parse_cards("As2d3c4h5s"))
+    six_high_straight: int = evaluate(parse_cards("2d3c4h5s6s"))
+    assert royal_flush == 7462
+    assert six_high_straight > wheel
+    # The best 5 of 7 cards, the kickers past them don't count
+    assert evaluate(parse_cards("AhAd2c3d4s9hTc")) == evaluate(
+        parse_cards("AhAd2c3d4s9hTd")
+    )
@@ -0,0 +1,36 @@
+from game import Game, side_pots
+
+
+def test_side_pots_everyone_live() -> None:
+    assert side_pots([100, 50, 100], [True, True, True]) == [
+        (150, [0, 1, 2]),
+        (100, [0, 2]),
+    ]
+
+
+def test_side_pots_folded_money_goes_to_the_pot_it_was_in() -> None:
+    # Seat 2 folded after putting in the most, nobody can win its excess
+    # alone, so it's merged into the pot below
+    assert side_pots([50, 100, 150], [True, True, False]) == [
+        (150, [0, 1]),
+        (150, [1]),
+    ]
+
+
+def test_side_pots_skip_empty_seats() -> None:
+    assert side_pots([0, 30, 0, 30], [False, True, False, True]) == [(60, [1, 3])]
+
+
+def test_odd_chip_goes_left_of_the_button(split_pot: Game) -> None:
+    assert split_pot.button == 0
+    assert list(split_pot.committed[:3]) == [2, 1, 2]
+    # Seat 2 is the first winner left of the button
+    assert list(split_pot.winnings[:3]) == [2, 0, 3]
+    assert sum(split_pot.stacks) == 300
+
+
+def test_all_in_side_pot_paid_to_the_short_stack(side_pot: Game) -> None:
+    assert list(side_pot.committed[:3]) == [30, 20, 30]
+    # The main pot to seat 1's aces, the side pot to seat 2's kings
+    assert list(side_pot.winnings[:3]) == [0, 60, 20]
+    assert sum(side_pot.stacks) == 220
@@ -0,0 +1,51 @@
+import time
+
+from leaderboard import Leaderboard
+
+
+def loaded(rows: list[tuple[int, int]], limit: int) -> Leaderboard:
+    board: Leaderboard = Leaderboard("money")
+    board.load(rows, limit)
+    return board
+
+
+def test_ranks_by_value_then_user_id() -> None:
+    board: Leaderboard = loaded([(3, 500), (1, 300), (2, 300)], 10)
+    assert board.page(0, 3) == [(3, 500), (1, 300), (2, 300)]
+    assert [board.rank(user_id) for user_id in (3, 1, 2)] == [1, 2, 3]
+
+
+def test_update_moves_users() -> None:
+    board: Leaderboard = loaded([(3, 500), (1, 300), (2, 300)], 10)
+    board.update(2, 600)
+    board.update(4, 400)
+    assert board.page(0, 4) == [(2, 600), (3, 500), (4, 400), (1, 300)]
+
+
+def test_users_below_the_floor_stay_off() -> None:
+    # A full page of 2: the board only knows the users down to (1, 300)
+    board: Leaderboard = loaded([(3, 500), (1, 300)], 2)
+    board.update(4, 200)
+    assert board.rank(4) is None
+    board.update(4, 400)
+    assert board.rank(4) == 2
+    # Falling below the floor leaves the board
+    board.update(3, 100)
+    assert board.rank(3) is None
+    assert not board.covers(3)
+
+
+def test_bots_are_never_ranked() -> None:
+    board: Leaderboard = loaded([(1, 300)], 10)
+    board.update(-5, 1000)
+    assert board.rank(-5) is None
+    assert board.page(0, 10) == [(1, 300)]
+
+
+def test_stale_board_answers_nothing() -> None:
+    board: Leaderboard = loaded([(1, 300)], 10)
+    board.max_age = 60
+    assert board.rank(1) == 1
+    board.loaded_at = time.monotonic() - 61
+    assert board.rank(1) is None
+    assert not board.covers(1)
@@ -0,0 +1,69 @@
+import sqlite3
+
+from migrations import MIGRATIONS, columns, migrate, schema_version
+from settlement import audit_ledger
+
+
+def connect() -> sqlite3.Connection:
+    return sqlite3.connect(":memory:", isolation_level="IMMEDIATE")
+
+
+def test_migrate_from_version_0() -> None:
+    conn: sqlite3.Connection = connect()
+    assert schema_version(conn) == 0
+    assert migrate(conn) == [version for version, _, _ in MIGRATIONS]
+    assert schema_version(conn) == MIGRATIONS[-1][0]
+    assert "guild_id" in columns(conn, "tables")
+    # Nothing left to apply
+    assert migrate(conn) == []
+
+
+def test_migrate_in_steps() -> None:
+    conn: sqlite3.Connection = connect()
+    assert migrate(conn, 3) == [1, 2, 3]
+    assert schema_version(conn) == 3
+    assert migrate(conn) == [version for version, _, _ in MIGRATIONS[3:]]
+
+
+def test_migrate_a_database_from_before_schema_version() -> None:
+    # The schema the bot created before migrations existed, with a player
+    conn: sqlite3.Connection = connect()
+    with conn:
+        conn.execute(
+            """
+            CREATE TABLE users (
+                user_id INTEGER NOT NULL PRIMARY KEY,
+                money INTEGER NOT NULL DEFAULT 1000,
+                temp_money INTEGER NOT NULL DEFAULT 0,
+                lifttime_losses INTEGER NOT NULL DEFAULT 0,
+                lifttime_wins INTEGER NOT NULL DEFAULT 0,
+                lifttime_profit INTEGER NOT NULL DEFAULT 0,
+                joined_table INTEGER NOT NULL DEFAULT 0,
+                joined_table_name TEXT NOT NULL DEFAULT ""
+            )"""
+        )
+        conn.execute(
+            """
+            CREATE TABLE tables (
+                table_id INTEGER NOT NULL PRIMARY KEY,
+                table_owner_id INTEGER NOT NULL,
+                temp_money BOOLEAN NOT NULL DEFAULT FALSE,
+                table_name TEXT NOT NULL,
+                min_bet INTEGER NOT NULL DEFAULT 5,
+                max_bet INTEGER NOT NULL DEFAULT 0,
+                last_message_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+            )"""
+        )
+        conn.execute("INSERT INTO users (user_id, money) VALUES (1, 1500)")
+        conn.execute(
+            "INSERT INTO tables (table_id, table_owner_id, table_name, last_message_at) "
+            "VALUES (10, 1, 'table', '2024-01-01 00:00:00')"
+        )
+
+    assert migrate(conn) == [version for version, _, _ in MIGRATIONS]
+    assert conn.execute("SELECT last_activity FROM tables").fetchone() == (1704067200,)
+    # The ledger opens with the balance as it was
+    assert conn.execute("SELECT delta, kind FROM ledger").fetchall() == [
+        (1500, "opening")
+    ]
+    assert audit_ledger(conn) == []
@@ -0,0 +1,101 @@
+import sqlite3
+
+import pytest
+
+from game import Game
+from settlement import (LEDGER_GRANT, Settlement, apply_settlement,
+                        audit_ledger, settle)
+
+
+def open_accounts(conn: sqlite3.Connection, users: list[tuple[int, int]]) -> None:
+    """Takes (user id, money), granted through the ledger like new accounts"""
+    with conn:
+        conn.executemany("INSERT INTO users (user_id, money) VALUES (?, ?)", users)
+        conn.executemany(
+            "INSERT INTO ledger (user_id, currency, delta, balance, kind) "
+            "VALUES (?1, 'money', ?2, ?2, ?3)",
+            [(user_id, money, LEDGER_GRANT) for user_id, money in users],
+        )
+
+
+def test_settle_nets_add_up(split_pot: Game) -> None:
+    settlement: Settlement = settle(split_pot, False)
+    assert [(result.user_id, result.net) for result in settlement.results] == [
+        (101, 0),
+        (102, -1),
+        (103, 1),
+    ]
+    assert settlement.pots == [(5, [101, 103])]
+
+
+def test_settle_side_pots(side_pot: Game) -> None:
+    settlement: Settlement = settle(side_pot, False)
+    assert [(result.user_id, result.net) for result in settlement.results] == [
+        (101, -30),
+        (102, 40),
+        (103, -10),
+    ]
+    assert settlement.pots == [(60, [101, 102, 103]), (20, [101, 103])]
+
+
+def test_settle_refuses_what_doesnt_balance(split_pot: Game) -> None:
+    split_pot.winnings[0] += 1
+    with pytest.raises(ValueError):
+        settle(split_pot, False)
+
+
+def test_settle_refuses_a_running_hand() -> None:
+    game: Game = Game(1, 2, 0)
+    game.seat_players([(101, 100), (102, 100)])
+    game.start_hand()
+    with pytest.raises(ValueError):
+        settle(game, False)
+
+
+def test_apply_settlement_balances(conn: sqlite3.Connection, split_pot: Game) -> None:
+    open_accounts(conn, [(101, 100), (102, 100), (103, 100)])
+    rows: list[tuple[int, int, int, int, int, int]] = apply_settlement(
+        conn, settle(split_pot, False)
+    )
+
+    # user id, money, temp money, losses, wins (hands), profit
+    assert sorted(rows) == [
+        (101, 100, 0, 0, 0, 0),
+        (102, 99, 0, 1, 0, -1),
+        (103, 101, 0, 0, 1, 1),
+    ]
+    assert conn.execute(
+        "SELECT SUM(delta), COUNT(*) FROM ledger WHERE kind = 'hand'"
+    ).fetchone() == (0, 3)
+    assert audit_ledger(conn) == []
+    assert conn.execute(
+        "SELECT user_id, hands, vpip_hands, showdowns, showdowns_won, biggest_pot "
+        "FROM player_stats ORDER BY user_id"
+    ).fetchall() == [
+        (101, 1, 1, 1, 1, 2),
+        (102, 1, 0, 0, 0, 0),
+        (103, 1, 0, 1, 1, 3),
+    ]
+
+
+def test_apply_settlement_temp_money_leaves_lifetime_stats(
+    conn: sqlite3.Connection, split_pot: Game
+) -> None:
+    open_accounts(conn, [(101, 100), (102, 100), (103, 100)])
+    with conn:
+        conn.execute("UPDATE users SET temp_money = 100")
+        conn.execute(
+            "INSERT INTO ledger (user_id, currency, delta, balance, kind) "
+            "SELECT user_id, 'temp_money', 100, 100, ? FROM users",
+            (LEDGER_GRANT,),
+        )
+    rows: list[tuple[int, int, int, int, int, int]] = apply_settlement(
+        conn, settle(split_pot, True)
+    )
+
+    assert sorted(rows) == [
+        (101, 100, 100, 0, 0, 0),
+        (102, 100, 99, 0, 0, 0),
+        (103, 100, 101, 0, 0, 0),
+    ]
+    assert audit_ledger(conn) == []
@@ -0,0 +1,107 @@
+import asyncio
+from pathlib import Path
+
+from game import Game
+from snapshots import TableSnapshots
+
+
+def new_game(table_id: int) -> Game:
+    game: Game = Game(table_id, 2, 0)
+    game.seat_players([(101, 100), (102, 100), (103, 100)])
+    game.start_hand()
+    return game
+
+
+def act(game: Game) -> None:
+    if game.to_call(game.to_act):
+        game.call(game.to_act)
+    else:
+        game.check(game.to_act)
+
+
+def restarted(snapshots: TableSnapshots, table_ids: set[int]) -> dict[int, Game]:
+    """Restore from the files as a new process would"""
+    snapshots.close()
+    restored: TableSnapshots = TableSnapshots(snapshots.directory, snapshots.name)
+    games: dict[int, Game] = {
+        game.table_id: game for game in restored.restore(table_ids)
+    }
+    restored.close()
+    return games
+
+
+def test_restore_snapshot_and_log(tmp_path: Path) -> None:
+    snapshots: TableSnapshots = TableSnapshots(str(tmp_path), "test")
+    running: Game = new_game(1)
+    finished: Game = new_game(2)
+    snapshots.log(1, running)
+    snapshots.log(2, finished)
+    act(running)
+    snapshots.log(1, running)
+
+    asyncio.run(snapshots.snapshot())
+    # After the snapshot, these are only in the log
+    act(running)
+    snapshots.log(1, running)
+    while finished.in_hand:
+        act(finished)
+    snapshots.log(2, finished)
+    snapshots.mark_settled(2, finished.hand_number)
+
+    games: dict[int, Game] = restarted(snapshots, {1, 2})
+    assert games[1].dump() == running.dump()
+    assert games[2].dump() == finished.dump()
+    assert not games[2].in_hand
+
+
+def test_restore_settled_marks(tmp_path: Path) -> None:
+    snapshots: TableSnapshots = TableSnapshots(str(tmp_path), "test")
+    game: Game = new_game(1)
+    while game.in_hand:
+        act(game)
+    snapshots.log(1, game)
+    snapshots.mark_settled(1, game.hand_number)
+    snapshots.close()
+
+    restored: TableSnapshots = TableSnapshots(str(tmp_path), "test")
+    restored.restore({1})
+    assert restored.is_settled(1, game.hand_number)
+    restored.close()
+
+
+def test_restore_skips_deleted_tables(tmp_path: Path) -> None:
+    snapshots: TableSnapshots = TableSnapshots(str(tmp_path), "test")
+    snapshots.log(1, new_game(1))
+    snapshots.log(2, new_game(2))
+    assert set(restarted(snapshots, {2})) == {2}
+
+
+def test_restore_ignores_a_torn_record(tmp_path: Path) -> None:
+    snapshots: TableSnapshots = TableSnapshots(str(tmp_path), "test")
+    game: Game = new_game(1)
+    snapshots.log(1, game)
+    act(game)
+    snapshots.log(1, game)
+    # A crash in the middle of the next write
+    with open(snapshots.segment_path(snapshots.segment), "ab") as file:
+        file.write(b"\x01\x01\x00")
+
+    assert restarted(snapshots, {1})[1].dump() == game.dump()
+
+
+def test_replay_is_idempotent(tmp_path: Path) -> None:
+    snapshots: TableSnapshots = TableSnapshots(str(tmp_path), "test")
+    game: Game = new_game(1)
+    snapshots.log(1, game)
+    act(game)
+    snapshots.log(1, game)
+    # Logging the same state again adds nothing to replay
+    snapshots.log(1, game)
+    snapshots.close()
+
+    restored: TableSnapshots = TableSnapshots(str(tmp_path), "test")
+    games: list[Game] = restored.restore({1})
+    # Restoring twice from the same files gives the same game
+    again: list[Game] = TableSnapshots(str(tmp_path), "test").restore({1})
+    assert games[0].dump() == again[0].dump() == game.dump()
+    restored.close()